@@ -4,6 +4,7 @@ from typing import Optional
 from celery.result import AsyncResult
 
 from langchain_pipeline.run_pipeline import run_chain
+from langchain_pipeline.tools.pipeline_checkpoints import load_task_record
 
 router = APIRouter()
 
@@ -51,3 +52,33 @@ async def get_status(task_id: str):
         "status": result.status,
         "result": result.result if result.ready() else None
     }
+
+
+@router.post("/resume/{task_id}")
+async def resume_task(task_id: str):
+    try:
+        record = load_task_record(task_id)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid task id.")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reading the task record: {str(e)}")
+    if not record:
+        raise HTTPException(status_code=404, detail="No checkpoints found for this task.")
+
+    result = AsyncResult(task_id)
+    if result.successful() and isinstance(result.result, dict) and result.result.get("status") == "completed":
+        raise HTTPException(status_code=409, detail="Task already completed, nothing to resume.")
+
+    # a resumed run's own record points at the checkpoints it used
+    checkpoint_id = record.get("checkpoint_id", task_id)
+    try:
+        task = run_chain.apply_async(args=[record["request"]], kwargs={"resume_from": checkpoint_id})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error during processing: {str(e)}")
+
+    return {
+        "task_id": task.id,
+        "resumed_from": checkpoint_id,
+        "message": "Report Generation Resumed",
+        "status": "pending"
+    }
@@ -1,4 +1,6 @@
 from celery import Celery
+from celery.concurrency.prefork import TaskPool as PreforkPool
+from celery.signals import worker_process_init, worker_ready
 import os
 
 CELERY_BROKER_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
@@ -7,9 +9,61 @@ celery = Celery(
     "worker",
     broker=CELERY_BROKER_URL,
     backend=CELERY_BROKER_URL,  # Optional: stores result/status
+    include=["langchain_pipeline.run_pipeline"],
 )
 
-# path may still be wrong
+# one queue per kind of work, so scanner and LLM capacity scale separately, e.g.
+#   celery -A app.core.celery_app worker -Q langchain -P threads -c 8
+#   celery -A app.core.celery_app worker -Q scan-code -P threads -c 2     (the scan engine runs its own process pool)
+#   celery -A app.core.celery_app worker -Q scan-web -P threads -c 4      (ZAP works in its containers)
+#   celery -A app.core.celery_app worker -Q llm -P gevent -c 64
+#   celery -A app.core.celery_app worker -Q compliance -P prefork -c 2
+# per-stage time limits are only enforced by the prefork pool; scan-code stays on threads anyway,
+# since a prefork child is daemonic and would fall back to scanning on threads in that one process
+# (scan units are bounded by their own timeouts, e.g. SEMGREP_SHARD_TIMEOUT)
+#
+# stages hand each other report paths, not report contents, so every worker (and the API)
+# must mount the same shared storage at the same paths and point these at it:
+#   SCAN_REPORTS_DIR, EXPLAIN_REPORTS_DIR   scan and explanation reports
+#   CHECKPOINT_DIR                         stage checkpoints (workers only, /resume reads its task
+#                                          records from Redis, see TASK_RECORD_REDIS_URL)
+# relative values resolve against each process's working directory, which only works on one host
 celery.conf.task_routes = {
-    "app.langchain_pipeline.run_pipeline.run_chain": {"queue": "langchain"},
-}
\ No newline at end of file
+    "app.langchain_logic.run_pipeline.run_chain": {"queue": "langchain"},
+    "app.langchain_logic.run_pipeline.merge_states": {"queue": "langchain"},
+    "app.langchain_logic.run_pipeline.finish_pipeline": {"queue": "langchain"},
+    "app.langchain_logic.run_pipeline.run_scan": {"queue": "scan-code"},
+    "app.langchain_logic.run_pipeline.run_stage": {"queue": "llm"},
+}
+# a worker busy with an hour-long scan must not sit on further reserved scans
+celery.conf.worker_prefetch_multiplier = 1
+
+
+# web scan workers start their ZAP daemons up front, so the first scan does not wait for a container
+ZAP_WARM_QUEUE = "scan-web"
+
+
+def consumes_web_scans():
+    queues = celery.amqp.queues
+    return ZAP_WARM_QUEUE in (queues.consume_from or queues)
+
+
+def warm_zap_pool():
+    from langchain_pipeline.tools.zap_pool import get_zap_pool
+    print(f"[+] Warming the ZAP pool for the {ZAP_WARM_QUEUE} queue...")
+    get_zap_pool().warm()
+
+
+@worker_process_init.connect
+def warm_zap_pool_in_child(**kwargs):
+    # prefork children each lease from their own pool
+    if consumes_web_scans():
+        warm_zap_pool()
+
+
+@worker_ready.connect
+def warm_zap_pool_in_worker(sender=None, **kwargs):
+    # thread, gevent and solo pools run tasks in this process; a prefork parent
+    # must not start daemons its children would inherit
+    if consumes_web_scans() and not isinstance(getattr(sender, "pool", None), PreforkPool):
+        warm_zap_pool()
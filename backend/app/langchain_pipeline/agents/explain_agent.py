@@ -1,4 +1,6 @@
 import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache, partial
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from langchain.agents import initialize_agent, Tool
@@ -11,6 +13,8 @@ from langchain_pipeline.tools.web_explainer import web_explainer_handler as web_
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# the report paths already say which explainer runs, the ReAct agent only routes them when this is set
+EXPLAIN_AGENT_LLM = os.getenv("EXPLAIN_AGENT_LLM", "false").lower() in ("1", "true", "yes")
 
 llm: BaseChatModel = ChatGoogleGenerativeAI(
     model="gemini-2.0-flash",
@@ -21,31 +25,66 @@ llm: BaseChatModel = ChatGoogleGenerativeAI(
 class ExplainInput(BaseModel):
     file_path: str
 
-tools = [
-    Tool.from_function(
-        func=code_explainer,
-        name="code_explainer",
-        description="Scans the provided public GitHub repository URL for security issues using Semgrep. Returns a report of the scan or a status message. Use this for scan_types like 'code' or 'static analysis'.",
-        args_schema=ExplainInput
-        
-    ),
-    Tool.from_function(
-        func=web_explainer,
-        name="web_explainer",
-        description="Scans the provided website URL for security issues using ZAP. Use this for scan_types like 'web' or 'dynamic analysis'.",
-        args_schema=ExplainInput,
+def build_tools(use_llm=True):
+    # use_llm=False explains from the local CWE/CVE knowledge base, without a Gemini call per finding
+    return [
+        Tool.from_function(
+            func=partial(code_explainer, use_llm=use_llm),
+            name="code_explainer",
+            description="Scans the provided public GitHub repository URL for security issues using Semgrep. Returns a report of the scan or a status message. Use this for scan_types like 'code' or 'static analysis'.",
+            args_schema=ExplainInput
+            
+        ),
+        Tool.from_function(
+            func=partial(web_explainer, use_llm=use_llm),
+            name="web_explainer",
+            description="Scans the provided website URL for security issues using ZAP. Use this for scan_types like 'web' or 'dynamic analysis'.",
+            args_schema=ExplainInput,
+        )
+    ]
+
+
+def build_agent(use_llm=True):
+    return initialize_agent(
+        tools=build_tools(use_llm),
+        llm=llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True
     )
-]
 
-agent = initialize_agent(
-    tools=tools,
-    llm=llm,
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True
-)
-    
+@lru_cache(maxsize=None)
+def get_agent(use_llm=True):
+    return build_agent(use_llm)
+
+
+EXPLAINERS = {"code": code_explainer, "web": web_explainer}
+
+
+def explain_reports(scan_results: dict, use_llm=True) -> dict:
+    """Runs the explainer of every scan that saved a report, concurrently and without a routing LLM call."""
+    jobs = [(scan_type, scan_results.get(f"{scan_type}_scan_file")) for scan_type in EXPLAINERS]
+    jobs = [(scan_type, path) for scan_type, path in jobs if path]
+    explanations = {"code_explain_file": "", "web_explain_file": "", "errors": {}}
+    if not jobs:
+        return explanations
+
+    with ThreadPoolExecutor(max_workers=len(jobs)) as executor:
+        results = executor.map(lambda job: EXPLAINERS[job[0]](job[1], use_llm=use_llm), jobs)
+        for (scan_type, _), result in zip(jobs, results):
+            if result.get("status") == "success" and result.get("file"):
+                explanations[f"{scan_type}_explain_file"] = result["file"]
+            else:
+                explanations["errors"][scan_type] = result.get("message", "Explanation failed")
+    return explanations
+
+
+def run_explain_agent(scan_results: dict, use_llm=True):
+    if not EXPLAIN_AGENT_LLM:
+        return explain_reports(scan_results, use_llm)
+    return run_llm_explain_agent(scan_results, use_llm)
+
 
-def run_explain_agent(scan_results: dict):
+def run_llm_explain_agent(scan_results: dict, use_llm=True):
     prompt = (
         f"You are responsible for the documnetation of a cybersecurity scan using the tools available to you. Based on the following data received that may contain data from a static code analysis or a website scan or both, your job is to use the relevant tools and format the received data.\n"
         f"The incoming data is in JSON format contianing the file paths to the saved reports for the respective scan. If the file path is empty, it means that the scan assosciated with that was not performed and it should not be explained any further. The file paths should be passed exactly as received including any folder or directories in the path\n"
@@ -66,12 +105,12 @@ def run_explain_agent(scan_results: dict):
         "Example output: {'code_explain_file': 'code_explain_results_487384684.py', 'web_explain_file': ''}\n\n"
     )
 
-    result = agent.invoke(prompt)
+    result = get_agent(use_llm).invoke(prompt)
     return result
 
 if __name__ == "__main__":
     
-    data = {'code_explain_file': 'scan_reports/code_scan_results_1749639302.json', 'web_explain_file': 'scan_reports/web_scan_results_1749639803.json'}
+    data = {'code_scan_file': 'scan_reports/code_scan_results_1749639302.json', 'web_scan_file': 'scan_reports/web_scan_results_1749639803.json'}
     final_output = run_explain_agent(data)
     # scan_reports/code_scan_results_1749639302.json
     # scan_reports/web_scan_results_1749639803.json
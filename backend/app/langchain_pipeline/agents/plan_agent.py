@@ -1,21 +1,44 @@
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
 from langchain_google_genai import ChatGoogleGenerativeAI
+import re
 import json
+import time
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from dotenv import load_dotenv
 import os
 
+from langchain_pipeline.tools.scan_profiles import plan_depth
+
 load_dotenv()
 API_KEY = os.getenv("GOOGLE_API_KEY")
+PLAN_CACHE_SIZE = int(os.getenv("PLAN_CACHE_SIZE", "1024"))
+# the winning depth needs more than this share of the keyword votes before the LLM is skipped
+PLAN_MIN_CONFIDENCE = float(os.getenv("PLAN_MIN_CONFIDENCE", "0.5"))
+PLAN_DEFAULT_DEPTH = os.getenv("PLAN_DEFAULT_DEPTH", "full")
 
-llm = ChatGoogleGenerativeAI(
-    model="gemini-2.0-flash",
-    temperature=0,
-    max_tokens=None,
-    timeout=None,
-    max_retries=2,
-    google_api_key=API_KEY,
-)
+# the depth definitions of the planner prompt, whose examples use the same sequences
+DEPTH_PLANS = {
+    "minimal": ["ScanAgent", "ReportAgent"],
+    "cve": ["ScanAgent", "ExplainAgent", "ReportAgent"],
+    "fixes": ["ScanAgent", "FixAgent", "ExplainAgent", "ReportAgent"],
+    "full": ["ScanAgent", "FixAgent", "ExplainAgent", "ComplianceAgent", "ReportAgent", "NarrationAgent"],
+}
+KNOWN_AGENTS = set(DEPTH_PLANS["full"])
+
+# each match is one vote for its depth; prompts matching several depths go to the LLM
+DEPTH_PATTERNS = {
+    "minimal": re.compile(r"\b(brief|short|minimal|basic|summary|overview|quick (scan|report|check|look)"
+                          r"|just (a )?scan|only (a )?(scan|report)|high[- ]level)\b"),
+    "cve": re.compile(r"\b(cves?|cwes?|list (of |all |the )?(vulnerabilities|issues|findings)|known vulnerabilit\w*"
+                      r"|advisor(y|ies)|vulnerable (dependencies|packages|libraries))\b"),
+    "fixes": re.compile(r"\b(fix(es|ing)?|remediat\w*|patch(es)?|mitigat\w*|how (to|do i|can i) (fix|solve|secure)"
+                        r"|solutions?|recommendations?|explain\w*)\b"),
+    "full": re.compile(r"\b(full|complete|comprehensive|detailed|thorough|in[- ]depth|everything|compliance|audit"
+                       r"|owasp|pci|hipaa|gdpr|iso ?27001|narrat\w*|audio|voice|urdu)\b"),
+}
 
 
 planner_template = PromptTemplate(
@@ -40,7 +63,7 @@ If tthe user prompt is extremely unclear or unrelated to the depth of the report
 Example 1:
 user_prompt = “I want a brief report” → 
 ```json
-{{"plan_sequence":["ScanAgent","FixAgent","ExplainAgent","ReportAgent","NarrationAgent"]}}
+{{"plan_sequence":["ScanAgent","ReportAgent"]}}
 
 Example 2:
 user_prompt = “I want a very detailed report for the given website/repo” → 
@@ -50,22 +73,141 @@ user_prompt = “I want a very detailed report for the given website/repo” →
 Example 3:
 user_prompt = “Generate a report only explaining the vulnerabilities in the code for this website/repo” → 
 ```json
-{{"plan_sequence":["ScanAgent","FixAgent","ExplainAgent","ReportAgent","NarrationAgent"]}}
+{{"plan_sequence":["ScanAgent","FixAgent","ExplainAgent","ReportAgent"]}}
 ```"""
 )
 
-planner_chain = LLMChain(llm=llm, prompt=planner_template)
+_plan_cache = OrderedDict()
+_plan_lock = threading.Lock()
+_plan_stats = {
+    "requests": 0,
+    "cache_hits": 0,
+    "rule_hits": 0,
+    "llm_calls": 0,
+    "llm_failures": 0,
+    "latency_ms": {"cache": 0.0, "rules": 0.0, "llm": 0.0}
+}
 
-def get_plan_sequence(user_prompt: str) -> list:
-    response = planner_chain.run(user_prompt)
+
+@lru_cache(maxsize=1)
+def get_planner_chain():
+    # built on first use, most prompts never reach it
+    llm = ChatGoogleGenerativeAI(
+        model="gemini-2.0-flash",
+        temperature=0,
+        max_tokens=None,
+        timeout=None,
+        max_retries=2,
+        google_api_key=API_KEY,
+    )
+    return LLMChain(llm=llm, prompt=planner_template)
+
+
+def normalize_prompt(user_prompt: str) -> str:
+    return " ".join(re.sub(r"[^\w\s-]", " ", user_prompt.lower()).split())
+
+
+def classify_prompt(normalized: str):
+    """Keyword vote over the four depths. Returns (depth or None, confidence)."""
+    scores = {depth: len(pattern.findall(normalized)) for depth, pattern in DEPTH_PATTERNS.items()}
+    total = sum(scores.values())
+    if not total:
+        return None, 0.0
+    depth = max(scores, key=scores.get)
+    return depth, scores[depth] / total
+
+
+def llm_plan_sequence(user_prompt: str) -> list:
+    response = get_planner_chain().run(user_prompt)
     
     try:
         json_str = response.strip().split("```json")[-1].split("```")[0]
         plan_dict = json.loads(json_str)
-        return plan_dict["plan_sequence"]
+        plan = [agent for agent in plan_dict["plan_sequence"] if agent in KNOWN_AGENTS]
+        return plan
     except Exception as e:
         print(f"Error parsing plan: {e}")
         return []
+
+
+def _record(source, started):
+    elapsed = (time.perf_counter() - started) * 1000
+    with _plan_lock:
+        _plan_stats["latency_ms"][source] += elapsed
+    return round(elapsed, 2)
+
+
+def plan_prompt(user_prompt: str) -> dict:
+    """Plans a task: prompt cache, then keyword rules, then Gemini for low-confidence prompts.
+
+    Returns {"plan_sequence", "depth", "source", "confidence", "latency_ms"}.
+    """
+    started = time.perf_counter()
+    normalized = normalize_prompt(user_prompt)
+    with _plan_lock:
+        _plan_stats["requests"] += 1
+        cached = _plan_cache.get(normalized)
+        if cached is not None:
+            _plan_cache.move_to_end(normalized)
+            _plan_stats["cache_hits"] += 1
+    if cached is not None:
+        return {**cached, "source": "cache", "latency_ms": _record("cache", started)}
+
+    depth, confidence = classify_prompt(normalized)
+    cacheable = True
+    if depth is not None and confidence > PLAN_MIN_CONFIDENCE:
+        source, plan = "rules", DEPTH_PLANS[depth]
+        with _plan_lock:
+            _plan_stats["rule_hits"] += 1
+    else:
+        source = "llm"
+        with _plan_lock:
+            _plan_stats["llm_calls"] += 1
+        try:
+            plan = llm_plan_sequence(user_prompt)
+        except Exception as e:
+            print(f"[!] Planner LLM call failed: {e}")
+            plan = []
+        if plan:
+            depth, confidence = plan_depth(plan), 1.0
+        else:
+            # the planner prompt itself says to default to the full report when in doubt
+            with _plan_lock:
+                _plan_stats["llm_failures"] += 1
+            depth = depth or PLAN_DEFAULT_DEPTH
+            plan = DEPTH_PLANS[depth]
+            cacheable = False  # the next identical prompt gets another chance at the LLM
+
+    result = {"plan_sequence": list(plan), "depth": depth, "confidence": round(confidence, 2)}
+    if cacheable:
+        with _plan_lock:
+            _plan_cache[normalized] = result
+            _plan_cache.move_to_end(normalized)
+            while len(_plan_cache) > PLAN_CACHE_SIZE:
+                _plan_cache.popitem(last=False)
+
+    print(f"[+] Planned depth '{depth}' via {source}.")
+    return {**result, "source": source, "latency_ms": _record(source, started)}
+
+
+def get_plan_sequence(user_prompt: str) -> list:
+    return plan_prompt(user_prompt)["plan_sequence"]
+
+
+def plan_stats() -> dict:
+    """Cache and rule hit rates, LLM call counts and mean latencies of this process' planner."""
+    with _plan_lock:
+        stats = {**_plan_stats, "latency_ms": dict(_plan_stats["latency_ms"]), "cache_size": len(_plan_cache)}
+    requests_seen = stats["requests"] or 1
+    stats["cache_hit_rate"] = round(stats["cache_hits"] / requests_seen, 3)
+    stats["rule_hit_rate"] = round(stats["rule_hits"] / requests_seen, 3)
+    stats["llm_rate"] = round(stats["llm_calls"] / requests_seen, 3)
+    counts = {"cache": stats["cache_hits"], "rules": stats["rule_hits"], "llm": stats["llm_calls"]}
+    stats["mean_latency_ms"] = {
+        source: round(total / counts[source], 2) if counts[source] else 0.0
+        for source, total in stats.pop("latency_ms").items()
+    }
+    return stats
     
 
 if __name__ == "__main__":
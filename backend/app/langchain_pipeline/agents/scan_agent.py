@@ -1,4 +1,6 @@
 import os
+import ast
+from functools import lru_cache, partial
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from langchain.agents import initialize_agent, Tool
@@ -8,9 +10,12 @@ from langchain.chat_models.base import BaseChatModel
 
 from langchain_pipeline.tools.code_scanner import code_scanner_handler as code_scanner
 from langchain_pipeline.tools.web_scanner import web_scanner_handler as web_scanner
+from langchain_pipeline.tools.scan_dispatcher import ScanResults, dispatch_scans, plan_scans, run_scan
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# the ReAct agent only runs when asked for, or when no source maps to a scanner and this is set
+SCAN_AGENT_LLM_FALLBACK = os.getenv("SCAN_AGENT_LLM_FALLBACK", "false").lower() in ("1", "true", "yes")
 
 llm: BaseChatModel = ChatGoogleGenerativeAI(
     model="gemini-2.0-flash",
@@ -21,31 +26,56 @@ llm: BaseChatModel = ChatGoogleGenerativeAI(
 class ScanInput(BaseModel):
     url: str
 
-tools = [
-    Tool.from_function(
-        func=code_scanner,
-        name="code_scanner",
-        description="Scans the provided public GitHub repository URL for security issues using Semgrep. Returns the filename where the scan results are saved and a status message. Use this for scan_types like 'code' or 'static analysis'.",
-        args_schema=ScanInput
-        
-    ),
-    Tool.from_function(
-        func=web_scanner,
-        name="web_scanner",
-        description="Scans the provided website URL for security issues using ZAP. Returns the filename where the scan results are saved and a status message. Use this for scan_types like 'web' or 'dynamic analysis'.",
-        args_schema=ScanInput,
+def build_tools(scan_profile=None):
+    return [
+        Tool.from_function(
+            func=code_scanner,
+            name="code_scanner",
+            description="Scans the provided public GitHub repository URL for security issues using Semgrep. Returns the filename where the scan results are saved and a status message. Use this for scan_types like 'code' or 'static analysis'.",
+            args_schema=ScanInput
+            
+        ),
+        Tool.from_function(
+            func=partial(web_scanner, profile=scan_profile),
+            name="web_scanner",
+            description="Scans the provided website URL for security issues using ZAP. Returns the filename where the scan results are saved and a status message. Use this for scan_types like 'web' or 'dynamic analysis'.",
+            args_schema=ScanInput,
+        )
+    ]
+
+
+def build_agent(scan_profile=None):
+    return initialize_agent(
+        tools=build_tools(scan_profile),
+        llm=llm,
+        agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
+        verbose=True
     )
-]
 
-agent = initialize_agent(
-    tools=tools,
-    llm=llm,
-    agent=AgentType.ZERO_SHOT_REACT_DESCRIPTION,
-    verbose=True
-)
 
-def run_scan_agent(scan_sources: list, scan_types: list):
-    
+@lru_cache(maxsize=None)
+def get_agent(scan_profile=None):
+    return build_agent(scan_profile)
+
+
+def parse_agent_output(result):
+    # the agent answers with a dict literal somewhere in its final text
+    output = result.get("output", "") if isinstance(result, dict) else str(result)
+    try:
+        files = ast.literal_eval(output[output.index("{"):output.rindex("}") + 1])
+    except (ValueError, SyntaxError) as e:
+        return ScanResults(errors={"agent": f"Could not parse the scan agent output: {e}"})
+    return ScanResults(code_scan_file=files.get("code_scan_file", ""), web_scan_file=files.get("web_scan_file", ""))
+
+
+def run_scan_agent(scan_sources: list, scan_types: list, scan_profile=None, use_llm=False, run=run_scan) -> ScanResults:
+    """Runs the requested scans, concurrently and without LLM calls unless use_llm is set."""
+    if not use_llm and (plan_scans(scan_sources, scan_types) or not SCAN_AGENT_LLM_FALLBACK):
+        return dispatch_scans(scan_sources, scan_types, scan_profile, run=run)
+    return run_llm_scan_agent(scan_sources, scan_types, scan_profile)
+
+
+def run_llm_scan_agent(scan_sources: list, scan_types: list, scan_profile=None) -> ScanResults:
     prompt = (
         f"You are a security scan coordinator. Given the `scan_sources` and `scan_types`, determine which sources require scanning by `code_scanner` or `web_scanner`, generate the necessary function calls, and structure the results.\n\n"
         f"Scan Sources: {scan_sources}\n"
@@ -67,8 +97,8 @@ def run_scan_agent(scan_sources: list, scan_types: list):
         "Example output: {'code_scan_file': 'code_scan_results_487384684.py', 'web_scan_file': ''}\n\n"
     )
 
-    result = agent.invoke(prompt)
-    return result
+    result = get_agent(scan_profile).invoke(prompt)
+    return parse_agent_output(result)
 
 if __name__ == "__main__":
     # Example usage
@@ -1,54 +1,262 @@
-from agents.plan_agent import get_plan_sequence
-from agents.scan_agent import run_scan_agent
-# from agents.fix_agent import FixAgent
-# from agents.explain_agent import ExplainAgent
-# from agents.compliance_agent import ComplianceAgent
-# from agents.report_agent import ReportAgent
-# from agents.narration_agent import NarrationAgent
+import os
+import time
+from functools import partial
+
+from langchain_pipeline.agents.plan_agent import plan_prompt, plan_stats
+from langchain_pipeline.agents.scan_agent import run_scan_agent
+from langchain_pipeline.agents.explain_agent import run_explain_agent
+from langchain_pipeline.tools.scan_profiles import explain_uses_llm, profile_for_plan
+from langchain_pipeline.tools.pipeline_executor import PipelineState, Stage, build_graph, merge_states, \
+    run_stage_graph, stage_levels
+from langchain_pipeline.tools.scan_dispatcher import ScanResults, plan_scans, run_scan
+from langchain_pipeline.tools.pipeline_checkpoints import input_hash, load_checkpoint, load_task_record, \
+    prune_checkpoints, save_checkpoint, save_task_record
+# from langchain_pipeline.agents.fix_agent import FixAgent
+# from langchain_pipeline.agents.compliance_agent import ComplianceAgent
+# from langchain_pipeline.agents.report_agent import ReportAgent
+# from langchain_pipeline.agents.narration_agent import NarrationAgent
+from celery import chain, chord, group
+from celery.exceptions import SoftTimeLimitExceeded
 from app.core.celery_app import celery
 
 # needs a lot of error handling
 # send appropriate updates through celery/redis
 # the final audio file should be stored in a location accessible by the frontend (or sent through ftp)
 
-@celery.task(name="app.langchain_logic.run_pipeline.run_chain")
-def run_chain(data: dict):
-    
-    plan = get_plan_sequence(data.prompt)
-    state = {}  # Storing Intermediate Results
-    
-    for agent_name in plan:
-        if agent_name == "ScanAgent":
-            state["scan_results"] = run_scan_agent(data.source, data.scan_type)
-            
-        elif agent_name == "FixAgent":
-            state["fix_results"] = FixAgent.run(state["scan_results"])
-            
-        elif agent_name == "ExplainAgent":
-            state["explanations"] = ExplainAgent.run(state["fix_results"])
-            
-        elif agent_name == "ComplianceAgent":
-            comp_input = {
-                "scan_results": state["scan_results"],
-                "explanations": state.get("explanations", {})
-            }
-            state["compliance"] = ComplianceAgent.run(comp_input)
-            
-        elif agent_name == "ReportAgent":
-            report_input = {
-                "explanations": state.get("explanations", {}),
-                "compliance": state.get("compliance", {})
-            }
-            rep = ReportAgent.run(report_input)
-            state["english_report"] = rep["english_report"]
-            state["urdu_report"] = rep["urdu_report"]
-            
-        elif agent_name == "NarrationAgent":
-            state["audio_path"] = NarrationAgent.run(state["urdu_report"])["audio_path"]
-            
-        else:
-            raise ValueError(f"Unknown agent: {agent_name}") 
-    
-    
+# scans are bounded by their own profile budgets (up to 6 hours for "deep"), the LLM stages are not
+PIPELINE_SCAN_TIMEOUT = int(os.getenv("PIPELINE_SCAN_TIMEOUT", str(7 * 3600)))
+PIPELINE_STAGE_TIMEOUT = int(os.getenv("PIPELINE_STAGE_TIMEOUT", str(30 * 60)))
+# "canvas" spreads the stages over the worker queues, "local" runs the whole graph inside run_chain
+PIPELINE_MODE = os.getenv("PIPELINE_MODE", "canvas")
+
+
+def checkpointed_scan(task_id, scan_type, source, scan_profile=None):
+    """run_scan, unless this task already finished the same scan and its report is still there."""
+    # one checkpoint per source, sources of the same type scan in parallel
+    name = f"ScanAgent:{scan_type}:{input_hash(source)[:12]}"
+    digest = input_hash(name, source, scan_profile)
+    result = load_checkpoint(task_id, name, digest)
+    if result is not None and os.path.exists(result.get("file", "")):
+        return result
+
+    result = run_scan(scan_type, source, scan_profile)
+    if task_id and result.get("status") == "success" and result.get("file"):
+        save_checkpoint(task_id, name, digest, result)
+    return result
+
+
+def scan_stage(state):
+    # checkpointed per scan, so a retry reruns only the scan that failed
+    scan_results = run_scan_agent(state.request["source"], state.request["scan_type"], state.scan_profile,
+                                  run=partial(checkpointed_scan, state.task_id))
+    return {"scan_results": scan_results}
+
+
+def explain_stage(state):
+    # the depth comes from the full plan, agents that are not scheduled still count
+    use_llm = explain_uses_llm(state.planning.get("plan_sequence", state.plan))
+    return {"explanations": run_explain_agent(state.scan_results.to_dict(), use_llm=use_llm)}
+
+
+# only agents that are implemented; FixAgent, ComplianceAgent, ReportAgent and
+# NarrationAgent get their stages once their modules exist (see the imports above)
+STAGES = {
+    "ScanAgent": Stage("ScanAgent", scan_stage, inputs=("request",), outputs=("scan_results",),
+                       timeout=PIPELINE_SCAN_TIMEOUT),
+    "ExplainAgent": Stage("ExplainAgent", explain_stage, inputs=("scan_results",), outputs=("explanations",),
+                          timeout=PIPELINE_STAGE_TIMEOUT),
+}
+
+
+def runnable_plan(plan):
+    """The planned agents that have a stage, in plan order; the others are reported, not scheduled."""
+    unscheduled = [name for name in plan if name not in STAGES]
+    if unscheduled:
+        print(f"[!] Not scheduling unimplemented agents: {', '.join(unscheduled)}")
+    return [name for name in plan if name in STAGES]
+
+
+# each stage runs on the queue sized for its kind of work, see core/celery_app.py
+STAGE_QUEUES = {
+    "FixAgent": "llm",
+    "ExplainAgent": "llm",
+    "ComplianceAgent": "compliance",
+    "ReportAgent": "llm",
+    "NarrationAgent": "llm",
+}
+SCAN_QUEUES = {"code": "scan-code", "web": "scan-web"}
+
+
+def load_state(values):
+    values = dict(values)
+    if isinstance(values.get("scan_results"), dict):
+        values["scan_results"] = ScanResults(**values["scan_results"])
+    return PipelineState(**values)
+
+
+def stage_input_hash(state, stage_name):
+    stage = STAGES[stage_name]
+    values = state.to_dict()
+    inputs = {name: values.get(name) for name in stage.inputs + stage.optional_inputs}
+    return input_hash(stage_name, state.plan, state.scan_profile, inputs)
+
+
+def restore_stage(stage_name, state):
+    """Fills in a stage's outputs from its checkpoint. Returns False when the stage has to run."""
+    if stage_name == "ScanAgent" or not state.task_id:
+        return False
+    outputs = load_checkpoint(state.task_id, stage_name, stage_input_hash(state, stage_name))
+    if outputs is None:
+        return False
+    restored = load_state({**state.to_dict(), **outputs})
+    for output in STAGES[stage_name].outputs:
+        setattr(state, output, getattr(restored, output))
+    return True
+
+
+def checkpoint_stage(stage_name, state):
+    if stage_name == "ScanAgent" or not state.task_id:
+        return
+    values = state.to_dict()
+    outputs = {output: values.get(output) for output in STAGES[stage_name].outputs}
+    try:
+        save_checkpoint(state.task_id, stage_name, stage_input_hash(state, stage_name), outputs)
+    except (OSError, TypeError, ValueError) as e:
+        # the stage still succeeded, a retry just cannot skip it
+        print(f"[!] Could not checkpoint stage {stage_name}: {e}")
+
+
+def pipeline_result(state):
     # this needs to return the long summary + audio file for the short summary
-    return {"status": "completed", "result": f"Processed: {data}"}
\ No newline at end of file
+    return {
+        "status": "completed" if not state.errors else "completed_with_errors",
+        "result": f"Processed: {state.request}",
+        "plan": state.planning,
+        "unscheduled": [name for name in state.planning.get("plan_sequence", []) if name not in state.plan],
+        "planner_stats": plan_stats(),
+        "timings": state.timings,
+        "errors": state.errors
+    }
+
+
+@celery.task(name="app.langchain_logic.run_pipeline.run_stage")
+def run_stage_task(state_values: dict, stage_name: str):
+    """Runs one stage on a serialized state and returns the state with its outputs."""
+    state = load_state(state_values)
+    _, requires = build_graph(state.plan, STAGES)[stage_name]
+    missing = sorted(name for name in requires if name in state.errors)
+    if missing:
+        state.errors[stage_name] = f"Skipped: {', '.join(missing)} did not complete"
+        return state.to_dict()
+    if restore_stage(stage_name, state):
+        return state.to_dict()
+
+    started = time.monotonic()
+    try:
+        outputs = STAGES[stage_name].run(state) or {}
+        for output in STAGES[stage_name].outputs:
+            setattr(state, output, outputs.get(output))
+        checkpoint_stage(stage_name, state)
+    except SoftTimeLimitExceeded:
+        state.errors[stage_name] = f"Timed out after {STAGES[stage_name].timeout}s"
+    except Exception as e:
+        print(f"[!] Stage {stage_name} failed: {e}")
+        state.errors[stage_name] = str(e)
+    state.timings[stage_name] = round(time.monotonic() - started, 2)
+    return state.to_dict()
+
+
+@celery.task(name="app.langchain_logic.run_pipeline.run_scan")
+def run_scan_task(state_values: dict, scan_type: str, source: str):
+    """One source's scan on its scanner queue; the scan chord merges the branches into one ScanResults."""
+    state = load_state(state_values)
+    results = ScanResults()
+    try:
+        result = checkpointed_scan(state.task_id, scan_type, source, state.scan_profile)
+    except SoftTimeLimitExceeded:
+        result = {"status": "failure", "message": f"Timed out after {PIPELINE_SCAN_TIMEOUT}s"}
+    if result.get("status") == "success" and result.get("file"):
+        setattr(results, f"{scan_type}_scan_file", result["file"])
+    else:
+        results.errors[scan_type] = result.get("message", "Scan failed")
+    results.durations[scan_type] = result.get("duration")
+    state.scan_results = results
+    state.timings[f"ScanAgent:{scan_type}"] = result.get("duration")
+    return state.to_dict()
+
+
+@celery.task(name="app.langchain_logic.run_pipeline.merge_states")
+def merge_states_task(state_values_list: list):
+    # parallel branches only ever fill in their own outputs
+    merged = state_values_list[0]
+    for state_values in state_values_list[1:]:
+        merged = merge_states(merged, state_values)
+    return merged
+
+
+@celery.task(name="app.langchain_logic.run_pipeline.finish_pipeline")
+def finish_pipeline_task(state_values: dict):
+    return pipeline_result(load_state(state_values))
+
+
+def stage_signature(state_values, stage_name):
+    timeout = STAGES[stage_name].timeout
+    if stage_name == "ScanAgent":
+        jobs = plan_scans(state_values["request"]["source"], state_values["request"]["scan_type"])
+        if jobs:
+            return [
+                run_scan_task.si(state_values, scan_type, source).set(
+                    queue=SCAN_QUEUES[scan_type], soft_time_limit=timeout, time_limit=timeout + 60)
+                for scan_type, source in jobs
+            ]
+    return [run_stage_task.s(stage_name).set(
+        queue=STAGE_QUEUES.get(stage_name, "langchain"), soft_time_limit=timeout, time_limit=timeout + 60)]
+
+
+def build_canvas(state):
+    """The plan's dependency levels as a chain; levels with several tasks become a chord."""
+    state_values = state.to_dict()
+    steps = []
+    for level in stage_levels(build_graph(state.plan, STAGES)):
+        signatures = [signature for stage_name in level for signature in stage_signature(state_values, stage_name)]
+        if not steps:
+            # the first level gets the initial state bound, later ones take the previous level's result
+            signatures = [signature if signature.immutable else signature.clone(args=(state_values,))
+                          for signature in signatures]
+        if len(signatures) == 1:
+            steps.append(signatures[0])
+        else:
+            steps.append(chord(group(signatures), merge_states_task.s()))
+    steps.append(finish_pipeline_task.s())
+    return chain(*steps)
+
+
+@celery.task(bind=True, name="app.langchain_logic.run_pipeline.run_chain")
+def run_chain(self, data: dict, resume_from: str = None):
+    """Plans and runs the pipeline. A retry of this task, or a run resuming
+    resume_from, reuses the stages that task already checkpointed."""
+    checkpoint_id = resume_from or self.request.id
+    record = load_task_record(checkpoint_id) if checkpoint_id else None
+    if record:
+        # same request and plan as the checkpointed run, or no checkpoint would match
+        data, planning = record["request"], record["planning"]
+    else:
+        prune_checkpoints()
+        planning = plan_prompt(data["prompt"])
+        if checkpoint_id:
+            save_task_record(checkpoint_id, data, planning)
+    if resume_from and self.request.id and self.request.id != resume_from:
+        # so this run can in turn be resumed by its own id
+        save_task_record(self.request.id, data, planning, checkpoint_id=resume_from)
+
+    plan = planning["plan_sequence"]
+    scan_profile = profile_for_plan(plan)  # the plan depth decides how deep ZAP digs
+    state = PipelineState(request=data, plan=runnable_plan(plan), planning=planning, task_id=checkpoint_id,
+                          scan_profile=scan_profile)
+
+    if PIPELINE_MODE == "local":
+        run_stage_graph(state, STAGES, on_stage_done=checkpoint_stage, restore_stage=restore_stage)
+        return pipeline_result(state)
+
+    # the stage tasks take over this task's id, so /status follows the whole pipeline
+    return self.replace(build_canvas(state))
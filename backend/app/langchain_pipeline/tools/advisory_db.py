@@ -0,0 +1,304 @@
+import os
+import re
+import json
+import sqlite3
+import hashlib
+import zipfile
+import argparse
+import tempfile
+
+import requests
+
+from langchain_pipeline.tools.file_locks import file_lock
+
+ADVISORY_DB_PATH = os.getenv("ADVISORY_DB_PATH", os.path.join("scan_cache", "advisories.db"))
+OSV_URL = os.getenv("OSV_URL", "https://osv-vulnerabilities.storage.googleapis.com/{ecosystem}/all.zip")
+OSV_ECOSYSTEMS = [name.strip() for name in os.getenv("OSV_ECOSYSTEMS", "PyPI,npm,Go,crates.io").split(",")
+                  if name.strip()]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS advisories (
+    id TEXT PRIMARY KEY, summary TEXT, details TEXT, severity TEXT, aliases TEXT, cwes TEXT, refs TEXT,
+    modified TEXT
+);
+CREATE TABLE IF NOT EXISTS affected_ranges (
+    advisory_id TEXT, ecosystem TEXT, package TEXT, introduced TEXT, fixed TEXT, last_affected TEXT
+);
+CREATE INDEX IF NOT EXISTS affected_ranges_package ON affected_ranges (ecosystem, package);
+CREATE TABLE IF NOT EXISTS affected_versions (advisory_id TEXT, ecosystem TEXT, package TEXT, version TEXT);
+CREATE INDEX IF NOT EXISTS affected_versions_package ON affected_versions (ecosystem, package, version);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+
+PRE_RELEASE_RANKS = {"dev": 0, "a": 1, "alpha": 1, "b": 2, "beta": 2, "c": 3, "pre": 3, "preview": 3, "rc": 3}
+POST_RELEASE_TAGS = ("post", "rev", "r")
+
+
+def _lock_path():
+    return f"{ADVISORY_DB_PATH}.lock"
+
+
+def normalize_package(ecosystem, name):
+    if ecosystem == "PyPI":
+        return re.sub(r"[-_.]+", "-", name).lower()  # PEP 503
+    return name
+
+
+def version_key(version):
+    """A sort key that orders PEP 440, SemVer, Go and Cargo versions well enough for range checks.
+
+    Release numbers compare numerically with trailing zeros ignored, a
+    pre-release sorts before its release and a post-release after it.
+    """
+    version = version.strip().lstrip("vV").split("+")[0].lower()
+    match = re.match(r"\d+(?:\.\d+)*", version)
+    release = [int(part) for part in match.group(0).split(".")] if match else []
+    while release and release[-1] == 0:
+        release.pop()
+    rest = version[match.end():] if match else version
+
+    tokens = []
+    for token in re.findall(r"\d+|[a-z]+", rest):
+        if token.isdigit():
+            tokens.append((0, int(token), ""))
+        else:
+            tokens.append((1, PRE_RELEASE_RANKS.get(token, 4), token))
+    if not tokens:
+        phase = 1
+    elif tokens[0][2] in POST_RELEASE_TAGS:
+        phase = 2
+    else:
+        phase = 0
+    return tuple(release), phase, tuple(tokens)
+
+
+def version_affected(version, introduced, fixed, last_affected):
+    key = version_key(version)
+    if introduced and key < version_key(introduced):
+        return False
+    if fixed and key >= version_key(fixed):
+        return False
+    if last_affected and key > version_key(last_affected):
+        return False
+    return True
+
+
+def connect(path=None):
+    connection = sqlite3.connect(path or ADVISORY_DB_PATH, timeout=60)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+
+def open_advisory_db():
+    """Read-only connection to the local advisory database, or None when nothing was imported."""
+    if not os.path.exists(ADVISORY_DB_PATH):
+        return None
+    return sqlite3.connect(f"file:{os.path.abspath(ADVISORY_DB_PATH)}?mode=ro", uri=True, timeout=60)
+
+
+def advisory_db_version():
+    connection = open_advisory_db()
+    if connection is None:
+        return ""
+    try:
+        row = connection.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()
+    except sqlite3.DatabaseError:
+        return ""
+    finally:
+        connection.close()
+    return row[0] if row else ""
+
+
+def _intervals(events):
+    # OSV lists a range as introduced/fixed/last_affected events, flattened here into intervals
+    intervals, introduced = [], None
+    for event in events:
+        if "introduced" in event:
+            introduced = event["introduced"]
+        elif "fixed" in event or "last_affected" in event:
+            intervals.append((introduced or "0", event.get("fixed"), event.get("last_affected")))
+            introduced = None
+    if introduced is not None:
+        intervals.append((introduced, None, None))
+    return intervals
+
+
+def _severity(advisory):
+    severity = (advisory.get("database_specific") or {}).get("severity")
+    if severity:
+        return severity.upper()
+    for affected in advisory.get("affected", []):
+        severity = (affected.get("ecosystem_specific") or {}).get("severity")
+        if severity:
+            return severity.upper()
+    return ""
+
+
+def _store_advisory(connection, advisory):
+    advisory_id = advisory["id"]
+    connection.execute("DELETE FROM affected_ranges WHERE advisory_id = ?", (advisory_id,))
+    connection.execute("DELETE FROM affected_versions WHERE advisory_id = ?", (advisory_id,))
+    if advisory.get("withdrawn"):
+        connection.execute("DELETE FROM advisories WHERE id = ?", (advisory_id,))
+        return
+
+    connection.execute(
+        "INSERT OR REPLACE INTO advisories VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+        (
+            advisory_id,
+            advisory.get("summary", ""),
+            advisory.get("details", ""),
+            _severity(advisory),
+            json.dumps(advisory.get("aliases", [])),
+            json.dumps((advisory.get("database_specific") or {}).get("cwe_ids", [])),
+            json.dumps([reference["url"] for reference in advisory.get("references", []) if "url" in reference]),
+            advisory.get("modified", "")
+        )
+    )
+
+    ranges, versions = [], []
+    for affected in advisory.get("affected", []):
+        package = affected.get("package") or {}
+        ecosystem = package.get("ecosystem", "").split(":")[0]
+        if not ecosystem or not package.get("name"):
+            continue
+        name = normalize_package(ecosystem, package["name"])
+        for affected_range in affected.get("ranges", []):
+            if affected_range.get("type") == "GIT":
+                continue  # commit ranges cannot be matched against lockfile versions
+            for introduced, fixed, last_affected in _intervals(affected_range.get("events", [])):
+                ranges.append((advisory_id, ecosystem, name, introduced, fixed, last_affected))
+        for version in affected.get("versions", []):
+            versions.append((advisory_id, ecosystem, name, version))
+
+    connection.executemany("INSERT INTO affected_ranges VALUES (?, ?, ?, ?, ?, ?)", ranges)
+    connection.executemany("INSERT INTO affected_versions VALUES (?, ?, ?, ?)", versions)
+
+
+def _iter_osv_documents(source):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for name in archive.namelist():
+                if name.endswith(".json"):
+                    yield json.loads(archive.read(name))
+    elif os.path.isdir(source):
+        for directory, _, names in os.walk(source):
+            for name in names:
+                if name.endswith(".json"):
+                    with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+                        yield json.load(f)
+    else:
+        with open(source, "r", encoding="utf-8") as f:
+            document = json.load(f)
+        yield from document if isinstance(document, list) else [document]
+
+
+def import_osv(source):
+    """Imports OSV advisories from a zip export, a directory or a JSON file into the local database.
+
+    Callers hold the advisory lock. Returns the number of advisories read.
+    """
+    directory = os.path.dirname(ADVISORY_DB_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    connection = connect()
+    total = 0
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")  # scans keep reading while an import runs
+        connection.executescript(SCHEMA)
+        with connection:
+            for advisory in _iter_osv_documents(source):
+                if "id" in advisory:
+                    _store_advisory(connection, advisory)
+                    total += 1
+
+            # the version changes with the content, so cached scan results are not reused across imports
+            digest = hashlib.sha256()
+            for advisory_id, modified in connection.execute("SELECT id, modified FROM advisories ORDER BY id"):
+                digest.update(f"{advisory_id}\0{modified}\n".encode("utf-8"))
+            connection.execute("INSERT OR REPLACE INTO meta VALUES ('version', ?)", (digest.hexdigest()[:16],))
+    finally:
+        connection.close()
+
+    print(f"[+] Imported {total} advisories from {source}.")
+    return total
+
+
+def fetch_osv(ecosystem):
+    url = OSV_URL.format(ecosystem=ecosystem)
+    print(f"[+] Fetching {ecosystem} advisories from {url}...")
+    fd, archive_path = tempfile.mkstemp(suffix=".zip")
+    try:
+        with os.fdopen(fd, "wb") as f, requests.get(url, timeout=300, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+        return import_osv(archive_path)
+    finally:
+        os.remove(archive_path)
+
+
+def lookup_advisories(connection, packages):
+    """Matches (ecosystem, package, version) tuples against the database in two bulk queries.
+
+    Returns {(ecosystem, package, version): [advisory, ...]} for affected
+    packages only; package names are expected normalized.
+    """
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted (ecosystem TEXT, package TEXT, version TEXT)")
+    connection.execute("DELETE FROM wanted")
+    connection.executemany("INSERT INTO wanted VALUES (?, ?, ?)", set(packages))
+
+    matches = {}
+    columns = "w.ecosystem, w.package, w.version, adv.id, adv.summary, adv.details, adv.severity, adv.aliases, " \
+              "adv.cwes, adv.refs"
+    range_rows = connection.execute(
+        f"SELECT {columns}, r.introduced, r.fixed, r.last_affected FROM wanted w "
+        "JOIN affected_ranges r ON r.ecosystem = w.ecosystem AND r.package = w.package "
+        "JOIN advisories adv ON adv.id = r.advisory_id"
+    )
+    for row in range_rows:
+        if version_affected(row[2], row[10], row[11], row[12]):
+            _add_match(matches, row, row[11])
+    version_rows = connection.execute(
+        f"SELECT {columns} FROM wanted w "
+        "JOIN affected_versions v ON v.ecosystem = w.ecosystem AND v.package = w.package AND v.version = w.version "
+        "JOIN advisories adv ON adv.id = v.advisory_id"
+    )
+    for row in version_rows:
+        _add_match(matches, row, None)
+    return {key: list(advisories.values()) for key, advisories in matches.items()}
+
+
+def _add_match(matches, row, fixed):
+    advisories = matches.setdefault((row[0], row[1], row[2]), {})
+    if row[3] not in advisories:
+        advisories[row[3]] = {
+            "id": row[3],
+            "summary": row[4],
+            "details": row[5],
+            "severity": row[6],
+            "aliases": json.loads(row[7]),
+            "cwes": json.loads(row[8]),
+            "references": json.loads(row[9]),
+            "fixed": []
+        }
+    if fixed and fixed not in advisories[row[3]]["fixed"]:
+        advisories[row[3]]["fixed"].append(fixed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import OSV advisories into the local advisory database.")
+    parser.add_argument("--from-file", action="append", default=[],
+                        help="an OSV zip export, directory or JSON file, for air-gapped hosts")
+    parser.add_argument("--ecosystem", action="append", help="ecosystems to fetch from OSV (default: OSV_ECOSYSTEMS)")
+    args = parser.parse_args()
+
+    with file_lock(_lock_path()):
+        if args.from_file:
+            for source in args.from_file:
+                import_osv(source)
+        else:
+            for ecosystem in args.ecosystem or OSV_ECOSYSTEMS:
+                fetch_osv(ecosystem)
+    print(json.dumps({"path": ADVISORY_DB_PATH, "version": advisory_db_version()}, indent=4))
@@ -1,11 +1,17 @@
 import os
 import json
 import time
+import uuid
 from google import genai
 from dotenv import load_dotenv
+from celery.exceptions import SoftTimeLimitExceeded
+
+from langchain_pipeline.tools.knowledge_base import knowledge_db_available, knowledge_explanation, with_knowledge
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# shared by every worker, like SCAN_REPORTS_DIR
+EXPLAIN_REPORTS_DIR = os.path.abspath(os.getenv("EXPLAIN_REPORTS_DIR", "explain_reports"))
 client = genai.Client()
 
 
@@ -39,6 +45,8 @@ def explain_code_vulnerability(vulnerability):
             "vulnerability": vulnerability
         }
         
+    except SoftTimeLimitExceeded:
+        raise
     except Exception as e:
         error_msg = f"AI explanation failed to generate. Error: {str(e)}"
         print(f"[!] Gemini Error for code vulnerability: {e}")
@@ -48,19 +56,42 @@ def explain_code_vulnerability(vulnerability):
             "vulnerability": {**vulnerability, "ai_explanation": error_msg}
         }
 
-def format_code_vulnerabilities(semgrep_report):
-    if not semgrep_report or "results" not in semgrep_report:
+def iter_code_results(semgrep_report):
+    # large reports keep their findings in a JSON lines file next to the report
+    if semgrep_report.get("results_file"):
+        with open(semgrep_report["results_file"], "r") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+    else:
+        yield from semgrep_report.get("results", [])
+
+def format_code_vulnerabilities(semgrep_report, use_llm=True):
+    if not semgrep_report or ("results" not in semgrep_report and "results_file" not in semgrep_report):
         return {
             "status": "failure",
             "error": "Invalid or empty Semgrep report",
             "formatted": []
         }
 
+    if not use_llm and not knowledge_db_available():
+        # without the knowledge base a shallow plan would get no explanations at all
+        print("[!] No knowledge base imported, explaining code findings with the LLM instead. "
+              "Import one with: python -m langchain_pipeline.tools.knowledge_base")
+        use_llm = True
+
     formatted = []
     try:
-        for issue in semgrep_report.get("results", []):
+        for issue in with_knowledge(iter_code_results(semgrep_report)):
             vulnerability = {**issue, "ai_explanation": ""}
-            
+
+            if not use_llm:
+                # shallow plans explain from the local CWE/CVE knowledge base alone
+                explanation = knowledge_explanation(vulnerability)
+                vulnerability["ai_explanation"] = explanation or vulnerability.get("extra", {}).get("message", "")
+                formatted.append(vulnerability)
+                continue
+
             result = explain_code_vulnerability(vulnerability)
             formatted.append(result["vulnerability"])
                 
@@ -68,6 +99,8 @@ def format_code_vulnerabilities(semgrep_report):
             "status": "success",
             "formatted": formatted
         }
+    except SoftTimeLimitExceeded:
+        raise
     except Exception as e:
         return {
             "status": "failure",
@@ -75,8 +108,8 @@ def format_code_vulnerabilities(semgrep_report):
             "formatted": formatted
         }
 
-def code_explainer(semgrep_report):
-    format_result = format_code_vulnerabilities(semgrep_report)
+def code_explainer(semgrep_report, use_llm=True):
+    format_result = format_code_vulnerabilities(semgrep_report, use_llm)
     
     if format_result["status"] == "failure":
         return {
@@ -98,7 +131,7 @@ def code_explainer(semgrep_report):
     }
   
     
-def code_explainer_handler(code_scan_path: str):
+def code_explainer_handler(code_scan_path: str, use_llm: bool = True):
     
     # get semgrep report from the provided path
     
@@ -122,10 +155,16 @@ def code_explainer_handler(code_scan_path: str):
             "status": "failure",
             "message": "Code scan data is not in the expected dictionary format."
         }
+
+    if code_scan_data.get("results_file") and not os.path.exists(code_scan_data["results_file"]):
+        return {
+            "status": "failure",
+            "message": f"Code scan results file not found at {code_scan_data['results_file']}"
+        }
     
     # Run the code explainer
     
-    results = code_explainer(code_scan_data)
+    results = code_explainer(code_scan_data, use_llm)
     
     if results.get("status") == "failure":
         return {
@@ -133,13 +172,14 @@ def code_explainer_handler(code_scan_path: str):
             "message": results.get("error", "An error occurred during the code explanation.")
         }
     
-    reports_dir = "explain_reports"
+    reports_dir = EXPLAIN_REPORTS_DIR
     os.makedirs(reports_dir, exist_ok=True)
-    filename = os.path.join(reports_dir, f"code_explain_results_{int(time.time())}.json")
+    filename = os.path.join(reports_dir, f"code_explain_results_{int(time.time())}_{uuid.uuid4().hex[:8]}.json")
     with open(filename, "w") as f:
         json.dump(results, f, indent=4)
         
     return {
         "status": results.get("status"),
-        "message": f"Code Exaplanation completed. Results saved to {filename}"
+        "message": f"Code Exaplanation completed. Results saved to {filename}",
+        "file": filename
     }
\ No newline at end of file
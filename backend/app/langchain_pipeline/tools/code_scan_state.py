@@ -0,0 +1,111 @@
+import os
+import json
+import time
+import uuid
+import subprocess
+
+from langchain_pipeline.tools.repo_cache import GIT_ENV, repo_key
+from langchain_pipeline.tools.result_cache import link_or_copy
+
+CODE_SCAN_STATE_DIR = os.getenv("CODE_SCAN_STATE_DIR", os.path.join("scan_cache", "code"))
+# past this age the next scan is a full one, so carried-forward findings cannot go stale forever
+CODE_SCAN_STATE_MAX_AGE = int(os.getenv("CODE_SCAN_STATE_MAX_AGE", str(7 * 24 * 3600)))
+
+
+def _state_path(git_repo_url):
+    return os.path.join(CODE_SCAN_STATE_DIR, f"{repo_key(git_repo_url)}.json")
+
+
+def _results_path(git_repo_url, commit):
+    return os.path.join(CODE_SCAN_STATE_DIR, f"{repo_key(git_repo_url)}.{commit}.results.jsonl")
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _load_state_file(git_repo_url):
+    path = _state_path(git_repo_url)
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[!] Ignoring unreadable code scan state {path}: {e}")
+        return {}
+
+
+def load_scan_state(git_repo_url, config):
+    state = _load_state_file(git_repo_url)
+    if not state or not os.path.exists(state.get("results_file", "")):
+        return None
+
+    if state.get("config") != config:
+        print(f"[+] Ruleset changed since the last scan of {git_repo_url}, running a full scan.")
+        return None
+    if time.time() - state.get("updated_at", 0) > CODE_SCAN_STATE_MAX_AGE:
+        print(f"[+] Code scan state for {git_repo_url} is older than {CODE_SCAN_STATE_MAX_AGE}s, running a full scan.")
+        return None
+    return state
+
+
+def diff_commits(mirror, base_commit, commit):
+    """Returns (changed, deleted) repository-relative paths, or None if base_commit is unknown."""
+    exists = subprocess.run(
+        ["git", "cat-file", "-e", f"{base_commit}^{{commit}}"],
+        cwd=mirror, capture_output=True, env=GIT_ENV
+    )
+    if exists.returncode != 0:
+        # history was rewritten or the mirror was evicted and recloned without it
+        return None
+
+    output = subprocess.run(
+        ["git", "diff", "--name-status", "--no-renames", "-z", base_commit, commit],
+        cwd=mirror, check=True, capture_output=True, text=True, env=GIT_ENV
+    ).stdout
+    fields = output.split("\0")
+
+    changed, deleted = [], []
+    for status, path in zip(fields[0::2], fields[1::2]):
+        (deleted if status.startswith("D") else changed).append(path)
+    return changed, deleted
+
+
+def carried_results(state, dropped_paths):
+    dropped = set(dropped_paths)
+    with open(state["results_file"], "r", encoding="utf-8") as f:
+        for line in f:
+            if not line.strip():
+                continue
+            result = json.loads(line)
+            if result.get("path") not in dropped:
+                yield result
+
+
+def save_scan_state(git_repo_url, commit, config, version, results_path, total_results):
+    # findings are stored per commit and the state file is swapped last,
+    # so the state always points at the findings of the commit it names
+    previous = _load_state_file(git_repo_url)
+    results_file = _results_path(git_repo_url, commit)
+    os.makedirs(CODE_SCAN_STATE_DIR, exist_ok=True)
+    tmp_path = f"{results_file}.{uuid.uuid4().hex}.tmp"
+    link_or_copy(results_path, tmp_path)
+    os.replace(tmp_path, results_file)
+    _write_atomic(_state_path(git_repo_url), lambda f: json.dump({
+        "url": git_repo_url,
+        "commit": commit,
+        "config": config,
+        "version": version,
+        "results_file": results_file,
+        "updated_at": time.time(),
+        "total_results": total_results
+    }, f))
+
+    stale = previous.get("results_file")
+    if stale and stale != results_file and os.path.exists(stale):
+        os.remove(stale)
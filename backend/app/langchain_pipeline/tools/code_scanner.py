@@ -1,23 +1,124 @@
 import json
+import mmap
 import subprocess
 import os
-import tempfile
-import shutil
 import time
+import uuid
+import tempfile
+from collections import OrderedDict
+from celery.exceptions import SoftTimeLimitExceeded
+
+from langchain_pipeline.tools.file_discovery import discover_files, filter_changed_files
+from langchain_pipeline.tools.code_scan_state import carried_results, diff_commits, load_scan_state, save_scan_state
+from langchain_pipeline.tools.repo_cache import repo_checkout, resolve_remote_commit
+from langchain_pipeline.tools.result_cache import fetch_cached_result, result_cache_key, store_result, \
+    write_json_atomic
+from langchain_pipeline.tools.rule_packs import ensure_rule_pack, ruleset_id
+from langchain_pipeline.tools.scan_engine import enabled_plugins, run_scanners, scan_incomplete
+from langchain_pipeline.tools.semgrep_runner import semgrep_version
+
+# absolute, and shared by every worker: the stages that read a report may run on another queue's workers
+SCAN_REPORTS_DIR = os.path.abspath(os.getenv("SCAN_REPORTS_DIR", "scan_reports"))
+SNIPPET_OPEN_FILES = int(os.getenv("SNIPPET_OPEN_FILES", "32"))
+CODE_INCREMENTAL_SCAN = os.getenv("CODE_INCREMENTAL_SCAN", "true").lower() in ("1", "true", "yes")
+
+def load_scanners():
+    # the ruleset identifies everything that shapes the findings: rule pack and extra plugins
+    rule_pack = ensure_rule_pack()
+    plugins = enabled_plugins(context={"rule_pack": rule_pack})
+    ruleset = ruleset_id(rule_pack) + "".join(
+        f"+{plugin.name}@{plugin.version()}" for plugin in plugins if plugin.name != "semgrep"
+    )
+    return plugins, ruleset
+
+def supported_types(plugins):
+    extensions = set().union(*(plugin.extensions for plugin in plugins))
+    filenames = set().union(*(plugin.filenames for plugin in plugins))
+    return extensions, filenames
+
+def get_supported_files(code_path, plugins=None):
+    extensions, filenames = supported_types(plugins or load_scanners()[0])
+    return discover_files(code_path, extensions, filenames)["files"]
+
+class SnippetReader:
+    """Keeps the most recently read files mmapped; plugin findings arrive interleaved across files."""
+
+    def __init__(self, max_open=SNIPPET_OPEN_FILES):
+        self.max_open = max(1, max_open)
+        self._open_files = OrderedDict()  # path -> (file, mmap or None), least recently read first
+
+    def _open(self, file_path):
+        handle, content = None, None
+        try:
+            handle = open(file_path, "rb")
+            if os.fstat(handle.fileno()).st_size:
+                content = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            print(f"[!] Failed to extract exact snippet from {file_path}: {e}")
+        # failures are kept too, so a file is not retried for each of its findings
+        self._open_files[file_path] = (handle, content)
+        if len(self._open_files) > self.max_open:
+            self._release(*self._open_files.popitem(last=False)[1])
+        return content
+
+    def read(self, file_path, start_offset, end_offset):
+        # Semgrep offsets are byte offsets: slice the raw bytes
+        if file_path in self._open_files:
+            self._open_files.move_to_end(file_path)
+            content = self._open_files[file_path][1]
+        else:
+            content = self._open(file_path)
+        if content is None:
+            return None
+        return content[start_offset:end_offset].decode("utf-8", errors="replace").strip()
+
+    @staticmethod
+    def _release(handle, content):
+        if content is not None:
+            content.close()
+        if handle is not None:
+            handle.close()
 
-SUPPORTED_EXTENSIONS = {".py", ".js", ".ts", ".java", ".go", ".c", ".cpp", ".rb", ".php", ".jsx", ".tsx", ".cs", ".swift", ".kt", ".scala", ".rs", ".m", ".sh", ".pl", ".lua", ".dart", ".html", ".xml", ".json", ".yml", ".yaml"}
+    def close(self):
+        while self._open_files:
+            self._release(*self._open_files.popitem()[1])
 
-def get_supported_files(code_path):
-    files = []
-    for root, _, filenames in os.walk(code_path):
-        for filename in filenames:
-            ext = os.path.splitext(filename)[1]
-            if ext in SUPPORTED_EXTENSIONS:
-                files.append(os.path.join(root, filename))
-    return files
+def enrich_issue(issue, snippets, code_path):
+    issue["vulnerable_line"] = issue.get("start", {}).get("line", None)
+    issue["code_snippet"] = issue.get("extra", {}).get("lines", "").strip()
+    issue["exact_snippet"] = issue["code_snippet"]
 
-def analyze_code_with_semgrep(code_path):
-    files_to_scan = get_supported_files(code_path)
+    start_offset = issue.get("start", {}).get("offset", None)
+    end_offset = issue.get("end", {}).get("offset", None)
+    if start_offset is not None and end_offset is not None:
+        exact_snippet = snippets.read(issue.get("path", ""), start_offset, end_offset)
+        if exact_snippet is not None:
+            issue["exact_snippet"] = exact_snippet
+
+    # checkouts live in throwaway directories, findings are reported against the repository root
+    issue["path"] = os.path.relpath(issue.get("path", ""), code_path)
+    return issue
+
+def relativize_paths(semgrep_output, code_path):
+    for error in semgrep_output.get("errors", []):
+        if error.get("paths"):
+            error["paths"] = [os.path.relpath(path, code_path) for path in error["paths"]]
+    paths = semgrep_output.get("paths", {})
+    if paths.get("scanned"):
+        paths["scanned"] = [os.path.relpath(path, code_path) for path in paths["scanned"]]
+
+def write_result(out, result):
+    out.write(json.dumps(result) + "\n")
+
+def analyze_code(code_path, out, plugins, files_to_scan=None):
+    """Runs the scanner plugins and writes each enriched finding to out as one JSON line."""
+    skipped = None
+    if files_to_scan is None:
+        discovery = discover_files(code_path, *supported_types(plugins))
+        files_to_scan, skipped = discovery["files"], discovery["skipped"]
+        print(f"[+] Found {len(files_to_scan)} files to scan, skipped {len(skipped['ignored_dirs'])} ignored "
+              f"directories, {len(skipped['oversized'])} oversized, {len(skipped['minified'])} minified "
+              f"and {len(skipped['generated'])} generated files.")
     if not files_to_scan:
         print("[!] No supported source code files found.")
         return {
@@ -25,45 +126,54 @@ def analyze_code_with_semgrep(code_path):
             "error": "No supported source code files found."
         }
 
+    snippets = SnippetReader()
     try:
-        result = subprocess.run([
-            "semgrep", "--config", "p/default", "--json", *files_to_scan
-        ], capture_output=True, text=True)
-
-        semgrep_output = json.loads(result.stdout)
-
-        for issue in semgrep_output.get("results", []):
-            issue["vulnerable_line"] = issue.get("start", {}).get("line", None)
-            issue["code_snippet"] = issue.get("extra", {}).get("lines", "").strip()
-            file_path = issue.get("path", "")
-            start_offset = issue.get("start", {}).get("offset", None)
-            end_offset = issue.get("end", {}).get("offset", None)
-
-            if start_offset is not None and end_offset is not None and os.path.exists(file_path):
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        full_content = f.read()
-                        exact_snippet = full_content[start_offset:end_offset].strip()
-                        issue["exact_snippet"] = exact_snippet
-                except Exception as e:
-                    print(f"[!] Failed to extract exact snippet from {file_path}: {e}")
-                    issue["exact_snippet"] = issue["code_snippet"]
-            else:
-                issue["exact_snippet"] = issue["code_snippet"]
+        scan_output = run_scanners(
+            files_to_scan,
+            lambda issue: write_result(out, enrich_issue(issue, snippets, code_path)),
+            plugins=plugins
+        )
+        relativize_paths(scan_output, code_path)
+        if skipped is not None:
+            scan_output["skipped"] = skipped
 
-        print(f"[+] Semgrep scan completed. {len(semgrep_output.get('results', []))} issues found.")
-        # print(json.dumps(semgrep_output, indent=4))
-        return semgrep_output
+        print(f"[+] Code scan completed. {scan_output['total_results']} issues found.")
+        return scan_output
 
+    except SoftTimeLimitExceeded:
+        raise
     except Exception as e:
-        print("[!] Semgrep scan failed:", e)
+        # every work unit failed, usually Docker or the scanner process rather than the code itself
+        print("[!] Code scan failed:", e)
         return {
             "status": "failure",
-            "error": f"Semgrep scan failed: {str(e)}"
+            "error": f"Code scan failed: {str(e)}",
+            "retryable": True
         }
 
+    finally:
+        snippets.close()
+
+
+def scan_changed_files(code_path, changed, out, plugins):
+    files_to_scan = filter_changed_files(code_path, changed, *supported_types(plugins))
+    if not files_to_scan:
+        print("[+] No supported files changed since the last scan.")
+        return {"errors": [], "paths": {"scanned": []}, "version": "", "total_results": 0}
+    return analyze_code(code_path, out, plugins, files_to_scan)
+
+
+def load_results(results_path):
+    with open(results_path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
 
-def code_scanner(git_repo_url: str):
+
+def code_scanner(git_repo_url: str, incremental=CODE_INCREMENTAL_SCAN, results_path=None):
+    """Scans a repository with Semgrep.
+
+    With results_path the findings are streamed there as JSON lines and the
+    report carries "results_file" and "total_results" in place of "results".
+    """
     git_repo_url = git_repo_url.strip()
     
     if not git_repo_url:
@@ -80,67 +190,137 @@ def code_scanner(git_repo_url: str):
             "error": "Invalid Git repository URL."
         }
 
-    print("[+] Cloning GitHub repository...")
-    temp_dir = tempfile.mkdtemp()
-    
+    print("[+] Checking out repository from the local mirror cache...")
+    # findings are written beside results_path and moved into place once complete,
+    # it may end up sharing an inode with the result cache and the incremental state
+    if results_path is None:
+        fd, output_path = tempfile.mkstemp(suffix=".jsonl")
+        os.close(fd)
+    else:
+        output_path = f"{results_path}.{uuid.uuid4().hex}.tmp"
+
+    plugins, ruleset = load_scanners()
+
     try:
-        subprocess.run(["git", "clone", git_repo_url, temp_dir], check=True)
+        with repo_checkout(git_repo_url) as checkout, open(output_path, "w", encoding="utf-8") as out:
+            state = load_scan_state(git_repo_url, ruleset) if incremental else None
+            diff = diff_commits(checkout["mirror"], state["commit"], checkout["commit"]) if state else None
+            carried = 0
 
-        print("[+] Running Semgrep Code Analysis...")
-        raw_report = analyze_code_with_semgrep(temp_dir)
-        
-        if not raw_report:
-            return {
-                "status": "failure",
-                "error": "Semgrep scan failed."
-            }
-        
-        elif not raw_report.get("results"):
-            return {
-                "status": "failure",
-                "error": "No vulnerabilities found in the code."
-            }
+            if diff is None:
+                print("[+] Running Code Analysis...")
+                raw_report = analyze_code(checkout["path"], out, plugins)
+            else:
+                changed, deleted = diff
+                print(f"[+] Running incremental Code Analysis: {len(changed)} changed, "
+                      f"{len(deleted)} deleted since {state['commit'][:12]}...")
+                # findings of changed and deleted files are replaced by this scan's results
+                for result in carried_results(state, changed + deleted):
+                    write_result(out, result)
+                    carried += 1
+                raw_report = scan_changed_files(checkout["path"], changed, out, plugins)
+
+        if raw_report.get("status") == "failure":
+            return raw_report
+
+        version = raw_report.get("version") or (state.get("version", "") if diff is not None else "")
+        total_results = carried + raw_report.get("total_results", 0)
+        if scan_incomplete(raw_report):
+            # the failed units' files would be carried forward with no findings,
+            # so the next scan starts again from the last complete state (or runs in full)
+            print("[!] Some scanner work units failed, not saving the incremental scan state.")
+        else:
+            save_scan_state(git_repo_url, checkout["commit"], ruleset, version, output_path, total_results)
 
         final_report = {
             "status": "success",
-            "results": raw_report.get("results", []),
             "errors": raw_report.get("errors", []),
             "paths": raw_report.get("paths", {}),
-            "version": raw_report.get("version", "")
+            "version": version,
+            "ruleset": ruleset,
+            "scanners": raw_report.get("scanners", {}),
+            "skipped": raw_report.get("skipped", {}),
+            "commit": checkout["commit"],
+            "incremental": diff is not None
         }
+        if diff is not None:
+            final_report["base_commit"] = state["commit"]
+        if results_path is None:
+            final_report["results"] = load_results(output_path)
+        else:
+            os.replace(output_path, results_path)
+            final_report["results_file"] = results_path
+            final_report["total_results"] = total_results
 
         return final_report
 
     except subprocess.CalledProcessError as e:
-        print("[!] Failed to clone repository:", e)
+        print("[!] Failed to clone repository:", e.stderr or e)
         return {
             "status": "failure",
-            "error": f"Failed to clone repository: {str(e)}"
+            "error": f"Failed to clone repository: {str(e)}",
+            "retryable": True
         }
 
     finally:
-        shutil.rmtree(temp_dir)
+        if os.path.exists(output_path):
+            os.remove(output_path)
+
+
+def code_result_cache_key(git_repo_url, commit, ruleset):
+    version = semgrep_version()
+    if not commit or not version:
+        return None
+    return result_cache_key(git_repo_url, commit, ruleset, version)
 
 
-def code_scanner_handler(git_repo_url: str):
+def code_scanner_handler(git_repo_url: str, incremental=CODE_INCREMENTAL_SCAN):
     
-    results = code_scanner(git_repo_url)
+    reports_dir = SCAN_REPORTS_DIR
+    os.makedirs(reports_dir, exist_ok=True)
+    # concurrent scans start within the same second, the suffix keeps their reports apart
+    filename = os.path.join(reports_dir, f"code_scan_results_{int(time.time())}_{uuid.uuid4().hex[:8]}.json")
+    results_path = os.path.splitext(filename)[0] + ".jsonl"
+
+    try:
+        cache_key = code_result_cache_key(
+            git_repo_url, resolve_remote_commit(git_repo_url), load_scanners()[1]
+        )
+    except subprocess.CalledProcessError as e:
+        print("[!] Could not resolve the remote commit, skipping the result cache:", e.stderr or e)
+        cache_key = None
+
+    if cache_key and fetch_cached_result(cache_key, filename, results_path):
+        print(f"[+] Reusing cached code scan report for {git_repo_url}.")
+        return {
+            "status": "success",
+            "message": f"Code scan completed. Results saved to {filename}",
+            "file": filename
+        }
+
+    results = code_scanner(git_repo_url, incremental=incremental, results_path=results_path)
     
     if results.get("status") == "failure":
+        if os.path.exists(results_path):
+            os.remove(results_path)
         return {
             "status": "failure",
-            "message": results.get("error", "An error occurred during the code scan.")
+            "message": results.get("error", "An error occurred during the code scan."),
+            "retryable": results.get("retryable", False)
         }
     
-    reports_dir = "scan_reports"
-    os.makedirs(reports_dir, exist_ok=True)
-    filename = os.path.join(reports_dir, f"code_scan_results_{int(time.time())}.json")
-    with open(filename, "w") as f:
-        json.dump(results, f, indent=4)
+    write_json_atomic(filename, results)
+
+    # keyed by the commit actually scanned, the branch may have moved since it was resolved
+    scanned_key = code_result_cache_key(git_repo_url, results.get("commit"), results.get("ruleset"))
+    if scanned_key and not scan_incomplete(results):
+        # a partial report under the exact key would be served for this commit until evicted
+        store_result(scanned_key, filename, results_path)
         
     return {
         "status": results.get("status"),
-        "message": f"Code scan completed. Results saved to {filename}"
+        "message": f"Code scan completed. Results saved to {filename}",
+        "file": filename
     }
 
 if __name__ == "__main__":
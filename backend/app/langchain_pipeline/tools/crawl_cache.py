@@ -0,0 +1,208 @@
+import os
+import json
+import time
+import uuid
+import hashlib
+from urllib.parse import urlsplit, parse_qsl
+
+CRAWL_CACHE_DIR = os.getenv("CRAWL_CACHE_DIR", os.path.join("scan_cache", "crawl"))
+# an index older than this triggers a full rescan so carried-forward alerts cannot go stale forever
+CRAWL_CACHE_MAX_AGE = int(os.getenv("CRAWL_CACHE_MAX_AGE", str(7 * 24 * 3600)))
+ZAP_MESSAGE_PAGE_SIZE = int(os.getenv("ZAP_MESSAGE_PAGE_SIZE", "500"))
+
+
+def target_key(url):
+    parts = urlsplit(url.strip())
+    normalized = f"{parts.scheme.lower()}://{parts.netloc.lower()}{parts.path.rstrip('/')}"
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:24]
+
+
+def endpoint_key(method, url):
+    # parameter values change between crawls, parameter names identify the endpoint
+    parts = urlsplit(url)
+    names = sorted({name for name, _ in parse_qsl(parts.query, keep_blank_values=True)})
+    key = f"{(method or 'GET').upper()} {parts.scheme}://{parts.netloc}{parts.path}"
+    return f"{key}?{'&'.join(names)}" if names else key
+
+
+def _index_path(target):
+    return os.path.join(CRAWL_CACHE_DIR, f"{target_key(target)}.json")
+
+
+def _alerts_path(target):
+    return os.path.join(CRAWL_CACHE_DIR, f"{target_key(target)}.alerts.jsonl")
+
+
+def load_crawl_index(target):
+    path = _index_path(target)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            index = json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"[!] Ignoring unreadable crawl index {path}: {e}")
+        return None
+
+    if time.time() - index.get("updated_at", 0) > CRAWL_CACHE_MAX_AGE:
+        print(f"[+] Crawl index for {target} is older than {CRAWL_CACHE_MAX_AGE}s, running a full scan.")
+        return None
+    if not os.path.exists(_alerts_path(target)):
+        return None
+    return index
+
+
+def _write_atomic(path, write):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+
+def _request_line(header):
+    # "GET https://example.com/path?x=1 HTTP/1.1"
+    first_line = (header or "").split("\r\n", 1)[0].split("\n", 1)[0]
+    parts = first_line.split(" ")
+    if len(parts) < 2:
+        return None, None
+    return parts[0], parts[1]
+
+
+def _form_params(request_header, request_body):
+    if not request_body or "application/x-www-form-urlencoded" not in (request_header or "").lower():
+        return []
+    return [name for name, _ in parse_qsl(request_body, keep_blank_values=True)]
+
+
+def iter_messages(zap, baseurl, page_size=ZAP_MESSAGE_PAGE_SIZE):
+    start = 0
+    while True:
+        page = zap.core.messages(baseurl=baseurl, start=str(start), count=str(page_size))
+        if not page:
+            return
+        yield from page
+        if len(page) < page_size:
+            return
+        start += len(page)
+
+
+def snapshot_endpoints(zap, baseurl):
+    endpoints = {}
+    for message in iter_messages(zap, baseurl):
+        method, url = _request_line(message.get("requestHeader"))
+        if not url:
+            continue
+
+        body = message.get("responseBody", "")
+        status = (message.get("responseHeader") or "").split("\n", 1)[0].strip()
+        content_hash = hashlib.sha256(f"{status}\n{body}".encode("utf-8", "replace")).hexdigest()
+        query = [name for name, _ in parse_qsl(urlsplit(url).query, keep_blank_values=True)]
+        params = sorted(set(query) | set(_form_params(message.get("requestHeader"), message.get("requestBody"))))
+
+        endpoints[endpoint_key(method, url)] = {
+            "method": method.upper(),
+            "url": url,
+            "params": params,
+            "content_hash": content_hash,
+            "request_body": message.get("requestBody", "") if method.upper() != "GET" else ""
+        }
+    return endpoints
+
+
+def diff_endpoints(previous, current):
+    changed, unchanged = [], []
+    for key, endpoint in current.items():
+        before = previous.get(key)
+        if before and before["content_hash"] == endpoint["content_hash"] and before["params"] == endpoint["params"]:
+            unchanged.append(key)
+        else:
+            changed.append(key)
+    return changed, unchanged
+
+
+class IncrementalAlertSink:
+    """Routes alerts of a rescan and carries forward cached alerts of unchanged endpoints.
+
+    Live alerts for unchanged endpoints are dropped in favour of the cached
+    ones, which also hold the active-scan findings ZAP did not repeat. Alerts
+    on URLs the crawl snapshot does not know, e.g. requests the active scan
+    made up, are cached under their own key and carried forward unless this
+    scan raised alerts for the same key again.
+    """
+
+    def __init__(self, target, endpoints, unchanged, sink):
+        self.target = target
+        self.endpoints = endpoints
+        self.unchanged = set(unchanged)
+        self.sink = sink
+        self.unmapped_live = set()
+        self.carried = 0
+        self._alerts_tmp = f"{_alerts_path(target)}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(CRAWL_CACHE_DIR, exist_ok=True)
+        self._alerts_out = open(self._alerts_tmp, "w", encoding="utf-8")
+
+    def add_page(self, alerts):
+        live = []
+        for alert in alerts:
+            key = endpoint_key(alert.get("method"), alert.get("url", ""))
+            if key in self.unchanged:
+                continue
+            if key not in self.endpoints:
+                self.unmapped_live.add(key)
+            self._alerts_out.write(json.dumps({"endpoint": key, "alert": alert}) + "\n")
+            live.append(alert)
+        self.sink.add_page(live)
+
+    def _carry_forward(self):
+        path = _alerts_path(self.target)
+        # with nothing unchanged every endpoint was scanned again, unmapped alerts included
+        if not self.unchanged or not os.path.exists(path):
+            return
+
+        page = []
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                record = json.loads(line)
+                key = record["endpoint"]
+                unmapped = key not in self.endpoints and key not in self.unmapped_live
+                if key not in self.unchanged and not unmapped:
+                    continue
+                self._alerts_out.write(line)
+                page.append(record["alert"])
+                self.carried += 1
+                if len(page) >= ZAP_MESSAGE_PAGE_SIZE:
+                    self.sink.add_page(page)
+                    page = []
+        if page:
+            self.sink.add_page(page)
+
+    def finish(self):
+        try:
+            self._carry_forward()
+        finally:
+            self._alerts_out.close()
+
+        os.replace(self._alerts_tmp, _alerts_path(self.target))
+        index = {
+            "target": self.target,
+            "updated_at": time.time(),
+            "endpoints": self.endpoints
+        }
+        _write_atomic(_index_path(self.target), lambda f: json.dump(index, f))
+
+        report = self.sink.finish()
+        report["incremental"] = {
+            "endpoints": len(self.endpoints),
+            "rescanned": len(self.endpoints) - len(self.unchanged),
+            "carried_forward_alerts": self.carried
+        }
+        return report
+
+    def close(self):
+        self._alerts_out.close()
+        if os.path.exists(self._alerts_tmp):
+            os.remove(self._alerts_tmp)
+        close = getattr(self.sink, "close", None)
+        if close:
+            close()
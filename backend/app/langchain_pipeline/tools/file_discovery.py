@@ -0,0 +1,218 @@
+import os
+import re
+
+SCAN_IGNORE_FILE = os.getenv("SCAN_IGNORE_FILE", ".scanignore")
+SCAN_MAX_FILE_BYTES = int(os.getenv("SCAN_MAX_FILE_BYTES", str(1024 * 1024)))
+# data files are only worth scanning while they are small config, not fixtures or dumps
+SCAN_MAX_DATA_FILE_BYTES = int(os.getenv("SCAN_MAX_DATA_FILE_BYTES", str(128 * 1024)))
+SCAN_MAX_AVG_LINE_LENGTH = int(os.getenv("SCAN_MAX_AVG_LINE_LENGTH", "300"))
+SCAN_MAX_LOCKFILE_BYTES = int(os.getenv("SCAN_MAX_LOCKFILE_BYTES", str(64 * 1024 * 1024)))
+SCAN_SNIFF_BYTES = 8192
+
+DATA_EXTENSIONS = {".json", ".xml", ".yml", ".yaml"}
+
+# dependency lockfiles are large and machine-written by design, but they are exactly what SCA reads
+LOCKFILE_NAMES = {
+    "requirements.txt", "requirements-dev.txt", "requirements_dev.txt", "requirements-test.txt", "dev-requirements.txt",
+    "poetry.lock", "package-lock.json", "go.sum", "Cargo.lock"
+}
+
+IGNORED_DIRS = {
+    ".git", ".hg", ".svn", "node_modules", "bower_components", "jspm_packages", "vendor", "third_party",
+    "site-packages", "__pycache__", ".venv", "venv", ".tox", ".mypy_cache", ".pytest_cache",
+    "dist", "build", "target", ".next", ".nuxt", "coverage", ".gradle", ".idea", ".vscode"
+}
+
+GENERATED_NAME_PATTERN = re.compile(
+    r"(\.min\.(js|css)|\.bundle\.js|[-.]chunk\.js|\.pb\.go|_pb2(_grpc)?\.py|\.g\.dart|\.generated\.\w+"
+    r"|\.designer\.cs)$"
+)
+GENERATED_MARKERS = (b"@generated", b"DO NOT EDIT", b"Code generated by", b"auto-generated", b"autogenerated")
+
+
+def _glob_to_regex(pattern):
+    regex, index = "", 0
+    while index < len(pattern):
+        char = pattern[index]
+        if pattern.startswith("**/", index):
+            regex += "(?:.*/)?"
+            index += 3
+            continue
+        if pattern.startswith("**", index):
+            regex += ".*"
+            index += 2
+            continue
+        if char == "*":
+            regex += "[^/]*"
+        elif char == "?":
+            regex += "[^/]"
+        elif char == "[":
+            end = pattern.find("]", index + 1)
+            if end == -1:
+                regex += re.escape(char)
+            else:
+                members = pattern[index + 1:end]
+                regex += "[" + ("^" + members[1:] if members.startswith("!") else members) + "]"
+                index = end
+        else:
+            regex += re.escape(char)
+        index += 1
+    return regex
+
+
+def parse_ignore_file(path):
+    """Reads gitignore-style rules as (regex, negate, dir_only) tuples."""
+    rules = []
+    try:
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines = f.read().splitlines()
+    except OSError:
+        return rules
+
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith("#"):
+            continue
+        negate = line.startswith("!")
+        if negate:
+            line = line[1:]
+        line = line.replace("\\", "")
+        dir_only = line.endswith("/")
+        line = line.rstrip("/")
+        if not line:
+            continue
+        # a slash anywhere but the end anchors the pattern to the ignore file's directory
+        anchored = "/" in line
+        body = _glob_to_regex(line.lstrip("/"))
+        rules.append((re.compile(f"^{body}$" if anchored else f"^(?:.*/)?{body}$"), negate, dir_only))
+    return rules
+
+
+class FileFilter:
+    """Applies ignore rules and size/minified/generated heuristics beneath a repository root.
+
+    .gitignore files are read lazily as their directories are reached, the
+    project-level SCAN_IGNORE_FILE applies from the root.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._rules = {}
+
+    def _dir_rules(self, rel_dir):
+        if rel_dir not in self._rules:
+            directory = os.path.join(self.root, rel_dir)
+            rules = parse_ignore_file(os.path.join(directory, ".gitignore"))
+            if not rel_dir:
+                rules += parse_ignore_file(os.path.join(directory, SCAN_IGNORE_FILE))
+            self._rules[rel_dir] = rules
+        return self._rules[rel_dir]
+
+    def is_ignored(self, rel_path, is_dir=False):
+        name = os.path.basename(rel_path)
+        if is_dir and name in IGNORED_DIRS:
+            return True
+
+        # rules of deeper directories come later and win, as in git
+        ignored = False
+        parts = rel_path.split("/")
+        for depth in range(len(parts)):
+            base = "/".join(parts[:depth])
+            rel_to_base = "/".join(parts[depth:])
+            for regex, negate, dir_only in self._dir_rules(base):
+                if dir_only and not is_dir:
+                    continue
+                if regex.match(rel_to_base):
+                    ignored = not negate
+        return ignored
+
+    def is_path_ignored(self, rel_path):
+        # for a single path from a diff: an ignored parent directory hides it
+        parts = rel_path.split("/")
+        for depth in range(1, len(parts)):
+            if self.is_ignored("/".join(parts[:depth]), is_dir=True):
+                return True
+        return self.is_ignored(rel_path)
+
+    def skip_reason(self, path, size):
+        name = os.path.basename(path)
+        if name in LOCKFILE_NAMES:
+            return "oversized" if size > SCAN_MAX_LOCKFILE_BYTES else None
+        if GENERATED_NAME_PATTERN.search(name):
+            return "generated"
+        limit = SCAN_MAX_DATA_FILE_BYTES if os.path.splitext(name)[1] in DATA_EXTENSIONS else SCAN_MAX_FILE_BYTES
+        if size > limit:
+            return "oversized"
+
+        try:
+            with open(path, "rb") as f:
+                head = f.read(SCAN_SNIFF_BYTES)
+        except OSError:
+            return "unreadable"
+        if any(marker in head[:1024] for marker in GENERATED_MARKERS):
+            return "generated"
+        if len(head) >= 1024 and len(head) / (head.count(b"\n") + 1) > SCAN_MAX_AVG_LINE_LENGTH:
+            return "minified"
+        return None
+
+
+def _wanted(name, extensions, filenames):
+    return name in filenames or os.path.splitext(name)[1] in extensions
+
+
+def discover_files(root, extensions, filenames=()):
+    """Walks root with os.scandir, pruning ignored directories before descending.
+
+    Returns {"files": [...], "skipped": {...}} where skipped lists the
+    repository-relative paths left out and why.
+    """
+    file_filter = FileFilter(root)
+    files = []
+    skipped = {"ignored_dirs": [], "ignored_files": 0, "oversized": [], "minified": [], "generated": [],
+               "unreadable": []}
+    pending = [""]
+
+    while pending:
+        rel_dir = pending.pop()
+        try:
+            with os.scandir(os.path.join(root, rel_dir)) as entries:
+                entries = list(entries)
+        except OSError:
+            continue
+
+        for entry in entries:
+            rel_path = f"{rel_dir}/{entry.name}" if rel_dir else entry.name
+            if entry.is_dir(follow_symlinks=False):
+                if file_filter.is_ignored(rel_path, is_dir=True):
+                    skipped["ignored_dirs"].append(rel_path)
+                else:
+                    pending.append(rel_path)
+                continue
+            if not entry.is_file(follow_symlinks=False) or not _wanted(entry.name, extensions, filenames):
+                continue
+            if file_filter.is_ignored(rel_path):
+                skipped["ignored_files"] += 1
+                continue
+
+            reason = file_filter.skip_reason(entry.path, entry.stat(follow_symlinks=False).st_size)
+            if reason:
+                skipped[reason].append(rel_path)
+            else:
+                files.append(entry.path)
+
+    return {"files": files, "skipped": skipped}
+
+
+def filter_changed_files(root, rel_paths, extensions, filenames=()):
+    """Applies the same rules to repository-relative paths from a commit diff."""
+    file_filter = FileFilter(root)
+    files = []
+    for rel_path in rel_paths:
+        path = os.path.join(root, rel_path)
+        if not _wanted(os.path.basename(rel_path), extensions, filenames) or not os.path.isfile(path):
+            continue
+        if file_filter.is_path_ignored(rel_path):
+            continue
+        if file_filter.skip_reason(path, os.path.getsize(path)) is None:
+            files.append(path)
+    return files
@@ -0,0 +1,51 @@
+import os
+import fcntl
+from contextlib import contextmanager
+
+# flock locks belong to the open file, so the kernel drops them when the holder dies
+
+
+def try_lock(path):
+    """Take an exclusive lock without waiting. Returns the open file or None."""
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    handle = open(path, "a+")
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        handle.close()
+        return None
+    return handle
+
+
+def unlock(handle):
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+    finally:
+        handle.close()
+
+
+def is_locked(path):
+    if not os.path.exists(path):
+        return False
+    handle = try_lock(path)
+    if handle is None:
+        return True
+    unlock(handle)
+    return False
+
+
+@contextmanager
+def file_lock(path, shared=False):
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    with open(path, "a+") as handle:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield handle
+        finally:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
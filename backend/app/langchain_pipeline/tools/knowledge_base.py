@@ -0,0 +1,371 @@
+import os
+import re
+import gzip
+import json
+import sqlite3
+import zipfile
+import argparse
+import tempfile
+import xml.etree.ElementTree as ET
+
+import requests
+
+from langchain_pipeline.tools.file_locks import file_lock
+
+KNOWLEDGE_DB_PATH = os.getenv("KNOWLEDGE_DB_PATH", os.path.join("scan_cache", "knowledge.db"))
+CWE_URL = os.getenv("CWE_URL", "https://cwe.mitre.org/data/xml/cwec_latest.xml.zip")
+CAPEC_URL = os.getenv("CAPEC_URL", "https://capec.mitre.org/data/xml/capec_latest.xml")
+NVD_FEED_URL = os.getenv("NVD_FEED_URL", "https://nvd.nist.gov/feeds/json/cve/2.0/nvdcve-2.0-{year}.json.gz")
+# attack patterns listed per weakness; the rest are a search away
+KNOWLEDGE_MAX_ATTACK_PATTERNS = int(os.getenv("KNOWLEDGE_MAX_ATTACK_PATTERNS", "5"))
+KNOWLEDGE_BATCH_SIZE = int(os.getenv("KNOWLEDGE_BATCH_SIZE", "500"))
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    id TEXT PRIMARY KEY, kind TEXT, name TEXT, description TEXT, mitigations TEXT, severity TEXT, score REAL,
+    related TEXT, refs TEXT
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS entries_fts USING fts5(name, description, content='entries');
+"""
+
+CWE_ID_PATTERN = re.compile(r"CWE-(\d+)", re.IGNORECASE)
+CVE_ID_PATTERN = re.compile(r"CVE-\d{4}-\d{4,}", re.IGNORECASE)
+
+
+def _lock_path():
+    return f"{KNOWLEDGE_DB_PATH}.lock"
+
+
+def open_knowledge_db():
+    """Read-only connection to the local knowledge base, or None when nothing was imported."""
+    if not os.path.exists(KNOWLEDGE_DB_PATH):
+        return None
+    return sqlite3.connect(f"file:{os.path.abspath(KNOWLEDGE_DB_PATH)}?mode=ro", uri=True, timeout=60)
+
+
+def knowledge_db_available():
+    connection = open_knowledge_db()
+    if connection is None:
+        return False
+    connection.close()
+    return True
+
+
+def _local_name(tag):
+    return tag.rsplit("}", 1)[-1]
+
+
+def _text(element):
+    # descriptions embed XHTML; only the words matter here
+    return " ".join("".join(element.itertext()).split()) if element is not None else ""
+
+
+def _children(element, *path):
+    elements = [element]
+    for name in path:
+        elements = [child for parent in elements for child in parent if _local_name(child.tag) == name]
+    return elements
+
+
+def _child_text(element, name):
+    children = _children(element, name)
+    return _text(children[0]) if children else ""
+
+
+def _cwe_entry(weakness):
+    cwe_id = f"CWE-{weakness.get('ID')}"
+    description = " ".join(filter(None, [_child_text(weakness, "Description"),
+                                         _child_text(weakness, "Extended_Description")]))
+    return (
+        cwe_id, "cwe", weakness.get("Name", ""), description,
+        json.dumps([_child_text(mitigation, "Description")
+                    for mitigation in _children(weakness, "Potential_Mitigations", "Mitigation")]),
+        "", None,
+        json.dumps([f"CAPEC-{pattern.get('CAPEC_ID')}"
+                    for pattern in _children(weakness, "Related_Attack_Patterns", "Related_Attack_Pattern")]),
+        json.dumps([f"https://cwe.mitre.org/data/definitions/{weakness.get('ID')}.html"])
+    )
+
+
+def _capec_entry(pattern):
+    return (
+        f"CAPEC-{pattern.get('ID')}", "capec", pattern.get("Name", ""), _child_text(pattern, "Description"),
+        json.dumps([_text(mitigation) for mitigation in _children(pattern, "Mitigations", "Mitigation")]),
+        _child_text(pattern, "Typical_Severity").upper(), None,
+        json.dumps([f"CWE-{weakness.get('CWE_ID')}"
+                    for weakness in _children(pattern, "Related_Weaknesses", "Related_Weakness")]),
+        json.dumps([f"https://capec.mitre.org/data/definitions/{pattern.get('ID')}.html"])
+    )
+
+
+def iter_mitre_entries(f):
+    """Entries of a CWE or CAPEC XML catalog, parsed incrementally."""
+    for _, element in ET.iterparse(f, events=("end",)):
+        name = _local_name(element.tag)
+        if name == "Weakness":
+            yield _cwe_entry(element)
+        elif name == "Attack_Pattern" and element.get("Status") != "Deprecated":
+            yield _capec_entry(element)
+        else:
+            continue
+        element.clear()
+
+
+def _cve_entry(cve):
+    description = next((item["value"] for item in cve.get("descriptions", []) if item.get("lang") == "en"), "")
+    severity, score = "", None
+    for metric in ("cvssMetricV40", "cvssMetricV31", "cvssMetricV30", "cvssMetricV2"):
+        if cve.get("metrics", {}).get(metric):
+            data = cve["metrics"][metric][0]
+            score = data["cvssData"].get("baseScore")
+            severity = data["cvssData"].get("baseSeverity") or data.get("baseSeverity", "")
+            break
+    cwes = sorted({item["value"] for weakness in cve.get("weaknesses", [])
+                   for item in weakness.get("description", []) if CWE_ID_PATTERN.fullmatch(item.get("value", ""))})
+    return (
+        cve["id"], "cve", cve["id"], description, "[]", severity.upper(), score, json.dumps(cwes),
+        json.dumps([reference["url"] for reference in cve.get("references", [])][:20])
+    )
+
+
+def iter_nvd_entries(f):
+    # NVD 2.0 feeds are one JSON document per year
+    for vulnerability in json.load(f).get("vulnerabilities", []):
+        if "cve" in vulnerability:
+            yield _cve_entry(vulnerability["cve"])
+
+
+def _iter_source(source):
+    if zipfile.is_zipfile(source):
+        with zipfile.ZipFile(source) as archive:
+            for name in archive.namelist():
+                with archive.open(name) as f:
+                    yield from _iter_stream(name, f)
+    else:
+        opener = gzip.open if source.endswith(".gz") else open
+        with opener(source, "rb") as f:
+            yield from _iter_stream(source, f)
+
+
+def _iter_stream(name, f):
+    name = name[:-len(".gz")] if name.endswith(".gz") else name
+    if name.endswith(".xml"):
+        yield from iter_mitre_entries(f)
+    elif name.endswith(".json"):
+        yield from iter_nvd_entries(f)
+
+
+def import_knowledge(source):
+    """Imports a CWE/CAPEC XML catalog or an NVD JSON feed (plain, .gz or .zip). Callers hold the lock."""
+    directory = os.path.dirname(KNOWLEDGE_DB_PATH)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+
+    connection = sqlite3.connect(KNOWLEDGE_DB_PATH, timeout=60)
+    total = 0
+    try:
+        connection.execute("PRAGMA journal_mode=WAL")  # scans keep reading while an import runs
+        connection.executescript(SCHEMA)
+        with connection:
+            batch = []
+            for entry in _iter_source(source):
+                batch.append(entry)
+                if len(batch) >= 1000:
+                    connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+                    total += len(batch)
+                    batch = []
+            connection.executemany("INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", batch)
+            total += len(batch)
+            # rebuilt once per import rather than kept in sync row by row
+            connection.execute("INSERT INTO entries_fts(entries_fts) VALUES ('rebuild')")
+    finally:
+        connection.close()
+
+    print(f"[+] Imported {total} knowledge entries from {source}.")
+    return total
+
+
+def fetch_knowledge(url):
+    print(f"[+] Fetching {url}...")
+    suffix = next((ext for ext in (".xml.zip", ".json.gz", ".zip", ".xml", ".json") if url.endswith(ext)), "")
+    fd, download_path = tempfile.mkstemp(suffix=suffix)
+    try:
+        with os.fdopen(fd, "wb") as f, requests.get(url, timeout=300, stream=True) as response:
+            response.raise_for_status()
+            for chunk in response.iter_content(chunk_size=1 << 20):
+                f.write(chunk)
+        return import_knowledge(download_path)
+    finally:
+        os.remove(download_path)
+
+
+def _entry(row):
+    return {
+        "id": row[0],
+        "kind": row[1],
+        "name": row[2],
+        "description": row[3],
+        "mitigations": json.loads(row[4]),
+        "severity": row[5],
+        "score": row[6],
+        "related": json.loads(row[7]),
+        "references": json.loads(row[8])
+    }
+
+
+def lookup_entries(connection, ids):
+    """Fetches entries by ID in one query through a temporary table. Returns {id: entry}."""
+    connection.execute("CREATE TEMP TABLE IF NOT EXISTS wanted_ids (id TEXT PRIMARY KEY)")
+    connection.execute("DELETE FROM wanted_ids")
+    connection.executemany("INSERT OR IGNORE INTO wanted_ids VALUES (?)", [(entry_id,) for entry_id in ids])
+    rows = connection.execute(
+        "SELECT e.id, e.kind, e.name, e.description, e.mitigations, e.severity, e.score, e.related, e.refs "
+        "FROM wanted_ids w JOIN entries e ON e.id = w.id"
+    )
+    return {row[0]: _entry(row) for row in rows}
+
+
+def search_entries(connection, text, kind="cwe", limit=1):
+    """Full-text search over names and descriptions, best match first."""
+    words = re.findall(r"[A-Za-z0-9]{3,}", text)[:12]
+    if not words:
+        return []
+    query = " OR ".join(f'"{word}"' for word in words)
+    rows = connection.execute(
+        "SELECT e.id, e.kind, e.name, e.description, e.mitigations, e.severity, e.score, e.related, e.refs "
+        "FROM entries_fts JOIN entries e ON e.rowid = entries_fts.rowid "
+        "WHERE entries_fts MATCH ? AND e.kind = ? ORDER BY bm25(entries_fts, 10.0, 1.0) LIMIT ?",
+        (query, kind, limit)
+    )
+    return [_entry(row) for row in rows]
+
+
+def finding_ids(finding):
+    """CWE and CVE IDs a code finding or a grouped web alert refers to."""
+    metadata = finding.get("extra", {}).get("metadata", {})
+    cwe_values = metadata.get("cwe", [])
+    cwe_values = [cwe_values] if isinstance(cwe_values, str) else cwe_values
+    cwes = [f"CWE-{number}" for value in cwe_values for number in CWE_ID_PATTERN.findall(str(value))]
+
+    web_cwe = str(finding.get("common", {}).get("cweid", ""))
+    if web_cwe.isdigit() and int(web_cwe) > 0:
+        cwes.append(f"CWE-{web_cwe}")
+
+    cve_values = metadata.get("cve", [])
+    cves = [cve.upper() for value in [*cve_values, finding.get("check_id", "")] for cve in
+            CVE_ID_PATTERN.findall(str(value))]
+    return list(dict.fromkeys(cwes)), list(dict.fromkeys(cves))
+
+
+def attach_knowledge(findings):
+    """Adds a "knowledge" block with CWE, CAPEC and CVE details to each finding, in bulk.
+
+    Findings without any IDs are matched by full-text search on their name
+    or message. Returns the number of findings enriched; 0 when no
+    knowledge base was imported.
+    """
+    connection = open_knowledge_db()
+    if connection is None:
+        return 0
+
+    try:
+        ids = {finding_index: finding_ids(finding) for finding_index, finding in enumerate(findings)}
+        entries = lookup_entries(connection, {entry_id for cwes, cves in ids.values() for entry_id in cwes + cves})
+        attack_patterns = lookup_entries(connection, {
+            related for entry in entries.values() if entry["kind"] == "cwe"
+            for related in entry["related"][:KNOWLEDGE_MAX_ATTACK_PATTERNS]
+        })
+
+        enriched = 0
+        for finding_index, finding in enumerate(findings):
+            cwes, cves = ids[finding_index]
+            matched_by = "id"
+            weaknesses = [entries[cwe] for cwe in cwes if cwe in entries]
+            if not cwes and not cves:
+                title = finding.get("name") or finding.get("extra", {}).get("message", "")
+                weaknesses, matched_by = search_entries(connection, title), "search"
+            knowledge = {
+                "weaknesses": [_weakness_summary(weakness, attack_patterns) for weakness in weaknesses],
+                "cves": [_cve_summary(entries[cve]) for cve in cves if cve in entries],
+                "matched_by": matched_by
+            }
+            if knowledge["weaknesses"] or knowledge["cves"]:
+                finding["knowledge"] = knowledge
+                enriched += 1
+        return enriched
+    finally:
+        connection.close()
+
+
+def with_knowledge(findings, batch_size=KNOWLEDGE_BATCH_SIZE):
+    """Yields findings from any iterable with knowledge attached, one bulk lookup per batch."""
+    batch = []
+    for finding in findings:
+        batch.append(finding)
+        if len(batch) >= batch_size:
+            attach_knowledge(batch)
+            yield from batch
+            batch = []
+    if batch:
+        attach_knowledge(batch)
+        yield from batch
+
+
+def _weakness_summary(weakness, attack_patterns):
+    return {
+        "id": weakness["id"],
+        "name": weakness["name"],
+        "description": weakness["description"],
+        "mitigations": weakness["mitigations"],
+        "references": weakness["references"],
+        "attack_patterns": [
+            {"id": related, "name": attack_patterns[related]["name"]}
+            for related in weakness["related"][:KNOWLEDGE_MAX_ATTACK_PATTERNS] if related in attack_patterns
+        ]
+    }
+
+
+def _cve_summary(cve):
+    return {
+        "id": cve["id"],
+        "description": cve["description"],
+        "severity": cve["severity"],
+        "score": cve["score"],
+        "cwes": cve["related"],
+        "references": cve["references"]
+    }
+
+
+def knowledge_explanation(finding):
+    """A plain-text explanation built from the attached knowledge, in place of an LLM one."""
+    knowledge = finding.get("knowledge")
+    if not knowledge:
+        return ""
+    paragraphs = []
+    for weakness in knowledge["weaknesses"]:
+        paragraphs.append(f"{weakness['id']}: {weakness['name']}. {weakness['description']}")
+        if weakness["mitigations"]:
+            paragraphs.append("Mitigations: " + " ".join(weakness["mitigations"][:3]))
+        if weakness["attack_patterns"]:
+            paragraphs.append("Related attack patterns: " + ", ".join(
+                f"{pattern['id']} {pattern['name']}" for pattern in weakness["attack_patterns"]))
+    for cve in knowledge["cves"]:
+        score = f" (CVSS {cve['score']} {cve['severity']})" if cve["score"] is not None else ""
+        paragraphs.append(f"{cve['id']}{score}: {cve['description']}")
+    return "\n\n".join(paragraphs)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import CWE, CAPEC and CVE data into the local knowledge base.")
+    parser.add_argument("--from-file", action="append", default=[],
+                        help="a CWE/CAPEC XML catalog or NVD JSON feed, for air-gapped hosts")
+    parser.add_argument("--nvd-year", action="append", default=[], help="NVD feed years to fetch")
+    args = parser.parse_args()
+
+    with file_lock(_lock_path()):
+        if args.from_file:
+            for source in args.from_file:
+                import_knowledge(source)
+        else:
+            for url in [CWE_URL, CAPEC_URL, *[NVD_FEED_URL.format(year=year) for year in args.nvd_year]]:
+                fetch_knowledge(url)
@@ -0,0 +1,120 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+from functools import lru_cache
+
+import redis
+
+# stage checkpoints are only read by workers, which must share this directory (see core/celery_app.py)
+CHECKPOINT_DIR = os.path.abspath(os.getenv("CHECKPOINT_DIR", os.path.join("scan_cache", "checkpoints")))
+CHECKPOINT_MAX_AGE = int(os.getenv("CHECKPOINT_MAX_AGE", str(7 * 24 * 3600)))
+# task records are read by the API too, so they live in Redis next to the Celery broker, not on disk
+TASK_RECORD_REDIS_URL = os.getenv("TASK_RECORD_REDIS_URL", os.getenv("REDIS_URL", "redis://localhost:6379/0"))
+TASK_RECORD_PREFIX = "pipeline:task-record:"
+
+TASK_ID_PATTERN = re.compile(r"[A-Za-z0-9_-]{1,128}")
+
+
+def _task_dir(task_id):
+    if not TASK_ID_PATTERN.fullmatch(task_id or ""):
+        raise ValueError(f"Invalid task id: {task_id!r}")
+    return os.path.join(CHECKPOINT_DIR, task_id)
+
+
+def _checkpoint_path(task_id, name):
+    return os.path.join(_task_dir(task_id), f"{name.replace(':', '.')}.json")
+
+
+def _write_json(path, value):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(value, f)
+    os.replace(tmp_path, path)
+
+
+def _read_json(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+
+def input_hash(*values):
+    # everything a stage's outputs depend on, serialized deterministically
+    material = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def save_checkpoint(task_id, name, digest, outputs):
+    _write_json(_checkpoint_path(task_id, name), {
+        "stage": name,
+        "input_hash": digest,
+        "outputs": outputs,
+        "created_at": time.time()
+    })
+
+
+def load_checkpoint(task_id, name, digest):
+    """Outputs of a completed stage, or None unless they were computed from the same inputs."""
+    if not task_id:
+        return None
+    checkpoint = _read_json(_checkpoint_path(task_id, name))
+    if not checkpoint or checkpoint.get("input_hash") != digest:
+        return None
+    if time.time() - checkpoint.get("created_at", 0) > CHECKPOINT_MAX_AGE:
+        return None
+    print(f"[+] Resuming {name} from its checkpoint.")
+    return checkpoint["outputs"]
+
+
+@lru_cache(maxsize=1)
+def _record_store():
+    return redis.Redis.from_url(TASK_RECORD_REDIS_URL)
+
+
+def _record_key(task_id):
+    if not TASK_ID_PATTERN.fullmatch(task_id or ""):
+        raise ValueError(f"Invalid task id: {task_id!r}")
+    return TASK_RECORD_PREFIX + task_id
+
+
+def save_task_record(task_id, request, planning, checkpoint_id=None):
+    # what a resume needs to rebuild the same state: the request, the plan it was given
+    # and, for a run that itself resumed another, whose checkpoints it used
+    record = {
+        "task_id": task_id,
+        "checkpoint_id": checkpoint_id or task_id,
+        "request": request,
+        "planning": planning,
+        "created_at": time.time()
+    }
+    # expires with the checkpoints it points at
+    _record_store().set(_record_key(task_id), json.dumps(record), ex=CHECKPOINT_MAX_AGE)
+
+
+def load_task_record(task_id):
+    value = _record_store().get(_record_key(task_id))
+    return json.loads(value) if value else None
+
+
+def prune_checkpoints(max_age=CHECKPOINT_MAX_AGE):
+    if not os.path.isdir(CHECKPOINT_DIR):
+        return 0
+    pruned = 0
+    for name in os.listdir(CHECKPOINT_DIR):
+        task_dir = os.path.join(CHECKPOINT_DIR, name)
+        try:
+            if time.time() - os.stat(task_dir).st_mtime > max_age:
+                shutil.rmtree(task_dir, ignore_errors=True)
+                pruned += 1
+        except FileNotFoundError:
+            continue
+    if pruned:
+        print(f"[+] Pruned checkpoints of {pruned} tasks.")
+    return pruned
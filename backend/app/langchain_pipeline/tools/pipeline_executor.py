@@ -0,0 +1,184 @@
+import os
+import time
+from dataclasses import dataclass, field, fields
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Optional
+
+PIPELINE_MAX_WORKERS = int(os.getenv("PIPELINE_MAX_WORKERS", "4"))
+
+
+@dataclass
+class PipelineState:
+    """Everything a pipeline run produces; each field is written by exactly one stage."""
+
+    request: dict
+    plan: list
+    planning: dict = field(default_factory=dict)
+    task_id: Optional[str] = None  # the task whose checkpoints this run reads and writes
+    scan_profile: Optional[str] = None
+    scan_results: Any = None
+    fix_results: Any = None
+    explanations: Any = None
+    compliance: Any = None
+    english_report: Any = None
+    urdu_report: Any = None
+    audio_path: Optional[str] = None
+    timings: dict = field(default_factory=dict)
+    errors: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        values = {}
+        for state_field in fields(self):
+            value = getattr(self, state_field.name)
+            values[state_field.name] = value.to_dict() if hasattr(value, "to_dict") else value
+        return values
+
+
+@dataclass(frozen=True)
+class Stage:
+    """One agent in the pipeline graph.
+
+    run(state) returns a dict with a value for each name in outputs.
+    inputs must come from stages in the plan (or the initial state),
+    optional_inputs are waited for only when their producer is planned.
+    """
+
+    name: str
+    run: Callable[[PipelineState], dict]
+    inputs: tuple = ()
+    outputs: tuple = ()
+    optional_inputs: tuple = ()
+    timeout: float = 1800
+
+
+def build_graph(plan, stages):
+    """Maps each planned stage to (stages it waits for, stages it cannot run without).
+
+    Raises ValueError on unknown stages and on inputs nothing produces.
+    """
+    unknown = [name for name in plan if name not in stages]
+    if unknown:
+        raise ValueError(f"Unknown agent: {unknown[0]}")
+
+    producers = {output: name for name in plan for output in stages[name].outputs}
+    initial = {state_field.name for state_field in fields(PipelineState)} - set(
+        output for stage in stages.values() for output in stage.outputs
+    )
+    graph = {}
+    for name in plan:
+        stage = stages[name]
+        requires = set()
+        for required in stage.inputs:
+            if required in producers:
+                requires.add(producers[required])
+            elif required not in initial:
+                raise ValueError(f"{name} needs {required}, which no planned stage produces")
+        after = requires | {producers[optional] for optional in stage.optional_inputs if optional in producers}
+        graph[name] = (after - {name}, requires - {name})
+    return graph
+
+
+def stage_levels(graph):
+    """Planned stages in dependency order, grouped into levels whose stages can run together."""
+    levels, placed = [], set()
+    while len(placed) < len(graph):
+        level = [name for name, (after, _) in graph.items() if name not in placed and after <= placed]
+        if not level:
+            raise ValueError("The plan has a dependency cycle")
+        levels.append(level)
+        placed.update(level)
+    return levels
+
+
+def merge_states(first, second):
+    """Merges two serialized states from parallel branches: the non-empty value wins, dicts merge."""
+    if isinstance(first, dict) and isinstance(second, dict):
+        merged = dict(first)
+        for key, value in second.items():
+            merged[key] = merge_states(first.get(key), value) if key in first else value
+        return merged
+    return second if first in (None, "", [], {}) else first
+
+
+def critical_path(graph, durations):
+    # longest chain of dependent stages, what a run costs with unlimited parallelism
+    finish = {}
+
+    def finish_time(name):
+        if name not in finish:
+            finish[name] = durations.get(name, 0) + max((finish_time(dep) for dep in graph[name][0]), default=0)
+        return finish[name]
+
+    return max((finish_time(name) for name in graph), default=0)
+
+
+def run_stage_graph(state, stages, max_workers=PIPELINE_MAX_WORKERS, on_stage_done=None, restore_stage=None):
+    """Runs state.plan as a dependency graph, every ready stage at once.
+
+    A stage that fails or exceeds its timeout is recorded in state.errors.
+    Stages that require its outputs are skipped, stages that only
+    optionally use them run without them.
+    on_stage_done(name, state) is called after each successful stage.
+    restore_stage(name, state) is asked first and returns True when it
+    filled in the stage's outputs itself, so the stage does not run.
+    """
+    graph = build_graph(state.plan, stages)
+    pending = dict(graph)
+    done, failed = set(), set()
+    running = {}  # future -> (stage name, started, deadline)
+    # a timed-out stage cannot be killed, so the pool must not wait for it on the way out
+    executor = ThreadPoolExecutor(max_workers=max(1, max_workers), thread_name_prefix="stage")
+
+    try:
+        while pending or running:
+            for name, (after, requires) in list(pending.items()):
+                if requires & failed:
+                    state.errors[name] = f"Skipped: {', '.join(sorted(requires & failed))} did not complete"
+                    failed.add(name)
+                    del pending[name]
+                elif after <= done | failed:
+                    del pending[name]
+                    if restore_stage and restore_stage(name, state):
+                        done.add(name)
+                        continue
+                    print(f"[+] Starting stage {name}...")
+                    started = time.monotonic()
+                    future = executor.submit(stages[name].run, state)
+                    running[future] = (name, started, started + stages[name].timeout)
+
+            if not running:
+                continue
+            next_deadline = min(deadline for _, _, deadline in running.values())
+            finished, _ = wait(running, timeout=max(0, next_deadline - time.monotonic()),
+                               return_when=FIRST_COMPLETED)
+
+            for future in finished:
+                name, started, _ = running.pop(future)
+                state.timings[name] = round(time.monotonic() - started, 2)
+                try:
+                    outputs = future.result() or {}
+                    for output in stages[name].outputs:
+                        setattr(state, output, outputs.get(output))
+                    done.add(name)
+                    print(f"[+] Stage {name} completed in {state.timings[name]}s.")
+                    if on_stage_done:
+                        on_stage_done(name, state)
+                except Exception as e:
+                    print(f"[!] Stage {name} failed: {e}")
+                    state.errors[name] = str(e)
+                    failed.add(name)
+
+            now = time.monotonic()
+            for future, (name, started, deadline) in list(running.items()):
+                if now >= deadline:
+                    print(f"[!] Stage {name} timed out after {stages[name].timeout}s.")
+                    state.timings[name] = round(now - started, 2)
+                    state.errors[name] = f"Timed out after {stages[name].timeout}s"
+                    failed.add(name)
+                    future.cancel()
+                    del running[future]
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    state.timings["critical_path"] = round(critical_path(graph, state.timings), 2)
+    return state
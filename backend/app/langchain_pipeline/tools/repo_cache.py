@@ -0,0 +1,212 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import tempfile
+import subprocess
+from contextlib import contextmanager
+
+from langchain_pipeline.tools.file_locks import file_lock, try_lock, unlock
+
+REPO_CACHE_DIR = os.getenv("REPO_CACHE_DIR", os.path.join("scan_cache", "repos"))
+REPO_CACHE_MAX_BYTES = int(os.getenv("REPO_CACHE_MAX_BYTES", str(20 * 2 ** 30)))
+# a fetch this recent is reused as-is; 0 still shares a fetch between scans that were waiting on it
+REPO_FETCH_TTL = int(os.getenv("REPO_FETCH_TTL", "0"))
+
+GIT_ENV = {**os.environ, "GIT_TERMINAL_PROMPT": "0"}
+
+
+def repo_key(git_repo_url):
+    normalized = git_repo_url.strip().rstrip("/")
+    if normalized.endswith(".git"):
+        normalized = normalized[:-len(".git")]
+    return hashlib.sha256(normalized.lower().encode("utf-8")).hexdigest()[:24]
+
+
+def mirror_path(git_repo_url):
+    return os.path.join(REPO_CACHE_DIR, f"{repo_key(git_repo_url)}.git")
+
+
+def _meta_path(key):
+    return os.path.join(REPO_CACHE_DIR, f"{key}.json")
+
+
+def _admin_lock_path(key):
+    # held while fetching or adding/removing worktrees
+    return os.path.join(REPO_CACHE_DIR, f"{key}.lock")
+
+
+def _use_lock_path(key):
+    # held shared for as long as a checkout exists, eviction needs it exclusively
+    return os.path.join(REPO_CACHE_DIR, f"{key}.use")
+
+
+def _git(*args, cwd=None):
+    return subprocess.run(
+        ["git", *args], cwd=cwd, check=True, capture_output=True, text=True, env=GIT_ENV
+    ).stdout.strip()
+
+
+def resolve_remote_commit(git_repo_url, ref="HEAD"):
+    # one round trip to the remote, no clone or fetch
+    output = _git("ls-remote", git_repo_url.strip(), ref)
+    return output.split()[0] if output else None
+
+
+def _load_meta(key):
+    try:
+        with open(_meta_path(key), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return {}
+
+
+def _save_meta(key, meta):
+    path = _meta_path(key)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp_path, path)
+
+
+def _dir_size(path):
+    total = 0
+    for root, _, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(root, filename)).st_size
+            except OSError:
+                pass
+    return total
+
+
+def _clone_mirror(git_repo_url, path):
+    # clone beside the final path and rename, so a crash never leaves a half-cloned mirror in place
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        _git("clone", "--bare", git_repo_url, tmp_path)
+        # bare clones have no fetch refspec; track branches only, not pull request refs
+        _git("config", "remote.origin.fetch", "+refs/heads/*:refs/heads/*", cwd=tmp_path)
+        os.replace(tmp_path, path)
+    finally:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+
+def update_mirror(git_repo_url, requested_at=None):
+    """Clone or fetch the cached mirror of a repository. Caller must hold the admin lock.
+
+    A fetch that finished after requested_at already covers this request.
+    """
+    key = repo_key(git_repo_url)
+    path = mirror_path(git_repo_url)
+    requested_at = time.time() if requested_at is None else requested_at
+    meta = _load_meta(key)
+
+    if not os.path.isdir(path):
+        print(f"[+] Creating repository mirror for {git_repo_url}...")
+        _clone_mirror(git_repo_url, path)
+    elif meta.get("fetched_at", 0) >= requested_at - REPO_FETCH_TTL:
+        print(f"[+] Reusing fresh fetch of {git_repo_url}.")
+        return meta
+    else:
+        print(f"[+] Fetching updates for {git_repo_url}...")
+        _git("fetch", "--prune", "--tags", "origin", cwd=path)
+
+    meta.update({
+        "url": git_repo_url,
+        "fetched_at": time.time(),
+        "last_used": time.time(),
+        "size": _dir_size(path)
+    })
+    _save_meta(key, meta)
+    return meta
+
+
+def _remove_worktree(mirror, worktree):
+    try:
+        _git("worktree", "remove", "--force", worktree, cwd=mirror)
+    except (subprocess.CalledProcessError, OSError):
+        shutil.rmtree(worktree, ignore_errors=True)
+        subprocess.run(["git", "worktree", "prune"], cwd=mirror, capture_output=True, env=GIT_ENV)
+
+
+@contextmanager
+def repo_checkout(git_repo_url, ref="HEAD"):
+    """Check out a repository from the local mirror cache.
+
+    Yields a dict with the worktree "path", the resolved "commit" and the
+    "mirror" it came from. The worktree is removed on exit.
+    """
+    git_repo_url = git_repo_url.strip()
+    key = repo_key(git_repo_url)
+    mirror = mirror_path(git_repo_url)
+    os.makedirs(REPO_CACHE_DIR, exist_ok=True)
+    requested_at = time.time()
+
+    with file_lock(_use_lock_path(key), shared=True):
+        with file_lock(_admin_lock_path(key)):
+            # scans that queued behind this lock see the fetch that just finished and skip theirs
+            meta = update_mirror(git_repo_url, requested_at)
+            commit = _git("rev-parse", "--verify", f"{ref}^{{commit}}", cwd=mirror)
+            worktree = tempfile.mkdtemp(prefix="repo-")
+            try:
+                _git("worktree", "add", "--detach", worktree, commit, cwd=mirror)
+            except subprocess.CalledProcessError:
+                shutil.rmtree(worktree, ignore_errors=True)
+                raise
+            meta["last_used"] = time.time()
+            _save_meta(key, meta)
+
+        evict_repo_cache(keep=key)
+
+        try:
+            yield {"path": worktree, "commit": commit, "mirror": mirror}
+        finally:
+            with file_lock(_admin_lock_path(key)):
+                _remove_worktree(mirror, worktree)
+
+
+def evict_repo_cache(max_bytes=REPO_CACHE_MAX_BYTES, keep=None):
+    # least recently used mirrors go first; mirrors with a live checkout are never touched
+    if not os.path.isdir(REPO_CACHE_DIR):
+        return []
+
+    entries = []
+    for name in os.listdir(REPO_CACHE_DIR):
+        if not name.endswith(".json"):
+            continue
+        key = name[:-len(".json")]
+        meta = _load_meta(key)
+        if meta:
+            entries.append((meta.get("last_used", 0), key, meta.get("size", 0)))
+
+    total = sum(size for _, _, size in entries)
+    evicted = []
+    for _, key, size in sorted(entries):
+        if total <= max_bytes:
+            break
+        if key == keep:
+            continue
+
+        use_handle = try_lock(_use_lock_path(key))
+        if use_handle is None:
+            continue
+        admin_handle = try_lock(_admin_lock_path(key))
+        if admin_handle is None:
+            unlock(use_handle)
+            continue
+        try:
+            shutil.rmtree(os.path.join(REPO_CACHE_DIR, f"{key}.git"), ignore_errors=True)
+            if os.path.exists(_meta_path(key)):
+                os.remove(_meta_path(key))
+            total -= size
+            evicted.append(key)
+        finally:
+            unlock(admin_handle)
+            unlock(use_handle)
+
+    if evicted:
+        print(f"[+] Evicted {len(evicted)} cached repositories, cache now {total / 2 ** 30:.2f} GiB.")
+    return evicted
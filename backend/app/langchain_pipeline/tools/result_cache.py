@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+
+CODE_RESULT_CACHE_DIR = os.getenv("CODE_RESULT_CACHE_DIR", os.path.join("scan_cache", "results"))
+CODE_RESULT_CACHE_MAX_BYTES = int(os.getenv("CODE_RESULT_CACHE_MAX_BYTES", str(2 * 2 ** 30)))
+CODE_RESULT_CACHE_MAX_ENTRIES = int(os.getenv("CODE_RESULT_CACHE_MAX_ENTRIES", "1000"))
+
+
+def result_cache_key(git_repo_url, commit, ruleset, version):
+    # a report is fully determined by what was scanned and what it was scanned with
+    normalized = git_repo_url.strip().rstrip("/").lower()
+    material = "\0".join([normalized, commit, ruleset, version])
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+def _entry_dir(key):
+    return os.path.join(CODE_RESULT_CACHE_DIR, key[:2], key)
+
+
+def link_or_copy(source, destination):
+    """Hard links source to destination, copying where links are unsupported.
+
+    Linked files share an inode, so they are only ever replaced, never written
+    in place; neither branch overwrites an existing destination.
+    """
+    try:
+        os.link(source, destination)
+    except FileExistsError:
+        raise
+    except OSError:
+        with open(source, "rb") as src, open(destination, "xb") as dst:
+            shutil.copyfileobj(src, dst)
+
+
+def write_json_atomic(path, value):
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(value, f, indent=4)
+    os.replace(tmp_path, path)
+
+
+def fetch_cached_result(key, report_path, results_path):
+    """Recreates the cached report at report_path, its findings at results_path. False on a miss."""
+    entry = _entry_dir(key)
+    try:
+        with open(os.path.join(entry, "report.json"), "r", encoding="utf-8") as f:
+            report = json.load(f)
+        link_or_copy(os.path.join(entry, "results.jsonl"), results_path)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return False
+
+    report["results_file"] = results_path
+    write_json_atomic(report_path, report)
+
+    now = time.time()
+    try:
+        os.utime(entry, (now, now))  # the entry's mtime doubles as its last-used time for eviction
+    except OSError:
+        pass
+    return True
+
+
+def store_result(key, report_path, results_path):
+    entry = _entry_dir(key)
+    tmp_entry = f"{entry}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp_entry)
+    try:
+        link_or_copy(report_path, os.path.join(tmp_entry, "report.json"))
+        link_or_copy(results_path, os.path.join(tmp_entry, "results.jsonl"))
+        if os.path.isdir(entry):
+            shutil.rmtree(entry, ignore_errors=True)
+        os.rename(tmp_entry, entry)
+    except OSError as e:
+        # another worker stored the same key first, its entry is just as good
+        print(f"[!] Could not store cached scan report {key[:12]}: {e}")
+    finally:
+        shutil.rmtree(tmp_entry, ignore_errors=True)
+    evict_result_cache()
+
+
+def _entry_size(entry):
+    total = 0
+    for name in ("report.json", "results.jsonl"):
+        try:
+            total += os.stat(os.path.join(entry, name)).st_size
+        except FileNotFoundError:
+            pass
+    return total
+
+
+def evict_result_cache(max_bytes=CODE_RESULT_CACHE_MAX_BYTES, max_entries=CODE_RESULT_CACHE_MAX_ENTRIES):
+    if not os.path.isdir(CODE_RESULT_CACHE_DIR):
+        return 0
+
+    entries = []
+    for prefix in os.listdir(CODE_RESULT_CACHE_DIR):
+        prefix_dir = os.path.join(CODE_RESULT_CACHE_DIR, prefix)
+        if not os.path.isdir(prefix_dir):
+            continue
+        for name in os.listdir(prefix_dir):
+            entry = os.path.join(prefix_dir, name)
+            if name.endswith(".tmp"):
+                continue
+            try:
+                entries.append((os.stat(entry).st_mtime, _entry_size(entry), entry))
+            except FileNotFoundError:
+                continue
+
+    total = sum(size for _, size, _ in entries)
+    count = len(entries)
+    evicted = 0
+    for _, size, entry in sorted(entries):
+        if total <= max_bytes and count <= max_entries:
+            break
+        shutil.rmtree(entry, ignore_errors=True)
+        total -= size
+        count -= 1
+        evicted += 1
+
+    if evicted:
+        print(f"[+] Evicted {evicted} cached scan reports.")
+    return evicted
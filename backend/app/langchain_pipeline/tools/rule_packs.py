@@ -0,0 +1,199 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import argparse
+
+import requests
+from ruamel.yaml import YAML, YAMLError
+
+from langchain_pipeline.tools.file_locks import file_lock
+
+SEMGREP_RULES_DIR = os.getenv("SEMGREP_RULES_DIR", os.path.join("scan_cache", "rules"))
+SEMGREP_RULES_SOURCE = os.getenv("SEMGREP_RULES_SOURCE", os.getenv("SEMGREP_CONFIG", "p/default"))
+SEMGREP_RULES_URL = os.getenv("SEMGREP_RULES_URL", f"https://semgrep.dev/c/{SEMGREP_RULES_SOURCE}")
+# air-gapped hosts never fetch; they use whatever pack was imported with this module's CLI
+SEMGREP_RULES_OFFLINE = os.getenv("SEMGREP_RULES_OFFLINE", "false").lower() in ("1", "true", "yes")
+SEMGREP_RULES_MAX_AGE = int(os.getenv("SEMGREP_RULES_MAX_AGE", str(24 * 3600)))
+SEMGREP_RULES_KEEP_VERSIONS = int(os.getenv("SEMGREP_RULES_KEEP_VERSIONS", "2"))
+
+
+def _yaml():
+    # ruamel.yaml ships with Semgrep (scans/requirements.txt); a YAML instance keeps parser state,
+    # so scan threads each get their own
+    return YAML(typ="safe")
+
+
+# rule files use several names for one language; packs are named after the scanner's languages
+RULE_LANGUAGE_ALIASES = {
+    "py": "python", "python3": "python",
+    "js": "javascript", "ts": "typescript",
+    "golang": "go",
+    "c++": "cpp", "c#": "csharp", "cs": "csharp",
+    "rb": "ruby", "kt": "kotlin", "sh": "bash",
+    "regex": "generic", "none": "generic",
+}
+# rules in these packs are not tied to a language and apply to every shard
+GENERIC_PACKS = ("generic",)
+
+
+def _manifest_path():
+    return os.path.join(SEMGREP_RULES_DIR, "current.json")
+
+
+def _lock_path():
+    return os.path.join(SEMGREP_RULES_DIR, "rules.lock")
+
+
+def load_rule_pack():
+    """Returns the manifest of the installed rule pack, or None. Never touches the network."""
+    try:
+        with open(_manifest_path(), "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    if not os.path.isdir(os.path.join(SEMGREP_RULES_DIR, manifest.get("version", ""))):
+        return None
+    return manifest
+
+
+def _is_fresh(manifest):
+    # a failed refresh counts as a check, so an unreachable registry is not retried on every scan
+    checked_at = max(manifest.get("fetched_at", 0), manifest.get("checked_at", 0))
+    return manifest.get("source") == SEMGREP_RULES_SOURCE and time.time() - checked_at < SEMGREP_RULES_MAX_AGE
+
+
+def _write_manifest(manifest):
+    tmp_path = f"{_manifest_path()}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    os.replace(tmp_path, _manifest_path())
+
+
+def split_rules_by_language(rules):
+    packs = {}
+    for rule in rules:
+        languages = {RULE_LANGUAGE_ALIASES.get(language.lower(), language.lower())
+                     for language in rule.get("languages", [])} or {"generic"}
+        for language in languages:
+            packs.setdefault(language, []).append(rule)
+    return packs
+
+
+def install_rule_pack(content, source=SEMGREP_RULES_SOURCE):
+    """Splits a rule bundle into per-language packs under a content-addressed version directory."""
+    rules = (_yaml().load(content) or {}).get("rules", [])
+    if not rules:
+        raise ValueError(f"No rules found in the {source} rule bundle")
+
+    version = hashlib.sha256(content if isinstance(content, bytes) else content.encode("utf-8")).hexdigest()[:16]
+    version_dir = os.path.join(SEMGREP_RULES_DIR, version)
+    languages = {}
+
+    if not os.path.isdir(version_dir):
+        tmp_dir = f"{version_dir}.{uuid.uuid4().hex}.tmp"
+        os.makedirs(tmp_dir)
+        try:
+            for language, language_rules in split_rules_by_language(rules).items():
+                with open(os.path.join(tmp_dir, f"{language}.yaml"), "w", encoding="utf-8") as f:
+                    _yaml().dump({"rules": language_rules}, f)
+            os.rename(tmp_dir, version_dir)
+        finally:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    for name in os.listdir(version_dir):
+        if name.endswith(".yaml"):
+            languages[name[:-len(".yaml")]] = name
+
+    manifest = {
+        "source": source,
+        "version": version,
+        "fetched_at": time.time(),
+        "total_rules": len(rules),
+        "languages": languages
+    }
+    _write_manifest(manifest)
+    _prune_versions(version)
+
+    print(f"[+] Installed Semgrep rule pack {source}@{version}: {len(rules)} rules, {len(languages)} languages.")
+    return manifest
+
+
+def _prune_versions(current):
+    # the previous version stays around for scans that started before the switch
+    versions = [
+        os.path.join(SEMGREP_RULES_DIR, name) for name in os.listdir(SEMGREP_RULES_DIR)
+        if os.path.isdir(os.path.join(SEMGREP_RULES_DIR, name)) and not name.endswith(".tmp") and name != current
+    ]
+    versions.sort(key=os.path.getmtime, reverse=True)
+    for path in versions[max(0, SEMGREP_RULES_KEEP_VERSIONS - 1):]:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def fetch_rule_pack(url=SEMGREP_RULES_URL, source=SEMGREP_RULES_SOURCE):
+    print(f"[+] Fetching Semgrep rules from {url}...")
+    response = requests.get(url, timeout=60)
+    response.raise_for_status()
+    return install_rule_pack(response.content, source)
+
+
+def ensure_rule_pack():
+    """Returns an installed rule pack, refreshing it when stale and the host is online.
+
+    Falls back to the cached pack when the fetch fails, and to None when
+    there is nothing cached, in which case Semgrep resolves rules itself.
+    """
+    manifest = load_rule_pack()
+    if SEMGREP_RULES_OFFLINE:
+        return manifest
+    if manifest and _is_fresh(manifest):
+        return manifest
+
+    os.makedirs(SEMGREP_RULES_DIR, exist_ok=True)
+    with file_lock(_lock_path()):
+        # another worker may have refreshed it while this one waited
+        latest = load_rule_pack()
+        if latest and _is_fresh(latest):
+            return latest
+        try:
+            return fetch_rule_pack()
+        except (requests.RequestException, ValueError, YAMLError) as e:
+            print(f"[!] Could not refresh Semgrep rules, using the cached pack: {e}")
+            if latest:
+                latest["checked_at"] = time.time()
+                _write_manifest(latest)
+            return latest
+
+
+def ruleset_id(manifest):
+    if not manifest:
+        return SEMGREP_RULES_SOURCE
+    return f"{manifest['source']}@{manifest['version']}"
+
+
+def rule_configs(manifest, language):
+    """Rule files for one language plus the language-independent packs."""
+    version_dir = os.path.join(SEMGREP_RULES_DIR, manifest["version"])
+    names = [language, *[pack for pack in GENERIC_PACKS if pack != language]]
+    return [
+        os.path.abspath(os.path.join(version_dir, manifest["languages"][name]))
+        for name in names if name in manifest["languages"]
+    ]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fetch or import the local Semgrep rule pack.")
+    parser.add_argument("--from-file", help="import a rule bundle file instead of fetching, for air-gapped hosts")
+    parser.add_argument("--url", default=SEMGREP_RULES_URL)
+    args = parser.parse_args()
+
+    os.makedirs(SEMGREP_RULES_DIR, exist_ok=True)
+    with file_lock(_lock_path()):
+        if args.from_file:
+            with open(args.from_file, "rb") as f:
+                pack = install_rule_pack(f.read())
+        else:
+            pack = fetch_rule_pack(args.url)
+    print(json.dumps(pack, indent=4))
@@ -0,0 +1,189 @@
+import os
+import re
+import json
+
+from langchain_pipeline.tools.advisory_db import advisory_db_version, lookup_advisories, normalize_package, \
+    open_advisory_db
+from langchain_pipeline.tools.file_discovery import LOCKFILE_NAMES
+from langchain_pipeline.tools.scan_engine import ScannerPlugin, make_finding
+
+# OSV severities (GitHub's and the Go/Rust ones) in Semgrep terms
+SEVERITIES = {"CRITICAL": "ERROR", "HIGH": "ERROR", "MODERATE": "WARNING", "MEDIUM": "WARNING", "LOW": "INFO"}
+
+REQUIREMENT_PATTERN = re.compile(r"^\s*([A-Za-z0-9][A-Za-z0-9._-]*)\s*(?:\[[^\]]*\])?\s*===?\s*([^\s;#\\]+)")
+TOML_VALUE_PATTERN = re.compile(r'^(name|version)\s*=\s*"([^"]*)"')
+PACKAGE_LOCK_KEY_PATTERN = re.compile(r'^\s*"((?:[^"]*/)?node_modules/[^"]+)"\s*:\s*\{')
+
+
+def _dependency(ecosystem, name, version, line, text):
+    if ecosystem == "Go":
+        version = version[1:] if version.startswith("v") else version  # OSV has Go versions without the "v"
+    return {
+        "ecosystem": ecosystem,
+        "name": name,
+        "package": normalize_package(ecosystem, name),
+        "version": version,
+        "line": line,
+        "text": text.strip()
+    }
+
+
+def parse_requirements(content):
+    # only pinned requirements name a version that can be matched
+    dependencies = []
+    for number, text in enumerate(content.splitlines(), 1):
+        match = REQUIREMENT_PATTERN.match(text)
+        if match:
+            dependencies.append(_dependency("PyPI", match.group(1), match.group(2), number, text))
+    return dependencies
+
+
+def parse_toml_packages(content, ecosystem):
+    """[[package]] tables of poetry.lock and Cargo.lock, read line by line to keep line numbers."""
+    dependencies, current = [], None
+    for number, text in enumerate(content.splitlines(), 1):
+        stripped = text.strip()
+        if stripped.startswith("["):
+            current = {} if stripped == "[[package]]" else None
+            continue
+        match = TOML_VALUE_PATTERN.match(stripped) if current is not None else None
+        if not match:
+            continue
+        current[match.group(1)] = (match.group(2), number, text)
+        if "name" in current and "version" in current:
+            name, line, name_text = current["name"]
+            dependencies.append(_dependency(ecosystem, name, current["version"][0], line, name_text))
+            current = None
+    return dependencies
+
+
+def parse_package_lock(content):
+    lockfile = json.loads(content)
+    key_lines = {}
+    for number, text in enumerate(content.splitlines(), 1):
+        match = PACKAGE_LOCK_KEY_PATTERN.match(text)
+        if match:
+            key_lines.setdefault(match.group(1), (number, text))
+
+    dependencies = []
+    if lockfile.get("packages"):
+        # lockfileVersion 2 and 3: flat "node_modules/a/node_modules/b" keys
+        for key, package in lockfile["packages"].items():
+            if not key or package.get("link") or not package.get("version"):
+                continue
+            name = package.get("name") or key.rsplit("node_modules/", 1)[-1]
+            line, text = key_lines.get(key, (1, ""))
+            dependencies.append(_dependency("npm", name, package["version"], line, text))
+        return dependencies
+
+    # lockfileVersion 1: nested "dependencies" objects
+    pending = list(lockfile.get("dependencies", {}).items())
+    while pending:
+        name, package = pending.pop()
+        if package.get("version") and not package["version"].startswith(("file:", "link:", "git")):
+            dependencies.append(_dependency("npm", name, package["version"], 1, f'"{name}": "{package["version"]}"'))
+        pending.extend(package.get("dependencies", {}).items())
+    return dependencies
+
+
+def parse_go_sum(content):
+    # "/go.mod" lines only pin the module graph; the other line is the module actually built
+    dependencies, seen = [], set()
+    for number, text in enumerate(content.splitlines(), 1):
+        parts = text.split()
+        if len(parts) != 3 or parts[1].endswith("/go.mod") or (parts[0], parts[1]) in seen:
+            continue
+        seen.add((parts[0], parts[1]))
+        dependencies.append(_dependency("Go", parts[0], parts[1], number, text))
+    return dependencies
+
+
+LOCKFILE_PARSERS = {
+    "poetry.lock": lambda content: parse_toml_packages(content, "PyPI"),
+    "Cargo.lock": lambda content: parse_toml_packages(content, "crates.io"),
+    "package-lock.json": parse_package_lock,
+    "go.sum": parse_go_sum,
+}
+
+
+def parse_lockfile(path):
+    name = os.path.basename(path)
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        content = f.read()
+    parser = LOCKFILE_PARSERS.get(name)
+    if parser is None and name.endswith(".txt"):
+        parser = parse_requirements
+    return parser(content) if parser else []
+
+
+def advisory_finding(path, dependency, advisory):
+    cves = [alias for alias in advisory["aliases"] if alias.startswith("CVE-")]
+    fixed = ", ".join(advisory["fixed"])
+    message = f"{dependency['name']} {dependency['version']} is affected by {advisory['id']}"
+    message += f" ({', '.join(cves)})" if cves else ""
+    message += f": {advisory['summary'] or advisory['details'][:200]}"
+    message += f" Upgrade to {fixed}." if fixed else " No fixed version is available."
+
+    return make_finding(
+        f"sca.{advisory['id']}",
+        path,
+        dependency["line"],
+        message=message,
+        severity=SEVERITIES.get(advisory["severity"], "WARNING"),
+        lines=dependency["text"],
+        metadata={
+            "cwe": advisory["cwes"],
+            "cve": cves,
+            "category": "security",
+            "subcategory": ["vulnerable-dependency"],
+            "confidence": "HIGH",
+            "advisory": advisory["id"],
+            "ecosystem": dependency["ecosystem"],
+            "package": dependency["name"],
+            "version": dependency["version"],
+            "fixed_versions": advisory["fixed"],
+            "references": advisory["references"][:10]
+        }
+    )
+
+
+class DependencyPlugin(ScannerPlugin):
+    """Software composition analysis: lockfile versions matched against the local advisory database."""
+
+    name = "sca"
+    filenames = frozenset(LOCKFILE_NAMES)
+
+    def version(self):
+        # the database version, so results are rescanned after every advisory import
+        return advisory_db_version() or "none"
+
+    @classmethod
+    def scan(cls, unit, emit):
+        connection = open_advisory_db()
+        if connection is None:
+            print("[!] No advisory database, import one with: python -m langchain_pipeline.tools.advisory_db")
+            return {"errors": [{"type": "AdvisoryDatabaseMissing", "level": "warn",
+                                "message": "No local advisory database, dependencies were not checked"}],
+                    "paths": {"scanned": []}}
+
+        errors, scanned, dependencies = [], [], []
+        try:
+            for path in unit:
+                try:
+                    dependencies.extend((path, dependency) for dependency in parse_lockfile(path))
+                    scanned.append(path)
+                except (OSError, ValueError) as e:
+                    errors.append({"type": "LockfileParseError", "level": "warn", "message": str(e), "path": path})
+
+            # one bulk query for every dependency of every lockfile in the unit
+            matches = lookup_advisories(
+                connection, [(dep["ecosystem"], dep["package"], dep["version"]) for _, dep in dependencies]
+            )
+        finally:
+            connection.close()
+
+        for path, dependency in dependencies:
+            key = (dependency["ecosystem"], dependency["package"], dependency["version"])
+            for advisory in matches.get(key, []):
+                emit(advisory_finding(path, dependency, advisory))
+        return {"errors": errors, "paths": {"scanned": scanned}}
@@ -0,0 +1,94 @@
+import os
+import time
+from dataclasses import dataclass, field
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_pipeline.tools.code_scanner import code_scanner_handler
+from langchain_pipeline.tools.web_scanner import web_scanner_handler
+
+# the ReAct agent was told to retry a failed scan; the dispatcher keeps that, without the round trips,
+# for the failures the handlers mark retryable (clone, Docker, ZAP lease), not for scans that ran
+SCAN_DISPATCH_RETRIES = int(os.getenv("SCAN_DISPATCH_RETRIES", "2"))
+GIT_HOSTS = {"github.com", "gitlab.com", "bitbucket.org", "codeberg.org"}
+
+
+@dataclass
+class ScanResults:
+    """Where each scan saved its report; an empty path means that scan did not run or failed."""
+
+    code_scan_file: str = ""
+    web_scan_file: str = ""
+    errors: dict = field(default_factory=dict)
+    durations: dict = field(default_factory=dict)
+
+    def to_dict(self):
+        return {
+            "code_scan_file": self.code_scan_file,
+            "web_scan_file": self.web_scan_file,
+            "errors": dict(self.errors),
+            "durations": dict(self.durations)
+        }
+
+
+def classify_source(source):
+    url = urlparse(source)
+    if url.path.endswith(".git") or url.hostname in GIT_HOSTS or url.scheme in ("git", "ssh"):
+        return "code"
+    return "web"
+
+
+def plan_scans(scan_sources, scan_types):
+    """Pairs each source with its scan type as submit_form built them, classifying when they do not line up."""
+    if len(scan_sources) == len(scan_types):
+        pairs = list(zip(scan_types, scan_sources))
+    else:
+        pairs = [(classify_source(source), source) for source in scan_sources]
+    return [(scan_type, source) for scan_type, source in pairs if scan_type in scan_types]
+
+
+def run_scan(scan_type, source, scan_profile=None):
+    """Runs one scan, retrying transient failures. Returns the handler's result with "duration" added."""
+    started = time.monotonic()
+    for attempt in range(SCAN_DISPATCH_RETRIES + 1):
+        if scan_type == "code":
+            result = code_scanner_handler(source)
+        else:
+            result = web_scanner_handler(source, profile=scan_profile)
+        result["duration"] = round(time.monotonic() - started, 1)
+        if result.get("status") == "success" and result.get("file"):
+            return result
+        print(f"[!] {scan_type} scan of {source} failed (attempt {attempt + 1}): {result.get('message')}")
+        if not result.get("retryable"):
+            break
+    return result
+
+
+def dispatch_scans(scan_sources, scan_types, scan_profile=None, run=run_scan):
+    """Runs the code and web scans for the given sources concurrently. Returns ScanResults.
+
+    run(scan_type, source, scan_profile) performs one scan, run_scan unless the caller wraps it.
+    """
+    results = ScanResults()
+    jobs = plan_scans(scan_sources, scan_types)
+    if not jobs:
+        return results
+
+    with ThreadPoolExecutor(max_workers=len(jobs), thread_name_prefix="dispatch") as executor:
+        futures = []
+        for scan_type, source in jobs:
+            print(f"[+] Dispatching {scan_type} scan of {source}...")
+            futures.append((scan_type, executor.submit(run, scan_type, source, scan_profile)))
+
+        for scan_type, future in futures:
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"status": "failure", "message": str(e)}
+            results.durations[scan_type] = result.get("duration")
+
+            if result.get("status") == "success" and result.get("file"):
+                setattr(results, f"{scan_type}_scan_file", result["file"])
+            else:
+                results.errors[scan_type] = result.get("message", "Scan failed")
+    return results
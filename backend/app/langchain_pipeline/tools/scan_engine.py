@@ -0,0 +1,213 @@
+import os
+import json
+import atexit
+import shutil
+import tempfile
+import importlib
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from celery.exceptions import SoftTimeLimitExceeded
+
+from langchain_pipeline.tools.file_discovery import LOCKFILE_NAMES
+
+CODE_SCAN_WORKERS = int(os.getenv("CODE_SCAN_WORKERS", os.getenv("SEMGREP_WORKERS", str(os.cpu_count() or 1))))
+CODE_SCANNERS = [name.strip() for name in os.getenv("CODE_SCANNERS", "semgrep,secrets,sca").split(",") if name.strip()]
+
+# plugins are referenced by import path so worker processes can load them on their own
+SCANNER_PLUGINS = {
+    "semgrep": "langchain_pipeline.tools.semgrep_runner:SemgrepPlugin",
+    "secrets": "langchain_pipeline.tools.secrets_scanner:SecretsPlugin",
+    "sca": "langchain_pipeline.tools.sca_scanner:DependencyPlugin",
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class ScannerPlugin:
+    """A code scanner run by the scan engine over a shared checkout.
+
+    A plugin declares the files it handles, splits them into picklable work
+    units in the parent process, and scans each unit in a worker process,
+    emitting findings in the Semgrep result schema (see make_finding).
+    """
+
+    name = None
+    extensions = frozenset()
+    filenames = frozenset()
+
+    def __init__(self, context=None):
+        self.context = context or {}
+
+    def handles(self, path):
+        name = os.path.basename(path)
+        if name in LOCKFILE_NAMES:
+            # lockfiles bypass discovery's size heuristics, so only plugins that name them get them
+            return name in self.filenames
+        return name in self.filenames or os.path.splitext(name)[1] in self.extensions
+
+    def version(self):
+        return ""
+
+    def plan(self, files):
+        return [files] if files else []
+
+    @classmethod
+    def scan(cls, unit, emit):
+        """Scans one work unit, calling emit(finding) per finding. Returns errors/paths metadata."""
+        raise NotImplementedError
+
+
+def make_finding(check_id, path, start_line, end_line=None, start_offset=None, end_offset=None, message="",
+                 severity="WARNING", lines="", metadata=None, start_col=1, end_col=1):
+    # the Semgrep result shape, which code_explainer and the snippet enrichment already understand
+    return {
+        "check_id": check_id,
+        "path": path,
+        "start": {"line": start_line, "col": start_col, "offset": start_offset},
+        "end": {"line": end_line or start_line, "col": end_col, "offset": end_offset},
+        "extra": {
+            "message": message,
+            "severity": severity,
+            "lines": lines,
+            "metadata": metadata or {}
+        }
+    }
+
+
+def register_scanner(name, plugin_path):
+    SCANNER_PLUGINS[name] = plugin_path
+
+
+def load_plugin_class(plugin_path):
+    module_name, class_name = plugin_path.split(":")
+    return getattr(importlib.import_module(module_name), class_name)
+
+
+def enabled_plugins(names=None, context=None):
+    plugins = []
+    for name in names or CODE_SCANNERS:
+        if name not in SCANNER_PLUGINS:
+            print(f"[!] Unknown code scanner plugin: {name}")
+            continue
+        plugins.append(load_plugin_class(SCANNER_PLUGINS[name])(context))
+    return plugins
+
+
+def get_scan_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # daemonic processes, e.g. Celery prefork children, cannot start a process pool;
+            # plugins that shell out still run in parallel on threads there. The scan-code
+            # queue is meant for a thread-pool worker, whose main process can (core/celery_app.py)
+            if multiprocessing.current_process().daemon:
+                _executor = ThreadPoolExecutor(max_workers=max(1, CODE_SCAN_WORKERS), thread_name_prefix="scan")
+            else:
+                # spawned, not forked: a thread-pool worker forking mid-task could copy a held lock
+                _executor = ProcessPoolExecutor(max_workers=max(1, CODE_SCAN_WORKERS),
+                                                mp_context=multiprocessing.get_context("spawn"))
+        return _executor
+
+
+def close_scan_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(cancel_futures=True)
+            _executor = None
+
+
+atexit.register(close_scan_executor)
+
+
+def run_work_unit(plugin_path, unit, output_path):
+    # runs in a worker: findings go to a JSON lines file, only metadata is sent back
+    plugin_class = load_plugin_class(plugin_path)
+    total_results = 0
+    with open(output_path, "w", encoding="utf-8") as out:
+        def emit(finding):
+            nonlocal total_results
+            total_results += 1
+            out.write(json.dumps(finding) + "\n")
+
+        metadata = plugin_class.scan(unit, emit) or {}
+    metadata["total_results"] = total_results
+    return metadata
+
+
+def _read_unit_output(output_path, scanner, on_result):
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                finding = json.loads(line)
+                finding["scanner"] = scanner
+                on_result(finding)
+
+
+def run_scanners(files, on_result, context=None, plugins=None):
+    """Runs the enabled scanner plugins concurrently over files and merges their findings.
+
+    Every work unit of every plugin goes to the shared executor at once;
+    findings are then read back one unit at a time and passed to on_result.
+    Returns the merged errors and paths, per-scanner versions and counts,
+    and "total_results".
+    """
+    plugins = plugins if plugins is not None else enabled_plugins(context=context)
+    output_dir = tempfile.mkdtemp(prefix="code-scan-")
+    executor = get_scan_executor()
+    jobs = []
+
+    try:
+        for plugin in plugins:
+            plugin_files = [path for path in files if plugin.handles(path)]
+            units = plugin.plan(plugin_files)
+            print(f"[+] {plugin.name}: {len(plugin_files)} files in {len(units)} work units.")
+            plugin_path = SCANNER_PLUGINS.get(plugin.name) or f"{type(plugin).__module__}:{type(plugin).__name__}"
+            for unit in units:
+                output_path = os.path.join(output_dir, f"unit-{len(jobs)}.jsonl")
+                future = executor.submit(run_work_unit, plugin_path, unit, output_path)
+                jobs.append((plugin, output_path, future))
+
+        merged = {"errors": [], "paths": {"scanned": []}, "version": "", "scanners": {}, "total_results": 0}
+        for plugin in plugins:
+            merged["scanners"][plugin.name] = {"version": plugin.version(), "total_results": 0, "failed_units": 0}
+
+        for plugin, output_path, future in jobs:
+            summary = merged["scanners"][plugin.name]
+            try:
+                metadata = future.result()
+                _read_unit_output(output_path, plugin.name, on_result)
+            except SoftTimeLimitExceeded:
+                # the Celery task's time limit, not a failed unit: the task has to stop, not carry on
+                raise
+            except Exception as e:
+                print(f"[!] {plugin.name} work unit failed: {e}")
+                metadata = {
+                    "errors": [{"type": "ScannerFailure", "level": "error", "scanner": plugin.name, "message": str(e)}],
+                    "failed": True
+                }
+
+            merged["errors"].extend(metadata.get("errors", []))
+            merged["paths"]["scanned"].extend(metadata.get("paths", {}).get("scanned", []))
+            summary["version"] = summary["version"] or metadata.get("version", "")
+            summary["total_results"] += metadata.get("total_results", 0)
+            summary["failed_units"] += 1 if metadata.get("failed") else 0
+            merged["total_results"] += metadata.get("total_results", 0)
+    finally:
+        shutil.rmtree(output_dir, ignore_errors=True)
+
+    if jobs and sum(summary["failed_units"] for summary in merged["scanners"].values()) == len(jobs):
+        raise RuntimeError(merged["errors"][0]["message"] if merged["errors"] else "Every code scanner failed")
+
+    # the report's top-level version stays the Semgrep version it always was
+    merged["version"] = merged["scanners"].get("semgrep", {}).get("version", "")
+    return merged
+
+
+def scan_incomplete(scan_output):
+    """True when some work unit failed, so the files it held have no findings in the output."""
+    if any(summary.get("failed_units") for summary in scan_output.get("scanners", {}).values()):
+        return True
+    return any(error.get("type") == "ScannerFailure" for error in scan_output.get("errors", []))
@@ -0,0 +1,112 @@
+import os
+
+# ZAP active scan rules used by the quick profile: injection, XSS, traversal and redirects
+QUICK_ASCAN_PLUGINS = [
+    "6",      # Path Traversal
+    "7",      # Remote File Inclusion
+    "20019",  # External Redirect
+    "40012",  # Cross Site Scripting (Reflected)
+    "40014",  # Cross Site Scripting (Persistent)
+    "40018",  # SQL Injection
+    "90020",  # Remote OS Command Injection
+]
+
+# durations are in minutes where ZAP expects minutes, budget is wall-clock seconds
+SCAN_PROFILES = {
+    "quick": {
+        "ajax_spider": False,
+        "spider_max_depth": 2,
+        "spider_threads": 4,
+        "spider_max_duration": 2,
+        "ajax_spider_max_duration": 2,
+        "ascan_plugins": QUICK_ASCAN_PLUGINS,
+        "ascan_threads_per_host": 4,
+        "ascan_max_rule_duration": 1,
+        "budget": 10 * 60
+    },
+    "standard": {
+        "ajax_spider": False,
+        "spider_max_depth": 5,
+        "spider_threads": 8,
+        "spider_max_duration": 10,
+        "ajax_spider_max_duration": 10,
+        "ascan_plugins": None,
+        "ascan_threads_per_host": 8,
+        "ascan_max_rule_duration": 5,
+        "budget": 60 * 60
+    },
+    "deep": {
+        "ajax_spider": True,
+        "spider_max_depth": 0,
+        "spider_threads": 8,
+        "spider_max_duration": 0,
+        "ajax_spider_max_duration": 60,
+        "ascan_plugins": None,
+        "ascan_threads_per_host": 8,
+        "ascan_max_rule_duration": 0,
+        "budget": 6 * 60 * 60
+    }
+}
+
+DEFAULT_SCAN_PROFILE = os.getenv("ZAP_DEFAULT_PROFILE", "standard")
+
+# planner depth -> scan profile
+DEPTH_PROFILES = {
+    "minimal": "quick",
+    "cve": "quick",
+    "fixes": "standard",
+    "full": "deep"
+}
+
+# depths whose explanations are worth an LLM call per finding
+EXPLAIN_LLM_DEPTHS = {"fixes", "full"}
+
+
+def plan_depth(plan):
+    # the planner returns agent names, the depth is the deepest agent it asked for
+    agents = set(plan or [])
+    if agents & {"ComplianceAgent", "NarrationAgent"}:
+        return "full"
+    if "FixAgent" in agents:
+        return "fixes"
+    if "ExplainAgent" in agents:
+        return "cve"
+    return "minimal"
+
+
+def explain_uses_llm(plan):
+    # shallow plans take their explanations from the local CWE/CVE knowledge base
+    return plan_depth(plan) in EXPLAIN_LLM_DEPTHS
+
+
+def profile_for_plan(plan):
+    if not plan:
+        return DEFAULT_SCAN_PROFILE
+    return DEPTH_PROFILES[plan_depth(plan)]
+
+
+def get_scan_profile(profile=None):
+    if isinstance(profile, dict):
+        return {"name": "custom", **SCAN_PROFILES[DEFAULT_SCAN_PROFILE], **profile}
+
+    name = profile or DEFAULT_SCAN_PROFILE
+    if name not in SCAN_PROFILES:
+        print(f"[!] Unknown scan profile '{name}', using '{DEFAULT_SCAN_PROFILE}'.")
+        name = DEFAULT_SCAN_PROFILE
+    return {"name": name, **SCAN_PROFILES[name]}
+
+
+def apply_scan_profile(zap, profile):
+    # options persist on a pooled daemon, so every profile sets all of them
+    zap.spider.set_option_max_depth(profile["spider_max_depth"])
+    zap.spider.set_option_thread_count(profile["spider_threads"])
+    zap.spider.set_option_max_duration(profile["spider_max_duration"])
+    zap.ajaxSpider.set_option_max_duration(profile["ajax_spider_max_duration"])
+    zap.ascan.set_option_thread_per_host(profile["ascan_threads_per_host"])
+    zap.ascan.set_option_max_rule_duration_in_mins(profile["ascan_max_rule_duration"])
+
+    if profile["ascan_plugins"]:
+        zap.ascan.disable_all_scanners()
+        zap.ascan.enable_scanners(",".join(profile["ascan_plugins"]))
+    else:
+        zap.ascan.enable_all_scanners()
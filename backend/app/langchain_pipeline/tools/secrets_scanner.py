@@ -0,0 +1,199 @@
+import os
+import re
+import math
+import mmap
+import hashlib
+from collections import Counter
+
+from langchain_pipeline.tools.scan_engine import ScannerPlugin, make_finding
+from langchain_pipeline.tools.semgrep_runner import SEMGREP_EXTENSIONS
+
+SECRETS_MIN_ENTROPY = float(os.getenv("SECRETS_MIN_ENTROPY", "3.5"))
+SECRETS_UNIT_BYTES = int(os.getenv("SECRETS_UNIT_BYTES", str(32 * 2 ** 20)))
+SECRETS_UNIT_FILES = int(os.getenv("SECRETS_UNIT_FILES", "500"))
+
+SECRETS_CWE = ["CWE-798: Use of Hard-coded Credentials"]
+
+# (rule id, description, severity, triggers, pattern, entropy checked)
+# triggers are lowercase literals, one of which every match contains; a pattern may capture
+# the secret itself as (?P<value>...), otherwise the whole match is the secret
+SECRET_RULES = [
+    ("aws-access-key-id", "AWS access key ID", "ERROR", [b"akia", b"asia"],
+     rb"\b(?:AKIA|ASIA)[0-9A-Z]{16}\b", False),
+    ("aws-secret-access-key", "AWS secret access key", "ERROR", [b"secret"],
+     rb"(?i:aws.{0,20}?secret.{0,20}?)[\"'=:\s]{1,4}(?P<value>[0-9A-Za-z/+]{40})\b", True),
+    ("github-token", "GitHub token", "ERROR", [b"ghp_", b"gho_", b"ghu_", b"ghs_", b"ghr_"],
+     rb"\bgh[pousr]_[A-Za-z0-9]{36,255}\b", False),
+    ("gitlab-token", "GitLab personal access token", "ERROR", [b"glpat-"], rb"\bglpat-[A-Za-z0-9_-]{20}\b", False),
+    ("slack-token", "Slack token", "ERROR", [b"xox"], rb"\bxox[abposr]-[0-9A-Za-z-]{10,}\b", False),
+    ("slack-webhook", "Slack webhook URL", "WARNING", [b"hooks.slack.com"],
+     rb"https://hooks\.slack\.com/services/T[A-Za-z0-9_]+/B[A-Za-z0-9_]+/[A-Za-z0-9_]+", False),
+    ("google-api-key", "Google API key", "ERROR", [b"aiza"], rb"\bAIza[0-9A-Za-z_-]{35}\b", False),
+    ("stripe-secret-key", "Stripe secret key", "ERROR", [b"k_live_"], rb"\b[rs]k_live_[0-9A-Za-z]{24,}\b", False),
+    ("sendgrid-api-key", "SendGrid API key", "ERROR", [b"sg."],
+     rb"\bSG\.[A-Za-z0-9_-]{22}\.[A-Za-z0-9_-]{43}\b", False),
+    ("private-key", "Private key", "ERROR", [b"-----begin"],
+     rb"-----BEGIN (?:RSA |EC |DSA |OPENSSH |ENCRYPTED |PGP )?PRIVATE KEY(?: BLOCK)?-----", False),
+    ("jwt", "JSON Web Token", "WARNING", [b"eyj"],
+     rb"\beyJ[A-Za-z0-9_-]{10,}\.eyJ[A-Za-z0-9_-]{10,}\.[A-Za-z0-9_-]{10,}", True),
+    ("credential-in-url", "Credentials in URL", "WARNING", [b"://"],
+     rb"\b[a-z][a-z0-9+.-]{1,20}://[^\s:/@\"']{1,64}:(?P<value>[^\s:/@\"']{6,128})@[\w.-]+", True),
+    ("generic-secret", "Hard-coded secret", "WARNING",
+     [b"passw", b"pwd", b"secret", b"token", b"apikey", b"api_key", b"api-key", b"access_key", b"access-key",
+      b"auth_key", b"auth-key"],
+     rb"(?i:passw(?:or)?d|pwd|secret|token|api[_-]?key|access[_-]?key|auth[_-]?key|client[_-]?secret)"
+     rb"[\w.-]{0,20}[\"']?\s{0,3}(?:=|:|=>|:=)\s{0,3}[\"'](?P<value>[^\"'\s]{8,200})[\"']", True),
+]
+TRIGGERS = sorted({trigger for rule in SECRET_RULES for trigger in rule[3]})
+TRIGGER_PATTERN = re.compile(b"|".join(re.escape(trigger) for trigger in TRIGGERS), re.IGNORECASE)
+
+# values that look like secrets but are templates, references or examples
+PLACEHOLDER_PATTERN = re.compile(
+    rb"^(?:\$\{.*\}|\{\{.*\}\}|<.*>|%\(.*\)s|process\.env.*|os\.environ.*|.*(?:example|changeme|placeholder|dummy"
+    rb"|your[_-]|xxxx|\*\*\*\*|redacted).*)$",
+    re.IGNORECASE
+)
+
+
+def _combined_pattern():
+    # one pass per file: every rule is an alternative with its own group, value groups are renamed per rule
+    parts = []
+    for index, (_, _, _, _, pattern, _) in enumerate(SECRET_RULES):
+        parts.append(b"(?P<r%d>%s)" % (index, pattern.replace(b"(?P<value>", b"(?P<v%d>" % index)))
+    return re.compile(b"|".join(parts))
+
+
+COMBINED_PATTERN = _combined_pattern()
+
+
+def shannon_entropy(value):
+    if not value:
+        return 0.0
+    counts = Counter(value)
+    return -sum(count / len(value) * math.log2(count / len(value)) for count in counts.values())
+
+
+def _redact(line, secret):
+    visible = secret[:4] if len(secret) > 12 else b""
+    return line.replace(secret, visible + b"*" * 8)
+
+
+def candidate_lines(content):
+    """Start offsets of the lines holding any trigger literal.
+
+    One pass of the case-insensitive trigger alternation straight over the
+    mapped file, so no lowered copy is made, and the combined pattern only
+    sees these lines instead of trying every rule at every position.
+    """
+    line_starts = []
+    match = TRIGGER_PATTERN.search(content)
+    while match:
+        line_starts.append(content.rfind(b"\n", 0, match.start()) + 1)
+        line_end = content.find(b"\n", match.end())
+        if line_end == -1:
+            break
+        match = TRIGGER_PATTERN.search(content, line_end + 1)
+    return line_starts
+
+
+def scan_file(path, emit):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+            if b"\0" in content[:1024]:
+                return  # binary
+
+            line, counted_to = 1, 0
+            for line_start in candidate_lines(content):
+                line_end = content.find(b"\n", line_start)
+                if line_end == -1:
+                    line_end = len(content)
+                text = content[line_start:line_end]
+                line += content[counted_to:line_start].count(b"\n")
+                counted_to = line_start
+
+                for match in COMBINED_PATTERN.finditer(text):
+                    finding = evaluate_match(match, text, path, line)
+                    if finding:
+                        emit(finding)
+
+
+def evaluate_match(match, text, path, line):
+    index = int(match.lastgroup[1:])
+    rule_id, description, severity, _, _, entropy_checked = SECRET_RULES[index]
+    value_group = f"v{index}"
+    has_value = value_group in COMBINED_PATTERN.groupindex and match.group(value_group) is not None
+    secret = match.group(value_group) if has_value else match.group(0)
+    start, end = match.span(value_group) if has_value else match.span()
+
+    # entropy and placeholder checks only ever run on candidates
+    if PLACEHOLDER_PATTERN.match(secret):
+        return None
+    entropy = shannon_entropy(secret)
+    if entropy_checked and entropy < SECRETS_MIN_ENTROPY:
+        return None
+
+    # offsets are left out so the secret never reaches the exact snippet or the explain prompt
+    return make_finding(
+        f"secrets.{rule_id}",
+        path,
+        line,
+        start_col=start + 1,
+        end_col=end + 1,
+        message=f"{description} committed to the repository.",
+        severity=severity,
+        lines=_redact(text, secret).decode("utf-8", errors="replace").strip(),
+        metadata={
+            "cwe": SECRETS_CWE,
+            "category": "security",
+            "subcategory": ["secrets"],
+            "confidence": "MEDIUM" if entropy_checked else "HIGH",
+            "entropy": round(entropy, 2),
+            "fingerprint": hashlib.sha256(secret).hexdigest()[:16]
+        }
+    )
+
+
+class SecretsPlugin(ScannerPlugin):
+    """Hard-coded credential detection: literal triggers pick lines, one combined regex checks them."""
+
+    name = "secrets"
+    extensions = frozenset(SEMGREP_EXTENSIONS | {
+        ".env", ".ini", ".cfg", ".conf", ".properties", ".toml", ".pem", ".key", ".tf", ".tfvars", ".gradle"
+    })
+    filenames = frozenset({
+        ".env", ".npmrc", ".pypirc", ".netrc", ".dockercfg", "credentials", "id_rsa", "id_dsa", "id_ecdsa",
+        "id_ed25519", "Dockerfile"
+    })
+
+    def version(self):
+        # changes whenever the rules do, so cached results are not reused across rule changes
+        material = repr([(rule[0], rule[3], rule[4], rule[5]) for rule in SECRET_RULES]) + str(SECRETS_MIN_ENTROPY)
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()[:12]
+
+    def plan(self, files):
+        units, current, current_bytes = [], [], 0
+        for path in files:
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                continue
+            if current and (current_bytes + size > SECRETS_UNIT_BYTES or len(current) >= SECRETS_UNIT_FILES):
+                units.append(current)
+                current, current_bytes = [], 0
+            current.append(path)
+            current_bytes += size
+        if current:
+            units.append(current)
+        return units
+
+    @classmethod
+    def scan(cls, unit, emit):
+        errors = []
+        for path in unit:
+            try:
+                scan_file(path, emit)
+            except (OSError, ValueError) as e:
+                errors.append({"type": "SecretsScanError", "level": "warn", "message": str(e), "path": path})
+        return {"errors": errors, "paths": {"scanned": unit}}
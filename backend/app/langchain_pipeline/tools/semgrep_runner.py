@@ -0,0 +1,261 @@
+import os
+import json
+import tempfile
+import subprocess
+from functools import lru_cache
+
+from langchain_pipeline.tools.rule_packs import rule_configs
+from langchain_pipeline.tools.scan_engine import ScannerPlugin, run_scanners
+
+SEMGREP_CONFIG = os.getenv("SEMGREP_CONFIG", "p/default")
+# one single-job semgrep process per CPU by default; each shard is one process
+SEMGREP_WORKERS = int(os.getenv("SEMGREP_WORKERS", str(os.cpu_count() or 1)))
+SEMGREP_SHARDS = int(os.getenv("SEMGREP_SHARDS", str(SEMGREP_WORKERS)))
+SEMGREP_SHARD_TIMEOUT = int(os.getenv("SEMGREP_SHARD_TIMEOUT", "1800"))
+# keeps every argv far below ARG_MAX even on deep monorepo paths
+SEMGREP_MAX_FILES_PER_SHARD = int(os.getenv("SEMGREP_MAX_FILES_PER_SHARD", "500"))
+SEMGREP_PARSE_CHUNK = int(os.getenv("SEMGREP_PARSE_CHUNK", str(2 ** 16)))
+
+EXTENSION_LANGUAGES = {
+    ".py": "python",
+    ".js": "javascript", ".jsx": "javascript",
+    ".ts": "typescript", ".tsx": "typescript",
+    ".java": "java",
+    ".go": "go",
+    ".c": "c",
+    ".cpp": "cpp",
+    ".rb": "ruby",
+    ".php": "php",
+    ".cs": "csharp",
+    ".swift": "swift",
+    ".kt": "kotlin",
+    ".scala": "scala",
+    ".rs": "rust",
+    ".sh": "bash",
+    ".lua": "lua",
+    ".dart": "dart",
+    ".html": "html",
+    ".xml": "xml",
+    ".json": "json",
+    ".yml": "yaml", ".yaml": "yaml",
+}
+SEMGREP_EXTENSIONS = {*EXTENSION_LANGUAGES, ".m", ".pl"}
+
+
+@lru_cache(maxsize=1)
+def semgrep_version():
+    try:
+        result = subprocess.run(["semgrep", "--version"], capture_output=True, text=True, timeout=60)
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return result.stdout.strip() if result.returncode == 0 else None
+
+
+def file_language(path):
+    return EXTENSION_LANGUAGES.get(os.path.splitext(path)[1], "generic")
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def build_shards(files, shard_count=SEMGREP_SHARDS, max_files=SEMGREP_MAX_FILES_PER_SHARD):
+    # shards hold one language each, so a semgrep process only loads that language's rules,
+    # and are balanced by bytes rather than file count
+    by_language = {}
+    for path in files:
+        by_language.setdefault(file_language(path), []).append((_file_size(path), path))
+
+    total_bytes = sum(size for entries in by_language.values() for size, _ in entries) or 1
+    shards = []
+    for language, entries in sorted(by_language.items()):
+        language_bytes = sum(size for size, _ in entries)
+        count = max(
+            1,
+            round(shard_count * language_bytes / total_bytes),
+            -(-len(entries) // max(1, max_files))
+        )
+        count = min(count, len(entries))
+        buckets = [{"language": language, "files": [], "bytes": 0} for _ in range(count)]
+
+        for size, path in sorted(entries, reverse=True):
+            bucket = min(
+                (bucket for bucket in buckets if len(bucket["files"]) < max_files),
+                key=lambda bucket: bucket["bytes"],
+                default=None
+            )
+            if bucket is None:
+                bucket = {"language": language, "files": [], "bytes": 0}
+                buckets.append(bucket)
+            bucket["files"].append(path)
+            bucket["bytes"] += size
+        shards.extend(buckets)
+    return shards
+
+
+class JsonStream:
+    """Decodes JSON values one at a time from a file, holding only the value being decoded."""
+
+    WHITESPACE = " \t\r\n"
+
+    def __init__(self, f, chunk_size=SEMGREP_PARSE_CHUNK):
+        self.f = f
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=None):
+        chunk = self.f.read(size or self.chunk_size)
+        if not chunk:
+            self.eof = True
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in self.WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if self.eof:
+                raise ValueError("Unexpected end of Semgrep output")
+            self._fill()
+
+    def take(self, expected):
+        char = self.peek()
+        if char not in expected:
+            raise ValueError(f"Unexpected {char!r} in Semgrep output, expected one of {expected!r}")
+        self.pos += 1
+        return char
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                # a value ending exactly at the buffer edge may be a truncated number
+                if end < len(self.buffer) or self.eof:
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof:
+                    raise
+            # grow reads with the pending value so one huge finding is not re-parsed per chunk
+            self._fill(max(self.chunk_size, len(self.buffer) - self.pos))
+
+
+def parse_semgrep_stream(f, on_result, chunk_size=SEMGREP_PARSE_CHUNK):
+    """Streams Semgrep JSON output: calls on_result per finding and returns every other top-level key."""
+    stream = JsonStream(f, chunk_size)
+    metadata = {}
+    stream.take("{")
+    if stream.peek() == "}":
+        return metadata
+
+    while True:
+        key = stream.value()
+        stream.take(":")
+        if key == "results":
+            stream.take("[")
+            if stream.peek() == "]":
+                stream.take("]")
+            else:
+                while True:
+                    on_result(stream.value())
+                    if stream.take(",]") == "]":
+                        break
+        else:
+            metadata[key] = stream.value()
+        if stream.take(",}") == "}":
+            return metadata
+
+
+def _shard_label(shard):
+    return f"Semgrep shard ({shard['language']}, {len(shard['files'])} files)"
+
+
+def _shard_failure(shard, message):
+    print(f"[!] {message}")
+    return {
+        "errors": [{"type": "ShardFailure", "level": "error", "message": message, "paths": shard["files"]}],
+        "paths": {"scanned": []},
+        "failed": True
+    }
+
+
+def shard_configs(shard, rule_pack=None, config=SEMGREP_CONFIG):
+    # with a local rule pack a shard only loads the rules of its own language
+    if rule_pack is None:
+        return [config]
+    return rule_configs(rule_pack, shard["language"])
+
+
+def run_semgrep_shard(shard, output_path, configs, timeout=SEMGREP_SHARD_TIMEOUT):
+    config_args = [arg for config in configs for arg in ("--config", config)]
+    # stdout goes straight to a file so a large report never sits in a pipe buffer or a string
+    try:
+        with open(output_path, "w", encoding="utf-8") as out:
+            subprocess.run(
+                ["semgrep", *config_args, "--metrics", "off", "--json", "--jobs", "1", *shard["files"]],
+                stdout=out, stderr=subprocess.DEVNULL, timeout=timeout
+            )
+        return None
+    except subprocess.TimeoutExpired:
+        return _shard_failure(shard, f"{_shard_label(shard)} timed out after {timeout}s")
+    except OSError as e:
+        return _shard_failure(shard, f"{_shard_label(shard)} failed: {e}")
+
+
+def read_semgrep_shard(shard, output_path, on_result):
+    try:
+        with open(output_path, "r", encoding="utf-8") as f:
+            return parse_semgrep_stream(f, on_result)
+    except (OSError, ValueError) as e:
+        return _shard_failure(shard, f"{_shard_label(shard)} failed: {e}")
+
+
+class SemgrepPlugin(ScannerPlugin):
+    """Semgrep as a scan engine plugin: one work unit per single-language shard."""
+
+    name = "semgrep"
+    extensions = frozenset(SEMGREP_EXTENSIONS)
+
+    def version(self):
+        return semgrep_version() or ""
+
+    def plan(self, files):
+        rule_pack = self.context.get("rule_pack")
+        units = []
+        for shard in build_shards(files, SEMGREP_SHARDS):
+            configs = shard_configs(shard, rule_pack, self.context.get("config", SEMGREP_CONFIG))
+            if not configs:
+                print(f"[+] No rules for {shard['language']}, skipping {len(shard['files'])} files.")
+                continue
+            units.append({**shard, "configs": configs, "timeout": SEMGREP_SHARD_TIMEOUT})
+        return units
+
+    @classmethod
+    def scan(cls, unit, emit):
+        fd, output_path = tempfile.mkstemp(prefix="semgrep-", suffix=".json")
+        os.close(fd)
+        try:
+            failure = run_semgrep_shard(unit, output_path, unit["configs"], unit["timeout"])
+            if failure:
+                return failure
+            report = read_semgrep_shard(unit, output_path, emit)
+        finally:
+            os.remove(output_path)
+        report.pop("results", None)
+        return report
+
+
+def run_semgrep(files, on_result, rule_pack=None, config=SEMGREP_CONFIG):
+    """Runs only the Semgrep plugin over files; see scan_engine.run_scanners for the return value."""
+    print(f"[+] Running Semgrep on {len(files)} files...")
+    plugin = SemgrepPlugin({"rule_pack": rule_pack, "config": config})
+    return run_scanners(files, on_result, plugins=[plugin])
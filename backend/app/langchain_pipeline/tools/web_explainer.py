@@ -1,11 +1,17 @@
 import os
 import json
 import time
+import uuid
 from google import genai
 from dotenv import load_dotenv
+from celery.exceptions import SoftTimeLimitExceeded
+
+from langchain_pipeline.tools.knowledge_base import knowledge_db_available, knowledge_explanation, with_knowledge
 
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
+# shared by every worker, like SCAN_REPORTS_DIR
+EXPLAIN_REPORTS_DIR = os.path.abspath(os.getenv("EXPLAIN_REPORTS_DIR", "explain_reports"))
 client = genai.Client()
 
 def explain_web_vulnerability(vulnerability):
@@ -37,6 +43,8 @@ def explain_web_vulnerability(vulnerability):
             "vulnerability": vulnerability
         }
         
+    except SoftTimeLimitExceeded:
+        raise
     except Exception as e:
         error_msg = f"AI explanation failed to generate. Error: {str(e)}"
         print(f"[!] Gemini Error for web vulnerability: {e}")
@@ -46,7 +54,7 @@ def explain_web_vulnerability(vulnerability):
             "vulnerability": {**vulnerability, "ai_explanation": error_msg}
         }
 
-def format_web_vulnerabilities(zap_report):
+def format_web_vulnerabilities(zap_report, use_llm=True):
     if not zap_report or "results" not in zap_report:
         return {
             "status": "failure",
@@ -54,13 +62,26 @@ def format_web_vulnerabilities(zap_report):
             "formatted": []
         }
 
+    if not use_llm and not knowledge_db_available():
+        # without the knowledge base a shallow plan would get no explanations at all
+        print("[!] No knowledge base imported, explaining web alerts with the LLM instead. "
+              "Import one with: python -m langchain_pipeline.tools.knowledge_base")
+        use_llm = True
+
     formatted = []
     try:
-        for alert in zap_report.get("results", []):
+        for alert in with_knowledge(zap_report.get("results", [])):
             vulnerability = dict(alert)
             if "ai_explanation" not in vulnerability:
                 vulnerability["ai_explanation"] = ""
 
+            if not use_llm:
+                # shallow plans explain from the local CWE/CVE knowledge base alone
+                explanation = knowledge_explanation(vulnerability)
+                vulnerability["ai_explanation"] = explanation or vulnerability.get("description", "")
+                formatted.append(vulnerability)
+                continue
+
             result = explain_web_vulnerability(vulnerability)
             formatted.append(result["vulnerability"])
         
@@ -69,6 +90,8 @@ def format_web_vulnerabilities(zap_report):
             "formatted": formatted
         }
     
+    except SoftTimeLimitExceeded:
+        raise
     except Exception as e:
         return {
             "status": "failure",
@@ -76,9 +99,9 @@ def format_web_vulnerabilities(zap_report):
             "formatted": formatted
         }
 
-def web_explainer(zap_report):
+def web_explainer(zap_report, use_llm=True):
     
-    format_result = format_web_vulnerabilities(zap_report)
+    format_result = format_web_vulnerabilities(zap_report, use_llm)
     
     if format_result["status"] == "failure":
         return {
@@ -99,7 +122,7 @@ def web_explainer(zap_report):
         }
     }
 
-def web_explainer_handler(web_scan_path: str):
+def web_explainer_handler(web_scan_path: str, use_llm: bool = True):
     
     # Check if file exists
     
@@ -125,7 +148,7 @@ def web_explainer_handler(web_scan_path: str):
         }
     
     # Run the web explainer
-    results = web_explainer(web_scan_data)
+    results = web_explainer(web_scan_data, use_llm)
     
     if results.get("status") == "failure":
         return {
@@ -133,14 +156,15 @@ def web_explainer_handler(web_scan_path: str):
             "message": results.get("error", "An error occurred during the web vulnerability explanation.")
         }
     
-    reports_dir = "explain_reports"
+    reports_dir = EXPLAIN_REPORTS_DIR
     os.makedirs(reports_dir, exist_ok=True)
-    filename = os.path.join(reports_dir, f"web_explain_results_{int(time.time())}.json")
+    filename = os.path.join(reports_dir, f"web_explain_results_{int(time.time())}_{uuid.uuid4().hex[:8]}.json")
     
     with open(filename, "w") as f:
         json.dump(results, f, indent=4)
     
     return {
         "status": "success",
-        "message": f"Web Vulnerability Explanation completed. Results saved to {filename}"
+        "message": f"Web Vulnerability Explanation completed. Results saved to {filename}",
+        "file": filename
     }
\ No newline at end of file
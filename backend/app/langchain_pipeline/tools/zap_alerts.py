@@ -0,0 +1,184 @@
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import threading
+
+ZAP_ALERT_PAGE_SIZE = int(os.getenv("ZAP_ALERT_PAGE_SIZE", "500"))
+
+RISK_PRIORITY = {
+    "High": 1,
+    "Medium": 2,
+    "Low": 3,
+    "Informational": 4
+}
+
+
+def alert_group_header(item):
+    return {
+        "name": item["name"],
+        "risk": item.get("risk", ""),
+        "description": item.get("description", ""),
+        "solution": item.get("solution", ""),
+        "references": item.get("reference", "").split("\n") if "reference" in item else [],
+        "tags": item.get("tags", {}),
+        "common": {
+            "pluginId": item.get("pluginId", ""),
+            "cweid": item.get("cweid", ""),
+            "wascid": item.get("wascid", ""),
+            "confidence": item.get("confidence", ""),
+            "sourceid": item.get("sourceid", ""),
+            "alertRef": item.get("alertRef", ""),
+        }
+    }
+
+
+def alert_instance(item):
+    return {
+        "url": item.get("url", ""),
+        "param": item.get("param", ""),
+        "method": item.get("method", ""),
+        "evidence": item.get("evidence", ""),
+        "messageId": item.get("messageId", ""),
+        "sourceMessageId": item.get("sourceMessageId", "")
+    }
+
+
+def iter_alert_pages(zap, baseurl=None, page_size=ZAP_ALERT_PAGE_SIZE):
+    start = 0
+    while True:
+        page = zap.core.alerts(baseurl=baseurl, start=str(start), count=str(page_size))
+        if not page:
+            return
+        yield page
+        if len(page) < page_size:
+            return
+        start += len(page)
+
+
+class AlertCollector:
+    """Keeps raw alerts in memory, for callers that want the ungrouped list."""
+
+    def __init__(self):
+        self.alerts = []
+
+    def add_page(self, alerts):
+        self.alerts.extend(alerts)
+
+    def finish(self):
+        return {
+            "status": "success",
+            "results": self.alerts,
+            "total_alerts": len(self.alerts)
+        }
+
+    def close(self):
+        self.alerts = []
+
+
+class AlertGrouper:
+    """Groups ZAP alerts by name while spilling instances to disk.
+
+    Only one header per alert name is kept in memory; instances are appended
+    to a per-group spill file and streamed into the output on finish().
+    """
+
+    def __init__(self, output_path, spill_dir=None):
+        self.output_path = output_path
+        self._spill_dir = tempfile.mkdtemp(prefix="zap_alerts_", dir=spill_dir)
+        self._groups = {}
+        self._spills = {}
+        self.total_alerts = 0
+
+    def add(self, item):
+        name = item["name"]
+        if name not in self._groups:
+            self._groups[name] = alert_group_header(item)
+            spill_path = os.path.join(self._spill_dir, f"{len(self._spills)}.jsonl")
+            self._spills[name] = open(spill_path, "w+", encoding="utf-8")
+
+        self._spills[name].write(json.dumps(alert_instance(item)) + "\n")
+        self.total_alerts += 1
+
+    def add_page(self, alerts):
+        for item in alerts:
+            self.add(item)
+
+    def _write_group(self, out, header, spill):
+        fields = ", ".join(f"{json.dumps(key)}: {json.dumps(value)}" for key, value in header.items())
+        out.write("{" + fields + ', "instances": [')
+        spill.seek(0)
+        for index, line in enumerate(spill):
+            out.write(("\n" if index == 0 else ",\n") + line.rstrip("\n"))
+        out.write("]}")
+
+    def finish(self):
+        ordered = sorted(self._groups.items(), key=lambda entry: RISK_PRIORITY.get(entry[1]["risk"], 5))
+
+        directory = os.path.dirname(self.output_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        try:
+            with open(self.output_path, "w", encoding="utf-8") as out:
+                out.write('{"status": "success", "results": [\n')
+                for index, (name, header) in enumerate(ordered):
+                    if index:
+                        out.write(",\n")
+                    self._write_group(out, header, self._spills[name])
+                out.write("\n]}\n")
+        finally:
+            self.close()
+
+        return {
+            "status": "success",
+            "results_file": self.output_path,
+            "total_alerts": self.total_alerts,
+            "total_groups": len(ordered)
+        }
+
+    def close(self):
+        for spill in self._spills.values():
+            spill.close()
+        self._spills = {}
+        shutil.rmtree(self._spill_dir, ignore_errors=True)
+
+
+class DedupAlertSink:
+    """Thread-safe front for a sink that is fed by several ZAP instances at once.
+
+    Instances that saw the same URL raise the same passive alerts; only an
+    8 byte digest per alert is remembered to drop the repeats.
+    """
+
+    def __init__(self, sink):
+        self.sink = sink
+        self._seen = set()
+        self._lock = threading.Lock()
+        self.duplicates = 0
+
+    @staticmethod
+    def _digest(alert):
+        key = "\x1f".join(str(alert.get(field, "")) for field in ("pluginId", "url", "method", "param", "evidence", "attack"))
+        return hashlib.blake2b(key.encode("utf-8", "replace"), digest_size=8).digest()
+
+    def add_page(self, alerts):
+        with self._lock:
+            fresh = []
+            for alert in alerts:
+                digest = self._digest(alert)
+                if digest in self._seen:
+                    self.duplicates += 1
+                    continue
+                self._seen.add(digest)
+                fresh.append(alert)
+            self.sink.add_page(fresh)
+
+    def finish(self):
+        report = self.sink.finish()
+        report["duplicates_dropped"] = self.duplicates
+        return report
+
+    def close(self):
+        self.sink.close()
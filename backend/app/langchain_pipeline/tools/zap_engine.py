@@ -0,0 +1,478 @@
+import os
+import asyncio
+import threading
+from collections import deque
+from contextlib import AsyncExitStack, asynccontextmanager
+from concurrent.futures import ThreadPoolExecutor
+from celery.exceptions import SoftTimeLimitExceeded
+
+from langchain_pipeline.tools.crawl_cache import (
+    IncrementalAlertSink,
+    diff_endpoints,
+    load_crawl_index,
+    snapshot_endpoints,
+)
+from langchain_pipeline.tools.scan_profiles import apply_scan_profile, get_scan_profile
+from langchain_pipeline.tools.zap_alerts import AlertCollector, AlertGrouper, DedupAlertSink, iter_alert_pages
+from langchain_pipeline.tools.zap_pool import ZAP_LEASE_TIMEOUT, get_zap_pool
+from langchain_pipeline.tools.zap_sharding import split_url_tree
+
+# polling starts fast and backs off while a scan makes no progress
+ZAP_POLL_MIN_INTERVAL = float(os.getenv("ZAP_POLL_MIN_INTERVAL", "1"))
+ZAP_POLL_MAX_INTERVAL = float(os.getenv("ZAP_POLL_MAX_INTERVAL", "30"))
+ZAP_POLL_BACKOFF_FACTOR = float(os.getenv("ZAP_POLL_BACKOFF_FACTOR", "1.5"))
+
+# blocking ZAP API calls run on this many threads, shared by all scans of a worker process
+ZAP_ENGINE_THREADS = int(os.getenv("ZAP_ENGINE_THREADS", "64"))
+ZAP_MAX_CONCURRENT_SCANS = int(os.getenv("ZAP_MAX_CONCURRENT_SCANS", "32"))
+
+# active scans run at once on one ZAP instance during an incremental rescan
+ZAP_ENDPOINT_SCAN_CONCURRENCY = int(os.getenv("ZAP_ENDPOINT_SCAN_CONCURRENCY", "4"))
+
+# how long a sharded scan waits for each extra instance; shards without one share the instances already held
+ZAP_SHARD_LEASE_TIMEOUT = float(os.getenv("ZAP_SHARD_LEASE_TIMEOUT", "0"))
+
+
+class PollBackoff:
+    def __init__(self, initial=None, maximum=None, factor=None):
+        self.initial = ZAP_POLL_MIN_INTERVAL if initial is None else initial
+        self.maximum = ZAP_POLL_MAX_INTERVAL if maximum is None else maximum
+        self.factor = ZAP_POLL_BACKOFF_FACTOR if factor is None else factor
+        self.delay = self.initial
+        self.last_progress = None
+        self.polls = 0
+
+    def next_delay(self, progress):
+        self.polls += 1
+        if progress != self.last_progress:
+            self.last_progress = progress
+            self.delay = self.initial
+        else:
+            self.delay = min(self.delay * self.factor, self.maximum)
+        return self.delay
+
+
+async def _call(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, lambda: func(*args, **kwargs))
+
+
+async def _stop_quietly(label, stop):
+    try:
+        await _call(stop)
+        print(f"[+] Stopped {label}.")
+    except Exception as e:
+        print(f"[!] Failed to stop {label}: {e}")
+
+
+async def wait_for_completion(label, poll, is_done, stop, backoff=None):
+    # poll until is_done(progress); on cancellation the ZAP side is stopped too
+    backoff = backoff or PollBackoff()
+    try:
+        while True:
+            progress = await _call(poll)
+            if is_done(progress):
+                return progress
+            print(f"[{label}] Progress: {progress}")
+            await asyncio.sleep(backoff.next_delay(progress))
+    except asyncio.CancelledError:
+        await asyncio.shield(_stop_quietly(label, stop))
+        raise
+
+
+def _release_late_lease(pool, future):
+    if future.cancelled() or future.exception() is not None:
+        return
+    asyncio.get_running_loop().run_in_executor(None, pool.release, future.result())
+
+
+@asynccontextmanager
+async def lease_zap(pool=None, timeout=ZAP_LEASE_TIMEOUT):
+    pool = pool or get_zap_pool()
+    acquiring = asyncio.ensure_future(_call(pool.acquire, timeout))
+    try:
+        instance = await asyncio.shield(acquiring)
+    except asyncio.CancelledError:
+        # the lease may still be granted after we stop waiting, hand it straight back
+        acquiring.add_done_callback(lambda f: _release_late_lease(pool, f))
+        raise
+
+    healthy = True
+    try:
+        yield instance
+    except BaseException:
+        healthy = await _call(instance.is_ready)
+        raise
+    finally:
+        await asyncio.shield(_call(pool.release, instance, healthy))
+
+
+async def run_spider(zap, url):
+    print("Starting ZAP Spider")
+    scan_id = await _call(zap.spider.scan, url)
+    await wait_for_completion(
+        "ZAP Spider",
+        lambda: int(zap.spider.status(scan_id)),
+        lambda progress: progress >= 100,
+        lambda: zap.spider.stop(scan_id)
+    )
+
+
+async def run_ajax_spider(zap, url):
+    print("[+] Starting AJAX Spider...")
+    await _call(zap.ajaxSpider.scan, url)
+    await wait_for_completion(
+        "ZAP AJAX Spider",
+        lambda: (zap.ajaxSpider.status, zap.ajaxSpider.number_of_results),
+        lambda progress: progress[0] != 'running',
+        zap.ajaxSpider.stop
+    )
+
+
+async def run_active_scan(zap, url, auth=None, context_id=None, **scan_options):
+    if auth and context_id is None:
+        context_id = await _call(_prepare_auth_context, zap, auth)
+
+    if context_id is not None:
+        scan_id = await _call(zap.ascan.scan_as_user, url=url, contextid=context_id, userid=0, **scan_options)
+    else:
+        scan_id = await _call(zap.ascan.scan, url=url, **scan_options)
+
+    await wait_for_completion(
+        "ZAP Active Scan",
+        lambda: int(zap.ascan.status(scan_id)),
+        lambda progress: progress >= 100,
+        lambda: zap.ascan.stop(scan_id)
+    )
+
+
+async def run_endpoint_scans(zap, endpoints, auth=None):
+    # non-recursive active scans of single endpoints, used by incremental rescans
+    context_id = await _call(_prepare_auth_context, zap, auth) if auth else None
+    semaphore = asyncio.Semaphore(max(1, ZAP_ENDPOINT_SCAN_CONCURRENCY))
+
+    async def scan_one(endpoint):
+        async with semaphore:
+            await run_active_scan(
+                zap,
+                endpoint["url"],
+                context_id=context_id,
+                recurse=False,
+                method=endpoint["method"],
+                postdata=endpoint["request_body"] or None
+            )
+
+    await asyncio.gather(*(scan_one(endpoint) for endpoint in endpoints))
+
+
+async def alert_pages(zap, baseurl=None):
+    # pages are fetched one at a time so only a single page is ever held in memory
+    pages = iter_alert_pages(zap, baseurl)
+    while True:
+        page = await _call(next, pages, None)
+        if page is None:
+            return
+        yield page
+
+
+async def feed_alerts(zap, sink):
+    async for page in alert_pages(zap):
+        await _call(sink.add_page, page)
+
+
+async def collect_alerts(zap, sink):
+    try:
+        await feed_alerts(zap, sink)
+    except BaseException:
+        sink.close()
+        raise
+    return await _call(sink.finish)
+
+
+async def run_within_budget(coro, budget):
+    # returns (result, timed_out); the running phase is cancelled, which stops it in ZAP
+    try:
+        return await asyncio.wait_for(coro, timeout=max(0, budget)), False
+    except asyncio.TimeoutError:
+        return None, True
+
+
+async def plan_incremental_scan(zap, url):
+    endpoints = await _call(snapshot_endpoints, zap, url)
+    previous = await _call(load_crawl_index, url)
+    if previous is None:
+        return endpoints, list(endpoints), [], False
+
+    changed, unchanged = diff_endpoints(previous["endpoints"], endpoints)
+    return endpoints, changed, unchanged, True
+
+
+def _prepare_auth_context(zap, auth):
+    zap.context.new_context("default")
+    context_id = zap.context.context("default")['id']
+    zap.authentication.set_authentication_method(context_id, "formBasedAuthentication", auth['auth_method'])
+    zap.users.new_user(context_id, "test_user")
+    zap.users.set_authentication_credentials(context_id, 0, auth['credentials'])
+    zap.users.set_user_enabled(context_id, 0, True)
+    return context_id
+
+
+async def crawl_and_scan(zap, url, auth, enable_ajax_spider, api_spec, incremental):
+    print("Opening URL")
+    await _call(zap.core.access_url, url)
+    print("URL Opened")
+
+    if api_spec:
+        print("[+] Importing API spec")
+        await _call(zap.openapi.import_url, "https://api.example.com/swagger.json")
+        print("API Spec Imported")
+
+    await run_spider(zap, url)
+
+    if enable_ajax_spider:
+        await run_ajax_spider(zap, url)
+
+    crawl = await plan_incremental_scan(zap, url) if incremental else None
+
+    if crawl and crawl[3]:
+        endpoints, changed, unchanged, _ = crawl
+        print(f"[+] Incremental rescan: {len(changed)} of {len(endpoints)} endpoints are new or changed.")
+        await run_endpoint_scans(zap, [endpoints[key] for key in changed], auth)
+    else:
+        await run_active_scan(zap, url, auth)
+
+    return crawl
+
+
+async def async_zap_scan(url, auth=None, enable_ajax_spider=None, api_spec=True, pool=None, output_path=None,
+                         incremental=False, profile=None):
+    # with output_path the alerts are grouped straight to disk instead of returned
+    profile = get_scan_profile(profile)
+    if enable_ajax_spider is None:
+        enable_ajax_spider = profile["ajax_spider"]
+
+    # only a failure to get an instance is worth retrying, a scan that ran has spent its budget
+    leased = False
+    try:
+        async with lease_zap(pool) as zap_instance:
+            leased = True
+            print("Zap Proxy:", zap_instance.proxy)
+            print(f"[+] Using '{profile['name']}' scan profile with a {profile['budget']}s budget.")
+            zap = zap_instance.client()
+            await _call(apply_scan_profile, zap, profile)
+
+            # the budget cancels whatever phase is running; ZAP keeps the alerts found so far
+            crawl, partial = await run_within_budget(
+                crawl_and_scan(zap, url, auth, enable_ajax_spider, api_spec, incremental),
+                profile["budget"]
+            )
+            if partial:
+                print(f"[!] Scan budget of {profile['budget']}s exhausted, collecting partial results.")
+
+            sink = AlertGrouper(output_path) if output_path else AlertCollector()
+            if crawl:
+                sink = IncrementalAlertSink(url, crawl[0], crawl[2], sink)
+
+            report = await collect_alerts(zap, sink)
+            report["profile"] = profile["name"]
+            report["partial"] = partial
+
+        print("[+] ZAP scan completed.")
+        print(f"[+] Found {report['total_alerts']} alerts.")
+
+        return report
+
+    except asyncio.CancelledError:
+        print(f"[!] Web scan of {url} was cancelled.")
+        raise
+
+    except SoftTimeLimitExceeded:
+        raise
+    except Exception as e:
+        print(e)
+        return {
+            "status": "failure",
+            "error": f"Web Scan Could not be completed. {e}",
+            "retryable": not leased
+        }
+
+
+async def discover_urls(zap, url, auth, enable_ajax_spider, api_spec):
+    print("Opening URL")
+    await _call(zap.core.access_url, url)
+
+    if api_spec:
+        print("[+] Importing API spec")
+        await _call(zap.openapi.import_url, "https://api.example.com/swagger.json")
+
+    await run_spider(zap, url)
+
+    if enable_ajax_spider:
+        await run_ajax_spider(zap, url)
+
+    return await _call(zap.core.urls, baseurl=url)
+
+
+async def scan_shard(zap, shard, auth, seed):
+    if seed:
+        # a fresh instance has an empty site tree, the shard's URLs have to be in it before scanning
+        for shard_url in shard["urls"]:
+            await _call(zap.core.access_url, shard_url, followredirects=False)
+
+    for target in shard["targets"]:
+        await run_active_scan(zap, target["url"], auth, recurse=target["recurse"])
+
+
+async def run_shard(index, shard, zap_instance, sink, auth, deadline, seed):
+    loop = asyncio.get_running_loop()
+    zap = zap_instance.client()
+    print(f"[+] Shard {index}: {len(shard['targets'])} sub-trees, {len(shard['urls'])} URLs on port {zap_instance.port}.")
+    _, timed_out = await run_within_budget(scan_shard(zap, shard, auth, seed), deadline - loop.time())
+    if timed_out:
+        print(f"[!] Shard {index} ran out of budget, collecting partial results.")
+    await feed_alerts(zap, sink)
+    return timed_out
+
+
+async def run_shards(shards, zap_instance, sink, auth, profile, deadline, pool):
+    """Scans the shards on the discovery instance and whatever instances the pool can spare.
+
+    Waiting for more instances while holding one deadlocks once concurrent
+    sharded scans each hold part of the pool, so extra leases are only taken
+    if they come within ZAP_SHARD_LEASE_TIMEOUT and the remaining shards
+    queue up on the instances already held. Returns each shard's timed_out.
+    """
+    pending = deque(enumerate(shards))
+    timed_out = {}
+
+    async def work_through(instance, seed):
+        while pending:
+            index, shard = pending.popleft()
+            timed_out[index] = await run_shard(index, shard, instance, sink, auth, deadline, seed)
+
+    async with AsyncExitStack() as stack:
+        # the discovery instance already knows every URL, fresh ones are seeded per shard
+        workers = [work_through(zap_instance, seed=False)]
+        for _ in range(len(shards) - 1):
+            try:
+                instance = await stack.enter_async_context(lease_zap(pool, timeout=ZAP_SHARD_LEASE_TIMEOUT))
+            except TimeoutError:
+                break
+            await _call(apply_scan_profile, instance.client(), profile)
+            workers.append(work_through(instance, seed=True))
+
+        print(f"[+] Scanning {len(shards)} shards on {len(workers)} ZAP instances.")
+        await asyncio.gather(*workers)
+    return [timed_out[index] for index in sorted(timed_out)]
+
+
+async def async_sharded_zap_scan(url, shard_count, auth=None, enable_ajax_spider=None, api_spec=True, pool=None,
+                                 output_path=None, profile=None):
+    # the spider runs once, each sub-tree of the site is then active-scanned on its own ZAP instance
+    profile = get_scan_profile(profile)
+    if enable_ajax_spider is None:
+        enable_ajax_spider = profile["ajax_spider"]
+
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + profile["budget"]
+    sink = DedupAlertSink(AlertGrouper(output_path) if output_path else AlertCollector())
+
+    leased = False
+    try:
+        async with lease_zap(pool) as zap_instance:
+            leased = True
+            print(f"[+] Sharded scan of {url} across up to {shard_count} ZAP instances ('{profile['name']}' profile).")
+            zap = zap_instance.client()
+            await _call(apply_scan_profile, zap, profile)
+
+            urls, timed_out = await run_within_budget(
+                discover_urls(zap, url, auth, enable_ajax_spider, api_spec),
+                deadline - loop.time()
+            )
+            shards = split_url_tree(urls or [], shard_count)
+
+            results = await run_shards(shards, zap_instance, sink, auth, profile, deadline, pool)
+            if not shards:
+                await feed_alerts(zap, sink)
+
+        report = await _call(sink.finish)
+        report["profile"] = profile["name"]
+        report["partial"] = timed_out or any(results)
+        report["shards"] = len(shards)
+
+        print("[+] Sharded ZAP scan completed.")
+        print(f"[+] Found {report['total_alerts']} alerts.")
+        return report
+
+    except asyncio.CancelledError:
+        sink.close()
+        print(f"[!] Web scan of {url} was cancelled.")
+        raise
+
+    except SoftTimeLimitExceeded:
+        sink.close()
+        raise
+    except Exception as e:
+        sink.close()
+        print(e)
+        return {
+            "status": "failure",
+            "error": f"Web Scan Could not be completed. {e}",
+            "retryable": not leased
+        }
+
+
+_scan_loop = None
+_scan_loop_lock = threading.Lock()
+
+
+def get_scan_loop():
+    """The event loop every web scan of this process runs on, started on first use.
+
+    Scan tasks on a thread-pool worker hand their scans to it instead of each
+    running its own loop, so they share one set of ZAP API threads.
+    """
+    global _scan_loop
+    with _scan_loop_lock:
+        if _scan_loop is None:
+            loop = asyncio.new_event_loop()
+            loop.set_default_executor(ThreadPoolExecutor(max_workers=ZAP_ENGINE_THREADS, thread_name_prefix="zap"))
+            threading.Thread(target=loop.run_forever, name="zap-loop", daemon=True).start()
+            _scan_loop = loop
+        return _scan_loop
+
+
+def run_on_scan_loop(coro):
+    future = asyncio.run_coroutine_threadsafe(coro, get_scan_loop())
+    try:
+        return future.result()
+    except BaseException:
+        # e.g. a soft time limit in the waiting task: cancelling stops the scan's running phase in ZAP
+        future.cancel()
+        raise
+
+
+async def _run_scans(targets, max_concurrency):
+    semaphore = asyncio.Semaphore(max(1, max_concurrency))
+
+    async def run_one(target):
+        options = target if isinstance(target, dict) else {"url": target}
+        async with semaphore:
+            return await async_zap_scan(**options)
+
+    return await asyncio.gather(*(run_one(target) for target in targets))
+
+
+def run_web_scans(targets, max_concurrency=ZAP_MAX_CONCURRENT_SCANS):
+    # targets are URLs or dicts of async_zap_scan keyword arguments; results keep their order
+    return run_on_scan_loop(_run_scans(targets, max_concurrency))
+
+
+def run_web_scan(url, shards=1, **options):
+    async def run():
+        if shards > 1:
+            options.pop("incremental", None)
+            return await async_sharded_zap_scan(url, shards, **options)
+        return await async_zap_scan(url, **options)
+
+    return run_on_scan_loop(run())
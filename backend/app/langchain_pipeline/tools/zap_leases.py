@@ -0,0 +1,164 @@
+import os
+import json
+import time
+import uuid
+import shutil
+import socket
+import tempfile
+import subprocess
+
+from langchain_pipeline.tools.file_locks import is_locked, try_lock, unlock
+
+# host-wide registry shared by every worker process on the machine
+ZAP_LEASE_DIR = os.getenv("ZAP_LEASE_DIR", os.path.join(tempfile.gettempdir(), "zap-leases"))
+ZAP_WORK_ROOT = os.getenv("ZAP_WORK_ROOT", os.path.join(tempfile.gettempdir(), "zap"))
+ZAP_PORT_RANGE_START = int(os.getenv("ZAP_PORT_RANGE_START", "8081"))
+ZAP_PORT_RANGE_END = int(os.getenv("ZAP_PORT_RANGE_END", "9000"))
+
+
+class PortLease:
+    """A port and a private working directory, held for the life of one ZAP container.
+
+    The port lock file stays locked while the lease is held; if the holding
+    process dies the kernel releases it and the next acquirer reclaims it.
+    """
+
+    def __init__(self, port, workdir, handle):
+        self.port = port
+        self.workdir = workdir
+        self.container_id = None
+        self._handle = handle
+
+    def _write_record(self):
+        self._handle.seek(0)
+        self._handle.truncate()
+        json.dump({
+            "port": self.port,
+            "workdir": self.workdir,
+            "container_id": self.container_id,
+            "pid": os.getpid(),
+            "acquired_at": time.time()
+        }, self._handle)
+        self._handle.flush()
+
+    def attach(self, container_id):
+        self.container_id = container_id
+        self._write_record()
+
+    def release(self):
+        if self._handle is None:
+            return
+        shutil.rmtree(self.workdir, ignore_errors=True)
+        self._handle.seek(0)
+        self._handle.truncate()
+        unlock(self._handle)
+        self._handle = None
+
+
+def _lock_path(port):
+    return os.path.join(ZAP_LEASE_DIR, f"port-{port}.lock")
+
+
+def _read_record(handle):
+    handle.seek(0)
+    content = handle.read().strip()
+    if not content:
+        return {}
+    try:
+        return json.loads(content)
+    except json.JSONDecodeError:
+        return {}
+
+
+def _container_running(container_id):
+    result = subprocess.run(
+        ["docker", "inspect", "-f", "{{.State.Running}}", container_id],
+        capture_output=True, text=True
+    )
+    return result.returncode == 0 and result.stdout.strip() == "true"
+
+
+def _reclaim(record):
+    # the previous holder died without releasing; clean up what it left behind
+    container_id = record.get("container_id")
+    if container_id:
+        try:
+            if _container_running(container_id):
+                print(f"[!] Stopping orphaned ZAP container {container_id[:12]} on port {record.get('port')}.")
+                subprocess.run(["docker", "stop", container_id], capture_output=True)
+        except OSError as e:
+            print(f"[!] Could not check orphaned ZAP container {container_id[:12]}: {e}")
+
+    workdir = record.get("workdir")
+    if workdir and os.path.isdir(workdir):
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def _port_bindable(port):
+    # ports used by anything outside the registry are skipped
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        try:
+            s.bind(('', port))
+            return True
+        except OSError:
+            return False
+
+
+def acquire_port_lease(start=ZAP_PORT_RANGE_START, end=ZAP_PORT_RANGE_END):
+    for port in range(start, end):
+        handle = try_lock(_lock_path(port))
+        if handle is None:
+            continue
+
+        record = _read_record(handle)
+        if record:
+            _reclaim(record)
+
+        if not _port_bindable(port):
+            handle.seek(0)
+            handle.truncate()
+            unlock(handle)
+            continue
+
+        workdir = os.path.join(ZAP_WORK_ROOT, f"{port}-{uuid.uuid4().hex[:12]}")
+        os.makedirs(workdir, mode=0o777, exist_ok=True)
+        os.chmod(workdir, 0o777)  # the ZAP image runs as an unprivileged user
+
+        lease = PortLease(port, workdir, handle)
+        lease._write_record()
+        return lease
+
+    raise RuntimeError(f"No free port available in {start}-{end}")
+
+
+def reclaim_stale_leases():
+    # sweeps leases whose holders died and were never re-acquired
+    if not os.path.isdir(ZAP_LEASE_DIR):
+        return 0
+
+    reclaimed = 0
+    for name in os.listdir(ZAP_LEASE_DIR):
+        if not name.startswith("port-") or not name.endswith(".lock"):
+            continue
+        path = os.path.join(ZAP_LEASE_DIR, name)
+        handle = try_lock(path)
+        if handle is None:
+            continue
+        record = _read_record(handle)
+        if record:
+            _reclaim(record)
+            reclaimed += 1
+        handle.seek(0)
+        handle.truncate()
+        unlock(handle)
+    return reclaimed
+
+
+def active_leases():
+    if not os.path.isdir(ZAP_LEASE_DIR):
+        return []
+    return sorted(
+        int(name[len("port-"):-len(".lock")])
+        for name in os.listdir(ZAP_LEASE_DIR)
+        if name.startswith("port-") and name.endswith(".lock") and is_locked(os.path.join(ZAP_LEASE_DIR, name))
+    )
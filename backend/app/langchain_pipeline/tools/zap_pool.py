@@ -0,0 +1,332 @@
+import os
+import time
+import random
+import atexit
+import threading
+import subprocess
+from contextlib import contextmanager
+from urllib.parse import urlsplit
+
+import docker
+import requests
+from dotenv import load_dotenv
+
+from langchain_pipeline.tools.zap_leases import ZAP_PORT_RANGE_START, acquire_port_lease, reclaim_stale_leases
+
+load_dotenv()
+
+ZAP_HOST = 'http://127.0.0.1'
+ZAP_IMAGE = os.getenv("ZAP_IMAGE", "ghcr.io/zaproxy/zaproxy")
+
+# number of daemons kept warm and how many scans one daemon serves before it is replaced
+ZAP_POOL_SIZE = int(os.getenv("ZAP_POOL_SIZE", "2"))
+ZAP_MAX_SCANS_PER_INSTANCE = int(os.getenv("ZAP_MAX_SCANS_PER_INSTANCE", "10"))
+
+# readiness probing replaces the old fixed 200 second sleep
+ZAP_READY_TIMEOUT = int(os.getenv("ZAP_READY_TIMEOUT", "300"))
+ZAP_READY_POLL_INTERVAL = float(os.getenv("ZAP_READY_POLL_INTERVAL", "2"))
+ZAP_LEASE_TIMEOUT = int(os.getenv("ZAP_LEASE_TIMEOUT", "900"))
+
+# comma-separated URLs of already running daemons; when set no containers are started
+ZAP_ENDPOINTS = [endpoint.strip() for endpoint in os.getenv("ZAP_ENDPOINTS", "").split(",") if endpoint.strip()]
+ZAP_API_KEY = os.getenv("ZAP_API_KEY")
+
+
+def start_zap_container(base_port=ZAP_PORT_RANGE_START, api_key=None):
+    # the lease makes the port and working directory exclusive to this container host-wide
+    lease = acquire_port_lease(base_port)
+    api_key = api_key or f"key_{random.randint(100000, 999999)}"
+
+    try:
+        client = docker.from_env()
+        container = client.containers.run(
+            image=ZAP_IMAGE,
+            command=[
+                "zap.sh", "-daemon",
+                "-host", "0.0.0.0",
+                "-port", "8080",
+                "-config", f"api.key={api_key}",
+                "-config", "api.addrs.addr.name=.*",
+                "-config", "api.addrs.addr.regex=true"
+            ],
+            ports={"8080/tcp": lease.port},
+            volumes={lease.workdir: {"bind": "/zap/wrk", "mode": "rw"}},
+            detach=True,
+            remove=True
+        )
+    except Exception:
+        lease.release()
+        raise
+
+    lease.attach(container.id)
+    print(f"[+] Starting ZAP on port {lease.port} with API key {api_key}...")
+    return {
+        "container_id": container.id,
+        "port": lease.port,
+        "api_key": api_key,
+        "lease": lease
+    }
+
+
+def stop_zap_container(container_id, lease=None):
+    try:
+        subprocess.run(["docker", "stop", container_id], check=True, capture_output=True)
+    except Exception as e:
+        print(f"[!] Failed to stop ZAP container {container_id[:12]}: {e}")
+    finally:
+        if lease is not None:
+            lease.release()
+
+
+def is_zap_ready(port, api_key, host=ZAP_HOST):
+    try:
+        response = requests.get(
+            f"{host}:{port}/JSON/core/view/version/",
+            params={"apikey": api_key},
+            timeout=5
+        )
+        return response.status_code == 200 and "version" in response.json()
+    except (requests.RequestException, ValueError):
+        return False
+
+
+def wait_for_zap_ready(port, api_key, timeout=ZAP_READY_TIMEOUT, interval=ZAP_READY_POLL_INTERVAL):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if is_zap_ready(port, api_key):
+            return True
+        time.sleep(interval)
+    return False
+
+
+class ZapInstance:
+    def __init__(self, port, api_key, container_id=None, lease=None, host=ZAP_HOST):
+        self.host = host
+        self.port = port
+        self.api_key = api_key
+        self.container_id = container_id
+        self.lease = lease
+        self.scans = 0
+        self.started_at = time.time()
+
+    @property
+    def proxy(self):
+        return f"{self.host}:{self.port}"
+
+    def is_ready(self):
+        return is_zap_ready(self.port, self.api_key, self.host)
+
+    def client(self):
+        # imported lazily so the pool can be used without the ZAP client installed
+        from zapv2 import ZAPv2
+        return ZAPv2(apikey=self.api_key, proxies={'http': self.proxy, 'https': self.proxy})
+
+    def reset(self):
+        # a fresh session drops the site tree, alerts and scan history of the previous lease
+        self.client().core.new_session(overwrite=True)
+
+    def as_dict(self):
+        return {
+            "container_id": self.container_id,
+            "port": self.port,
+            "api_key": self.api_key
+        }
+
+
+class ZapPool:
+    """Keeps a set of ZAP daemons warm and leases them to scans."""
+
+    def __init__(self, size=ZAP_POOL_SIZE, max_scans=ZAP_MAX_SCANS_PER_INSTANCE, base_port=ZAP_PORT_RANGE_START):
+        self.size = max(1, size)
+        self.max_scans = max(1, max_scans)
+        self.base_port = base_port
+        self._idle = []
+        self._leased = set()
+        self._starting = 0
+        self._closed = False
+        self._cond = threading.Condition()
+
+    def _spawn(self):
+        zap = start_zap_container(self.base_port)
+        instance = ZapInstance(zap["port"], zap["api_key"], zap["container_id"], zap["lease"])
+        if not wait_for_zap_ready(instance.port, instance.api_key):
+            self._destroy(instance)
+            raise RuntimeError(f"ZAP on port {instance.port} did not become ready within {ZAP_READY_TIMEOUT}s")
+        print(f"[+] ZAP on port {instance.port} is ready.")
+        return instance
+
+    def _destroy(self, instance):
+        if instance.container_id:
+            print(f"[+] Stopping ZAP on port {instance.port} after {instance.scans} scans...")
+            stop_zap_container(instance.container_id, instance.lease)
+
+    def _spawn_into_pool(self):
+        try:
+            instance = self._spawn()
+        except Exception as e:
+            print(f"[!] Failed to start ZAP daemon: {e}")
+            # back off so a broken Docker host does not turn into a spawn loop
+            time.sleep(ZAP_READY_POLL_INTERVAL)
+            instance = None
+
+        with self._cond:
+            self._starting -= 1
+            closed = self._closed
+            if instance is not None and not closed:
+                self._idle.append(instance)
+            self._cond.notify_all()
+
+        if instance is not None and closed:
+            self._destroy(instance)
+
+    def _total(self):
+        return len(self._idle) + len(self._leased) + self._starting
+
+    def _fill_locked(self):
+        # caller holds the condition lock
+        while not self._closed and self._total() < self.size:
+            self._starting += 1
+            threading.Thread(target=self._spawn_into_pool, daemon=True).start()
+
+    def warm(self, wait=False, timeout=ZAP_READY_TIMEOUT):
+        with self._cond:
+            self._fill_locked()
+            if wait:
+                self._cond.wait_for(lambda: not self._starting, timeout=timeout)
+            return len(self._idle)
+
+    def acquire(self, timeout=ZAP_LEASE_TIMEOUT):
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                while not self._idle:
+                    if self._closed:
+                        raise RuntimeError("ZAP pool is closed")
+                    self._fill_locked()
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise TimeoutError(f"No ZAP instance became available within {timeout}s")
+                    self._cond.wait(timeout=remaining)
+                instance = self._idle.pop()
+                self._leased.add(instance)
+
+            if instance.is_ready():
+                return instance
+
+            # the daemon died while idle, replace it
+            print(f"[!] Idle ZAP on port {instance.port} stopped responding, replacing it.")
+            self._discard(instance)
+            if time.monotonic() >= deadline:
+                raise TimeoutError(f"No healthy ZAP instance became available within {timeout}s")
+
+    def _discard(self, instance):
+        with self._cond:
+            self._leased.discard(instance)
+            self._fill_locked()
+            self._cond.notify_all()
+        self._destroy(instance)
+
+    def release(self, instance, healthy=True):
+        instance.scans += 1
+        recycle = not healthy or instance.scans >= self.max_scans
+        if not recycle:
+            try:
+                instance.reset()
+            except Exception as e:
+                print(f"[!] Failed to reset ZAP session on port {instance.port}: {e}")
+                recycle = True
+
+        with self._cond:
+            recycle = recycle or self._closed
+            if not recycle:
+                self._leased.discard(instance)
+                self._idle.append(instance)
+                self._cond.notify_all()
+                return
+
+        # stopping a container is slow, so it happens outside the lock
+        self._discard(instance)
+
+    @contextmanager
+    def lease(self, timeout=ZAP_LEASE_TIMEOUT):
+        instance = self.acquire(timeout)
+        healthy = True
+        try:
+            yield instance
+        except BaseException:
+            healthy = instance.is_ready()
+            raise
+        finally:
+            self.release(instance, healthy=healthy)
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for instance in idle:
+            self._destroy(instance)
+
+    def stats(self):
+        with self._cond:
+            return {
+                "size": self.size,
+                "idle": len(self._idle),
+                "leased": len(self._leased),
+                "starting": self._starting
+            }
+
+
+class StaticZapPool(ZapPool):
+    """Leases ZAP daemons that are managed elsewhere, such as a sidecar or the fake ZAP server.
+
+    Instances are never started or stopped here, only reset between leases.
+    """
+
+    def __init__(self, endpoints, api_key=None):
+        super().__init__(size=len(endpoints), max_scans=float("inf"))
+        for endpoint in endpoints:
+            parts = urlsplit(endpoint if "://" in endpoint else f"http://{endpoint}")
+            host = f"{parts.scheme}://{parts.hostname}"
+            self._idle.append(ZapInstance(parts.port or 8080, api_key, host=host))
+
+    def _fill_locked(self):
+        pass
+
+    def _destroy(self, instance):
+        pass
+
+    def _discard(self, instance):
+        # an unhealthy external daemon goes back to the end of the queue instead of being replaced
+        time.sleep(ZAP_READY_POLL_INTERVAL)
+        with self._cond:
+            self._leased.discard(instance)
+            if not self._closed:
+                self._idle.insert(0, instance)
+            self._cond.notify_all()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_zap_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            reclaimed = 0 if ZAP_ENDPOINTS else reclaim_stale_leases()
+            if reclaimed:
+                print(f"[+] Reclaimed {reclaimed} ZAP leases left behind by dead workers.")
+            _pool = StaticZapPool(ZAP_ENDPOINTS, ZAP_API_KEY) if ZAP_ENDPOINTS else ZapPool()
+        return _pool
+
+
+def close_zap_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+
+atexit.register(close_zap_pool)
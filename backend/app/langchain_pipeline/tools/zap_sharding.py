@@ -0,0 +1,63 @@
+import os
+import math
+from urllib.parse import urlsplit
+
+ZAP_SHARD_COUNT = int(os.getenv("ZAP_SHARD_COUNT", "1"))
+
+
+def _path_segments(url):
+    return [segment for segment in urlsplit(url).path.split("/") if segment]
+
+
+def _group_urls(urls, depth):
+    # URLs at least `depth` segments deep share the sub-tree rooted at that depth,
+    # shallower ones are scanned on their own so a recursive scan never covers the whole site
+    groups = {}
+    for url in urls:
+        parts = urlsplit(url)
+        segments = _path_segments(url)
+        if len(segments) >= depth:
+            root = f"{parts.scheme}://{parts.netloc}/" + "/".join(segments[:depth])
+            key = (root, True)
+        else:
+            key = (url, False)
+
+        if key not in groups:
+            groups[key] = {"url": key[0], "recurse": key[1], "depth": depth, "urls": []}
+        groups[key]["urls"].append(url)
+    return list(groups.values())
+
+
+def split_url_tree(urls, shard_count):
+    urls = list(dict.fromkeys(urls))
+    shard_count = max(1, shard_count)
+    if not urls:
+        return []
+
+    ideal = math.ceil(len(urls) / shard_count)
+    groups = _group_urls(urls, 1)
+    final = set()
+
+    # keep splitting the largest sub-tree one level deeper until none is much bigger than a shard
+    while True:
+        candidates = [
+            group for group in groups
+            if group["recurse"] and len(group["urls"]) > ideal and group["url"] not in final
+        ]
+        if not candidates:
+            break
+        largest = max(candidates, key=lambda group: len(group["urls"]))
+        children = _group_urls(largest["urls"], largest["depth"] + 1)
+        if len(children) == 1 and not children[0]["recurse"]:
+            final.add(largest["url"])
+            continue
+        # a single recursive child is the same sub-tree one level down, split that next time
+        groups.remove(largest)
+        groups.extend(children)
+
+    shards = [{"targets": [], "urls": []} for _ in range(min(shard_count, len(groups)))]
+    for group in sorted(groups, key=lambda group: len(group["urls"]), reverse=True):
+        shard = min(shards, key=lambda shard: len(shard["urls"]))
+        shard["targets"].append({"url": group["url"], "recurse": group["recurse"]})
+        shard["urls"].extend(group["urls"])
+    return shards
@@ -0,0 +1,186 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_zap import fake_zap_stats, start_fake_zap  # noqa: E402
+from langchain_pipeline.tools import zap_engine  # noqa: E402
+from langchain_pipeline.tools.zap_pool import StaticZapPool  # noqa: E402
+
+# End-to-end web scan benchmarks against the fake ZAP server: one scan per alert
+# volume, a batch of concurrent scans, and a sharded scan across several instances.
+
+TARGET = "http://target.local"
+PROFILE = {"name": "bench", "ajax_spider": False, "budget": 3600}
+
+
+def _start(count, **options):
+    servers = [start_fake_zap(target=TARGET, **options) for _ in range(count)]
+    return [process for process, _ in servers], [endpoint for _, endpoint in servers]
+
+
+def _stop(processes):
+    for process in processes:
+        process.terminate()
+        process.join()
+
+
+def _stats(endpoints):
+    totals = {"status_polls": 0, "total_calls": 0}
+    for endpoint in endpoints:
+        stats = fake_zap_stats(endpoint)
+        totals["status_polls"] += stats["status_polls"]
+        totals["total_calls"] += stats["total_calls"]
+    return totals
+
+
+def _measure(run):
+    tracemalloc.start()
+    started = time.perf_counter()
+    try:
+        result = run()
+    finally:
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    return result, elapsed, peak
+
+
+def bench_alert_volume(volume, args, output_dir):
+    processes, endpoints = _start(1, urls=args.urls, alerts=volume, latency=args.latency,
+                                  spider_seconds=args.spider_seconds, ascan_seconds=args.ascan_seconds)
+    try:
+        pool = StaticZapPool(endpoints)
+        output_path = os.path.join(output_dir, f"web_{volume}.json")
+        report, elapsed, peak = _measure(lambda: zap_engine.run_web_scan(
+            TARGET, pool=pool, output_path=output_path, api_spec=False, profile=PROFILE
+        ))
+        stats = _stats(endpoints)
+    finally:
+        _stop(processes)
+
+    if report.get("status") != "success":
+        raise RuntimeError(report.get("error"))
+    with open(output_path) as f:
+        grouped = json.load(f)["results"]
+    assert sum(len(group["instances"]) for group in grouped) == volume
+
+    return {
+        "case": f"single scan, {volume} alerts",
+        "seconds": elapsed,
+        "alerts_per_second": volume / elapsed,
+        "status_polls": stats["status_polls"],
+        "api_calls": stats["total_calls"],
+        "peak_mb": peak / 2 ** 20,
+        "output_mb": os.path.getsize(output_path) / 2 ** 20
+    }
+
+
+def bench_concurrency(args, output_dir):
+    processes, endpoints = _start(args.instances, urls=args.urls, alerts=args.concurrent_alerts,
+                                  latency=args.latency, spider_seconds=args.spider_seconds,
+                                  ascan_seconds=args.ascan_seconds)
+    try:
+        pool = StaticZapPool(endpoints)
+        targets = [
+            {
+                "url": TARGET,
+                "pool": pool,
+                "api_spec": False,
+                "profile": PROFILE,
+                "output_path": os.path.join(output_dir, f"concurrent_{index}.json")
+            }
+            for index in range(args.scans)
+        ]
+        reports, elapsed, peak = _measure(lambda: zap_engine.run_web_scans(targets))
+        stats = _stats(endpoints)
+    finally:
+        _stop(processes)
+
+    failed = [report for report in reports if report.get("status") != "success"]
+    if failed:
+        raise RuntimeError(failed[0].get("error"))
+
+    return {
+        "case": f"{args.scans} scans on {args.instances} instances",
+        "seconds": elapsed,
+        "scans_per_minute": args.scans / elapsed * 60,
+        "status_polls": stats["status_polls"],
+        "api_calls": stats["total_calls"],
+        "peak_mb": peak / 2 ** 20
+    }
+
+
+def bench_sharded(args, output_dir):
+    processes, endpoints = _start(args.shards, urls=args.urls, alerts=args.concurrent_alerts,
+                                  latency=args.latency, spider_seconds=args.spider_seconds,
+                                  ascan_seconds=args.ascan_seconds)
+    try:
+        pool = StaticZapPool(endpoints)
+        output_path = os.path.join(output_dir, "sharded.json")
+
+        async def run():
+            return await zap_engine.async_sharded_zap_scan(
+                TARGET, args.shards, pool=pool, api_spec=False, output_path=output_path, profile=PROFILE
+            )
+
+        report, elapsed, peak = _measure(lambda: asyncio.run(run()))
+        stats = _stats(endpoints)
+    finally:
+        _stop(processes)
+
+    if report.get("status") != "success":
+        raise RuntimeError(report.get("error"))
+    assert report["total_alerts"] == args.concurrent_alerts, report
+
+    return {
+        "case": f"sharded scan, {report['shards']} shards",
+        "seconds": elapsed,
+        "status_polls": stats["status_polls"],
+        "api_calls": stats["total_calls"],
+        "duplicates_dropped": report["duplicates_dropped"],
+        "peak_mb": peak / 2 ** 20
+    }
+
+
+def print_row(row):
+    details = ", ".join(
+        f"{key}={value:.2f}" if isinstance(value, float) else f"{key}={value}"
+        for key, value in row.items() if key != "case"
+    )
+    print(f"[bench] {row['case']}: {details}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the web scan path against a fake ZAP.")
+    parser.add_argument("--volumes", default="1000,10000,100000", help="alert counts for the single-scan cases")
+    parser.add_argument("--urls", type=int, default=400)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every ZAP API call")
+    parser.add_argument("--spider-seconds", type=float, default=1.0)
+    parser.add_argument("--ascan-seconds", type=float, default=2.0)
+    parser.add_argument("--scans", type=int, default=24, help="scans in the concurrency case")
+    parser.add_argument("--instances", type=int, default=8, help="fake ZAP instances in the concurrency case")
+    parser.add_argument("--concurrent-alerts", type=int, default=2000)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--skip", default="", help="comma-separated cases to skip: volume,concurrency,sharded")
+    args = parser.parse_args()
+
+    # fake scans finish in seconds, a shorter first poll keeps them from being dominated by polling delay
+    zap_engine.ZAP_POLL_MIN_INTERVAL = min(zap_engine.ZAP_POLL_MIN_INTERVAL, 0.5)
+    skip = set(filter(None, args.skip.split(",")))
+
+    with tempfile.TemporaryDirectory(prefix="bench_web_scan_") as output_dir:
+        if "volume" not in skip:
+            for volume in [int(value) for value in args.volumes.split(",") if value]:
+                print_row(bench_alert_volume(volume, args, output_dir))
+        if "concurrency" not in skip:
+            print_row(bench_concurrency(args, output_dir))
+        if "sharded" not in skip:
+            print_row(bench_sharded(args, output_dir))
@@ -0,0 +1,124 @@
+import os
+import sys
+import shutil
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "app"))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from langchain_pipeline.tools import scan_engine  # noqa: E402
+from langchain_pipeline.tools.scan_engine import ScannerPlugin, make_finding  # noqa: E402
+
+# Exercises the code scan plugin engine with a trivial local plugin: registration,
+# unit planning, the process pool and its thread fallback in daemonic workers,
+# and the merge of findings, errors and per-scanner summaries.
+
+PLUGIN_PATH = "check_scan_engine:TodoPlugin"
+FILES = {
+    "a.py": "x = 1  # TODO one\n",
+    "b.js": "// TODO two\n// TODO three\n",
+    "c.txt": "TODO not handled\n",
+    "d.py": "clean = True\n",
+    "broken.py": "# TODO never reported\n",
+}
+
+
+class TodoPlugin(ScannerPlugin):
+    """Reports TODO comments, two files per work unit; a unit holding broken.py fails."""
+
+    name = "todo"
+    extensions = frozenset({".py", ".js"})
+
+    def version(self):
+        return "1.0"
+
+    def plan(self, files):
+        files = sorted(files)
+        return [files[start:start + 2] for start in range(0, len(files), 2)]
+
+    @classmethod
+    def scan(cls, unit, emit):
+        if any(os.path.basename(path) == "broken.py" for path in unit):
+            raise RuntimeError("broken unit")
+        for path in unit:
+            with open(path, "r", encoding="utf-8") as f:
+                for number, line in enumerate(f, 1):
+                    if "TODO" in line:
+                        emit(make_finding("todo.comment", path, number, message="TODO comment", lines=line))
+        return {"errors": [], "paths": {"scanned": list(unit)}, "version": "1.0"}
+
+
+def run(files):
+    findings = []
+    output = scan_engine.run_scanners(files, findings.append, plugins=scan_engine.enabled_plugins(["todo"]))
+    return output, findings
+
+
+def check_merge(output, findings):
+    summary = output["scanners"]["todo"]
+    assert sorted(os.path.basename(f["path"]) for f in findings) == ["a.py", "b.js", "b.js"], findings
+    assert all(finding["scanner"] == "todo" for finding in findings)
+    assert output["total_results"] == summary["total_results"] == 3, output
+    # broken.py and d.py share the failed unit, c.txt is not handled by the plugin at all
+    assert summary == {"version": "1.0", "total_results": 3, "failed_units": 1}, summary
+    assert [error["type"] for error in output["errors"]] == ["ScannerFailure"], output["errors"]
+    assert sorted(os.path.basename(path) for path in output["paths"]["scanned"]) == ["a.py", "b.js"]
+    assert scan_engine.scan_incomplete(output)
+
+
+def run_in_daemon(files, results):
+    # a Celery prefork child is daemonic and cannot start a process pool of its own
+    scan_engine.register_scanner("todo", PLUGIN_PATH)
+    executor = scan_engine.get_scan_executor()
+    output, findings = run(files)
+    results.put((type(executor).__name__, output, findings))
+
+
+def main():
+    root = tempfile.mkdtemp(prefix="scan-engine-check-")
+    try:
+        files = []
+        for name, content in FILES.items():
+            path = os.path.join(root, name)
+            with open(path, "w", encoding="utf-8") as f:
+                f.write(content)
+            files.append(path)
+
+        scan_engine.register_scanner("todo", PLUGIN_PATH)
+        plugins = scan_engine.enabled_plugins(["todo", "missing"])
+        assert [type(plugin).__name__ for plugin in plugins] == ["TodoPlugin"], plugins
+        handled = [path for path in files if plugins[0].handles(path)]
+        assert len(handled) == 4 and len(plugins[0].plan(handled)) == 2
+        print("[check] registration and unit planning: ok")
+
+        output, findings = run(files)
+        assert isinstance(scan_engine.get_scan_executor(), ProcessPoolExecutor)
+        check_merge(output, findings)
+        print("[check] process pool run and merge: ok")
+
+        # a forked child would inherit this process's pool instead of choosing its own
+        scan_engine.close_scan_executor()
+        results = multiprocessing.Queue()
+        worker = multiprocessing.Process(target=run_in_daemon, args=(files, results), daemon=True)
+        worker.start()
+        executor_name, output, findings = results.get(timeout=120)
+        worker.join()
+        assert executor_name == ThreadPoolExecutor.__name__, executor_name
+        check_merge(output, findings)
+        print("[check] thread pool fallback in a daemonic worker: ok")
+
+        try:
+            run([os.path.join(root, "broken.py")])
+        except RuntimeError as e:
+            print(f"[check] every unit failing raises: ok ({e})")
+        else:
+            raise AssertionError("run_scanners did not raise when every unit failed")
+    finally:
+        scan_engine.close_scan_executor()
+        shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import json
+import time
+import argparse
+import threading
+import multiprocessing
+from collections import Counter
+from urllib.parse import urlsplit, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# A stand-in for the subset of the ZAP JSON API used by the web scan path:
+# core, spider, ajaxSpider, ascan and alerts. Scans finish after a fixed time,
+# the site tree and alerts are generated on demand so 100k alerts cost nothing to hold.
+
+RISKS = ["High", "Medium", "Low", "Informational"]
+STATUS_VIEWS = {"spider/status", "ascan/status", "ajaxSpider/status"}
+
+
+class FakeZapState:
+    def __init__(self, target="http://target.local", urls=200, alerts=1000, alert_names=40,
+                 spider_seconds=1.0, ajax_seconds=1.0, ascan_seconds=2.0, latency=0.0, changed_fraction=0.0):
+        self.target = target.rstrip("/")
+        self.url_count = max(1, urls)
+        self.alert_count = alerts
+        self.alert_names = max(1, alert_names)
+        self.spider_seconds = spider_seconds
+        self.ajax_seconds = ajax_seconds
+        self.ascan_seconds = ascan_seconds
+        self.latency = latency
+        self.changed_fraction = changed_fraction
+        self.calls = Counter()
+        self.sessions = 0
+        self._lock = threading.Lock()
+        self.new_session()
+
+    def new_session(self):
+        with self._lock:
+            self.sessions += 1
+            self.scans = {}
+            self.next_scan_id = 0
+            self.ajax_started = None
+            self.spidered = False
+            self.accessed = set()
+            self._visible_alerts = None
+
+    def site_url(self, index):
+        # a few sub-trees of different sizes so sharding has something to split
+        section = ["api", "app", "static", "admin"][index % 4]
+        return f"{self.target}/{section}/item{index // 4}?id={index}"
+
+    def site_urls(self):
+        return [self.site_url(index) for index in range(self.url_count)]
+
+    def start_scan(self, duration):
+        with self._lock:
+            scan_id = str(self.next_scan_id)
+            self.next_scan_id += 1
+            self.scans[scan_id] = {"started": time.monotonic(), "duration": duration, "stopped": False}
+            self._visible_alerts = None
+            return scan_id
+
+    def progress(self, scan_id):
+        scan = self.scans.get(scan_id) or (self.scans[max(self.scans, key=int)] if self.scans else None)
+        if scan is None:
+            return 100
+        if scan["stopped"]:
+            return 100
+        elapsed = time.monotonic() - scan["started"]
+        return min(100, int(elapsed / scan["duration"] * 100)) if scan["duration"] else 100
+
+    def visible_alerts(self):
+        # an instance only reports alerts for URLs it crawled or was seeded with
+        if self.spidered:
+            return None
+        with self._lock:
+            if self._visible_alerts is None:
+                seeded = {index for index in range(self.url_count) if self.site_url(index) in self.accessed}
+                self._visible_alerts = [index for index in range(self.alert_count) if index % self.url_count in seeded]
+            return self._visible_alerts
+
+    def alert(self, index):
+        name_index = index % self.alert_names
+        return {
+            "id": str(index),
+            "name": f"Fake Alert {name_index}",
+            "alert": f"Fake Alert {name_index}",
+            "risk": RISKS[name_index % len(RISKS)],
+            "confidence": "Medium",
+            "description": f"Generated alert type {name_index}.",
+            "solution": "Nothing to fix, this is a benchmark.",
+            "reference": "https://www.zaproxy.org/\nhttps://owasp.org/",
+            "pluginId": str(40000 + name_index),
+            "cweid": str(79 + name_index),
+            "wascid": str(8 + name_index % 10),
+            "sourceid": "1",
+            "alertRef": str(40000 + name_index),
+            "url": self.site_url(index % self.url_count),
+            "method": "GET",
+            "param": "id",
+            "attack": "",
+            "evidence": f"evidence-{index}",
+            "messageId": str(index),
+            "sourceMessageId": "1",
+            "tags": {}
+        }
+
+    def message(self, index):
+        url = self.site_url(index)
+        changed = index < self.url_count * self.changed_fraction
+        body = f"<html>page {index}{' session ' + str(self.sessions) if changed else ''}</html>"
+        return {
+            "id": str(index),
+            "requestHeader": f"GET {url} HTTP/1.1\r\nHost: {urlsplit(url).netloc}\r\n\r\n",
+            "requestBody": "",
+            "responseHeader": "HTTP/1.1 200 OK\r\nContent-Type: text/html\r\n\r\n",
+            "responseBody": body
+        }
+
+
+def _page(items_count, params, build):
+    start = int(params.get("start") or 0)
+    count = int(params.get("count") or 0) or items_count
+    return [build(index) for index in range(start, min(items_count, start + count))]
+
+
+def handle_call(state, component, name, params):
+    key = f"{component}/{name}"
+    state.calls[key] += 1
+
+    if key == "core/version":
+        return {"version": "2.16.0-fake"}
+    if key == "core/accessUrl":
+        state.accessed.add(params.get("url", ""))
+        state._visible_alerts = None
+        return {"Result": "OK"}
+    if key == "core/newSession":
+        state.new_session()
+        return {"Result": "OK"}
+    if key == "core/urls":
+        return {"urls": state.site_urls() if state.spidered else sorted(state.accessed)}
+    if key == "core/messages":
+        count = state.url_count if state.spidered else 0
+        return {"messages": _page(count, params, state.message)}
+    if key == "core/numberOfAlerts":
+        visible = state.visible_alerts()
+        return {"numberOfAlerts": str(state.alert_count if visible is None else len(visible))}
+    if key == "core/alerts":
+        visible = state.visible_alerts()
+        if visible is None:
+            return {"alerts": _page(state.alert_count, params, state.alert)}
+        return {"alerts": _page(len(visible), params, lambda index: state.alert(visible[index]))}
+
+    if key == "spider/scan":
+        state.spidered = True
+        return {"scan": state.start_scan(state.spider_seconds)}
+    if key in ("spider/status", "ascan/status"):
+        return {"status": str(state.progress(params.get("scanId")))}
+    if key in ("spider/stop", "ascan/stop"):
+        scan = state.scans.get(params.get("scanId"))
+        if scan:
+            scan["stopped"] = True
+        return {"Result": "OK"}
+    if key in ("ascan/scan", "ascan/scanAsUser"):
+        return {"scan": state.start_scan(state.ascan_seconds)}
+
+    if key == "ajaxSpider/scan":
+        state.ajax_started = time.monotonic()
+        return {"Result": "OK"}
+    if key == "ajaxSpider/status":
+        running = state.ajax_started is not None and time.monotonic() - state.ajax_started < state.ajax_seconds
+        return {"status": "running" if running else "stopped"}
+    if key == "ajaxSpider/numberOfResults":
+        return {"numberOfResults": str(state.url_count if state.ajax_started else 0)}
+    if key == "ajaxSpider/stop":
+        state.ajax_started = None
+        return {"Result": "OK"}
+
+    if key == "context/context":
+        return {"context": {"id": "1", "name": params.get("contextName", "default")}}
+    if key == "context/newContext":
+        return {"contextId": "1"}
+    if key == "users/newUser":
+        return {"userId": "0"}
+
+    # option setters, scanner toggles and the OpenAPI import are accepted and ignored
+    return {"Result": "OK"}
+
+
+def make_handler(state):
+    class FakeZapHandler(BaseHTTPRequestHandler):
+        def _respond(self, status, payload):
+            body = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            # ZAPv2 talks to the API through the proxy, so the path may be a full http://zap/ URL
+            parts = urlsplit(self.path)
+            params = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+
+            if parts.path == "/fake/stats":
+                self._respond(200, {
+                    "calls": dict(state.calls),
+                    "status_polls": sum(state.calls[key] for key in STATUS_VIEWS),
+                    "total_calls": sum(state.calls.values()),
+                    "sessions": state.sessions
+                })
+                return
+
+            segments = [segment for segment in parts.path.split("/") if segment]
+            if len(segments) < 4 or segments[0] != "JSON":
+                self._respond(404, {"code": "bad_view", "message": parts.path})
+                return
+
+            if state.latency:
+                time.sleep(state.latency)
+            self._respond(200, handle_call(state, segments[1], segments[3], params))
+
+        do_POST = do_GET
+
+        def log_message(self, format, *args):
+            pass
+
+    return FakeZapHandler
+
+
+def serve(port=0, ready=None, **options):
+    state = FakeZapState(**options)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(state))
+    server.daemon_threads = True
+    if ready is not None:
+        ready.put(server.server_address[1])
+    server.serve_forever()
+
+
+def start_fake_zap(**options):
+    # runs in its own process so the benchmark only measures the client side
+    ready = multiprocessing.Queue()
+    process = multiprocessing.Process(target=serve, kwargs={"ready": ready, **options}, daemon=True)
+    process.start()
+    port = ready.get(timeout=10)
+    return process, f"http://127.0.0.1:{port}"
+
+
+def fake_zap_stats(endpoint):
+    import requests
+    return requests.get(f"{endpoint}/fake/stats", timeout=5).json()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a fake ZAP API server.")
+    parser.add_argument("--port", type=int, default=8090)
+    parser.add_argument("--target", default="http://target.local")
+    parser.add_argument("--urls", type=int, default=200)
+    parser.add_argument("--alerts", type=int, default=1000)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every API call")
+    parser.add_argument("--spider-seconds", type=float, default=1.0)
+    parser.add_argument("--ascan-seconds", type=float, default=2.0)
+    args = parser.parse_args()
+
+    print(f"[+] Fake ZAP listening on http://127.0.0.1:{args.port}")
+    serve(
+        args.port,
+        target=args.target,
+        urls=args.urls,
+        alerts=args.alerts,
+        latency=args.latency,
+        spider_seconds=args.spider_seconds,
+        ascan_seconds=args.ascan_seconds
+    )
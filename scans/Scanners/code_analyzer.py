@@ -1,4 +1,5 @@
 import json
+import mmap
 import subprocess
 import os
 from dotenv import load_dotenv
@@ -24,6 +25,31 @@ def get_supported_files(code_path):
                 files.append(os.path.join(root, filename))
     return files
 
+def extract_exact_snippets(issues):
+    # Semgrep offsets are byte offsets: read each file once and slice the raw bytes
+    issues_by_path = {}
+    for issue in issues:
+        issue["vulnerable_line"] = issue.get("start", {}).get("line", None)
+        issue["code_snippet"] = issue.get("extra", {}).get("lines", "").strip()
+        issue["exact_snippet"] = issue["code_snippet"]
+
+        start_offset = issue.get("start", {}).get("offset", None)
+        end_offset = issue.get("end", {}).get("offset", None)
+        if start_offset is not None and end_offset is not None:
+            issues_by_path.setdefault(issue.get("path", ""), []).append(issue)
+
+    for file_path, file_issues in issues_by_path.items():
+        try:
+            with open(file_path, "rb") as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    continue
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                    for issue in file_issues:
+                        raw = content[issue["start"]["offset"]:issue["end"]["offset"]]
+                        issue["exact_snippet"] = raw.decode("utf-8", errors="replace").strip()
+        except (OSError, ValueError) as e:
+            print(f"[!] Failed to extract exact snippet from {file_path}: {e}")
+
 def analyze_code_with_semgrep(code_path):
     files_to_scan = get_supported_files(code_path)
     if not files_to_scan:
@@ -37,24 +63,7 @@ def analyze_code_with_semgrep(code_path):
 
         semgrep_output = json.loads(result.stdout)
 
-        for issue in semgrep_output.get("results", []):
-            issue["vulnerable_line"] = issue.get("start", {}).get("line", None)
-            issue["code_snippet"] = issue.get("extra", {}).get("lines", "").strip()
-            file_path = issue.get("path", "")
-            start_offset = issue.get("start", {}).get("offset", None)
-            end_offset = issue.get("end", {}).get("offset", None)
-
-            if start_offset is not None and end_offset is not None and os.path.exists(file_path):
-                try:
-                    with open(file_path, "r", encoding="utf-8") as f:
-                        full_content = f.read()
-                        exact_snippet = full_content[start_offset:end_offset].strip()
-                        issue["exact_snippet"] = exact_snippet
-                except Exception as e:
-                    print(f"[!] Failed to extract exact snippet from {file_path}: {e}")
-                    issue["exact_snippet"] = issue["code_snippet"]
-            else:
-                issue["exact_snippet"] = issue["code_snippet"]
+        extract_exact_snippets(semgrep_output.get("results", []))
 
         print(f"[+] Semgrep scan completed. {len(semgrep_output.get('results', []))} issues found.")
         return semgrep_output